@@ -1,5 +1,13 @@
 from django.contrib import admin
-from .models import AttendanceRecord
+from .outbox import replay_dead_letters
+from .models import (
+    AttendanceRecord,
+    SpocSyncOutbox,
+    SpocDeadLetter,
+    StudentDailyAttendance,
+    SessionAttendanceSummary,
+    RollupWatermark,
+)
 
 @admin.register(AttendanceRecord)
 class AttendanceRecordAdmin(admin.ModelAdmin):
@@ -26,3 +34,51 @@ class AttendanceRecordAdmin(admin.ModelAdmin):
         return obj.student.email
     student_email.short_description = 'Student Email'
     student_email.admin_order_field = 'student__email'
+
+
+@admin.register(SpocSyncOutbox)
+class SpocSyncOutboxAdmin(admin.ModelAdmin):
+    """Admin interface for pending SPOC forwards."""
+    list_display = ('record', 'created_at')
+    readonly_fields = ('record', 'token', 'created_at')
+
+
+@admin.register(SpocDeadLetter)
+class SpocDeadLetterAdmin(admin.ModelAdmin):
+    """Admin interface for SPOC forwards that exhausted their retries."""
+    list_display = ('record', 'retry_count', 'dead_at')
+    list_filter = ('dead_at',)
+    readonly_fields = ('record', 'error', 'retry_count', 'dead_at')
+    actions = ['replay']
+
+    @admin.action(description='Replay selected dead letters')
+    def replay(self, request, queryset):
+        replayed = replay_dead_letters(queryset)
+        self.message_user(request, f'Queued {replayed} records for forwarding to SPOC.')
+
+
+@admin.register(StudentDailyAttendance)
+class StudentDailyAttendanceAdmin(admin.ModelAdmin):
+    """Read-only admin for the student/day rollup."""
+    list_display = ('student', 'date', 'present', 'late', 'absent', 'excused', 'total')
+    date_hierarchy = 'date'
+    raw_id_fields = ('student',)
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(SessionAttendanceSummary)
+class SessionAttendanceSummaryAdmin(admin.ModelAdmin):
+    """Read-only admin for the course/session rollup."""
+    list_display = ('external_session_id', 'course_id', 'present', 'late', 'absent', 'total', 'first_marked_at')
+    search_fields = ('external_session_id', 'course_id')
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(RollupWatermark)
+class RollupWatermarkAdmin(admin.ModelAdmin):
+    """Admin interface for rollup progress."""
+    list_display = ('name', 'last_record_id', 'updated_at')
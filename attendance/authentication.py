@@ -0,0 +1,57 @@
+"""
+Authentication classes used by the attendance endpoints.
+
+Both classes behave like their DRF/SimpleJWT parents but swallow
+authentication errors (so the next class gets a chance) and collect request
+diagnostics only for requests picked by attendance.diagnostics.
+"""
+import logging
+from rest_framework.authentication import TokenAuthentication
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from .diagnostics import auth_diagnostics, log_request_diagnostics
+
+logger = logging.getLogger(__name__)
+
+
+class DebugJWTAuthentication(JWTAuthentication):
+    def authenticate(self, request):
+        sampled = auth_diagnostics.sample(request)
+        if sampled:
+            log_request_diagnostics(request, 'JWT Authentication')
+
+        try:
+            user_jwt = super().authenticate(request)
+        except Exception as auth_error:
+            logger.warning("JWT Authentication failed: %s", auth_error, exc_info=sampled)
+            return None
+
+        if sampled:
+            if user_jwt is None:
+                logger.info("JWT Authentication skipped: no Bearer token in header")
+            else:
+                user, token = user_jwt
+                logger.info(
+                    "JWT Authentication SUCCESS for user: %s (token type: %s, claims: %s)",
+                    user.username, type(token).__name__, sorted(token.payload)
+                )
+        return user_jwt
+
+
+class DebugTokenAuthentication(TokenAuthentication):
+    def authenticate(self, request):
+        sampled = auth_diagnostics.sample(request)
+        if sampled:
+            log_request_diagnostics(request, 'Token Authentication')
+
+        try:
+            result = super().authenticate(request)
+        except Exception as e:
+            logger.warning("Token Authentication error: %s", e, exc_info=sampled)
+            return None
+
+        if sampled:
+            if result is None:
+                logger.info("Token Authentication skipped: no Token in header")
+            else:
+                logger.info("Token Authentication successful for user: %s", result[0].username)
+        return result
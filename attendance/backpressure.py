@@ -0,0 +1,149 @@
+"""
+Backpressure for forwarding attendance marks to the SPOC server.
+
+Both pieces live in the shared cache, so every worker process sees the same
+state:
+
+* SpocCircuitBreaker opens after SPOC_BREAKER_FAILURE_THRESHOLD unhealthy
+  responses (connection errors, timeouts, 5xx) within
+  SPOC_BREAKER_WINDOW_SECONDS. While it is open nothing is dispatched. After
+  SPOC_BREAKER_OPEN_SECONDS one probe is let through. A successful probe
+  closes the breaker and a failed one opens it again.
+* DispatchRateLimiter is a token bucket refilled once a second with
+  SPOC_DISPATCH_RATE_PER_SECOND tokens. For SPOC_RECOVERY_RAMP_SECONDS after
+  the breaker closes, the refill ramps up linearly from
+  SPOC_RECOVERY_RATE_PER_SECOND, so the backlog is released gradually rather
+  than all at once.
+"""
+import logging
+import time
+from django.conf import settings
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class SpocCircuitBreaker:
+    """Shared circuit breaker in front of the SPOC server."""
+
+    OPEN_UNTIL_KEY = 'attendance:spoc_breaker:open_until'
+    FAILURES_KEY = 'attendance:spoc_breaker:failures'
+    PROBE_KEY = 'attendance:spoc_breaker:probe'
+    RECOVERED_AT_KEY = 'attendance:spoc_breaker:recovered_at'
+    # Keeps the breaker's memory of having been open until it is closed again
+    STATE_TIMEOUT = 24 * 60 * 60
+
+    @property
+    def open_seconds(self):
+        return getattr(settings, 'SPOC_BREAKER_OPEN_SECONDS', 60)
+
+    def state(self):
+        """Return CLOSED, OPEN or HALF_OPEN."""
+        open_until = cache.get(self.OPEN_UNTIL_KEY)
+        if open_until is None:
+            return CLOSED
+        return OPEN if open_until > time.time() else HALF_OPEN
+
+    def seconds_until_probe(self):
+        """Seconds left before an open breaker lets a probe through."""
+        open_until = cache.get(self.OPEN_UNTIL_KEY)
+        return max(0.0, open_until - time.time()) if open_until else 0.0
+
+    def claim_probe(self):
+        """Return True for exactly one caller per probe while half-open."""
+        return cache.add(self.PROBE_KEY, True, timeout=self.open_seconds)
+
+    def record_success(self):
+        """Close the breaker if it was waiting on a probe."""
+        if self.state() != CLOSED:
+            cache.delete_many([self.OPEN_UNTIL_KEY, self.PROBE_KEY, self.FAILURES_KEY])
+            cache.set(
+                self.RECOVERED_AT_KEY, time.time(),
+                timeout=getattr(settings, 'SPOC_RECOVERY_RAMP_SECONDS', 120)
+            )
+            logger.info("SPOC circuit breaker closed; releasing the backlog gradually")
+
+    def record_failures(self, count=1):
+        """Count unhealthy responses and open the breaker once the threshold is reached."""
+        if count <= 0:
+            return
+        if self.state() == HALF_OPEN:
+            self.trip()
+            return
+
+        window = getattr(settings, 'SPOC_BREAKER_WINDOW_SECONDS', 30)
+        cache.add(self.FAILURES_KEY, 0, timeout=window)
+        try:
+            failures = cache.incr(self.FAILURES_KEY, count)
+        except ValueError:
+            # The window expired between add and incr; start a new one.
+            cache.set(self.FAILURES_KEY, count, timeout=window)
+            failures = count
+        if failures >= getattr(settings, 'SPOC_BREAKER_FAILURE_THRESHOLD', 20):
+            self.trip()
+
+    def trip(self):
+        """Open the breaker for SPOC_BREAKER_OPEN_SECONDS."""
+        cache.set(self.OPEN_UNTIL_KEY, time.time() + self.open_seconds, timeout=self.STATE_TIMEOUT)
+        cache.delete_many([self.FAILURES_KEY, self.PROBE_KEY, self.RECOVERED_AT_KEY])
+        logger.warning("SPOC circuit breaker opened for %s seconds", self.open_seconds)
+
+    def reset(self):
+        """Forget all breaker state."""
+        cache.delete_many([self.OPEN_UNTIL_KEY, self.FAILURES_KEY, self.PROBE_KEY, self.RECOVERED_AT_KEY])
+
+    def status(self):
+        """Return a summary for health checks."""
+        return {
+            'state': self.state(),
+            'recent_failures': cache.get(self.FAILURES_KEY, 0),
+            'seconds_until_probe': round(self.seconds_until_probe(), 1),
+            'dispatch_rate': dispatch_rate_limiter.current_rate(),
+        }
+
+
+class DispatchRateLimiter:
+    """Token bucket shared by every dispatcher, refilled once a second."""
+
+    KEY_PREFIX = 'attendance:spoc_dispatch_tokens'
+
+    def current_rate(self):
+        """Tokens per second, ramped up while recovering. 0 means unlimited."""
+        rate = getattr(settings, 'SPOC_DISPATCH_RATE_PER_SECOND', 50)
+        recovered_at = cache.get(SpocCircuitBreaker.RECOVERED_AT_KEY)
+        if not rate or recovered_at is None:
+            return rate
+        ramp = getattr(settings, 'SPOC_RECOVERY_RAMP_SECONDS', 120)
+        start = min(rate, getattr(settings, 'SPOC_RECOVERY_RATE_PER_SECOND', 5))
+        progress = min(1.0, (time.time() - recovered_at) / ramp) if ramp else 1.0
+        return max(1, int(start + (rate - start) * progress))
+
+    def acquire(self, count):
+        """
+        Take up to count tokens from the current second's bucket.
+
+        Returns:
+            int: Number of tokens granted (0 when the bucket is empty)
+        """
+        rate = self.current_rate()
+        if not rate:
+            return count
+        key = f'{self.KEY_PREFIX}:{int(time.time())}'
+        cache.add(key, 0, timeout=2)
+        try:
+            taken = cache.incr(key, count)
+        except ValueError:
+            return 0
+        return max(0, min(count, rate - (taken - count)))
+
+    @staticmethod
+    def seconds_until_refill():
+        return 1 - (time.time() % 1)
+
+
+spoc_breaker = SpocCircuitBreaker()
+dispatch_rate_limiter = DispatchRateLimiter()
@@ -0,0 +1,113 @@
+"""
+Live per-session attendance counters.
+
+Counts are kept in the shared cache, one key per (session, status), and are
+bumped by the views whenever they insert records. A key that is missing (never
+seen, evicted or expired) is not bumped. Instead the next read rebuilds all
+of that session's keys with a single GROUP BY. Only one reader runs the
+rebuild at a time, guarded by a cache lock. The keys expire after
+ATTENDANCE_COUNTER_TTL_SECONDS, so any drift from a lost update is
+reconciled against the database at least that often.
+
+Reads never touch the database while the counters are warm, so any number of
+clients polling a session costs a handful of cache lookups each.
+"""
+import logging
+import time
+from collections import Counter
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count
+from .models import AttendanceRecord
+
+logger = logging.getLogger(__name__)
+
+STATUSES = [choice for choice, _ in AttendanceRecord.ATTENDANCE_STATUS]
+RECONCILE_LOCK_TIMEOUT = 10
+
+
+def get_counter_ttl():
+    """Seconds a counter lives before it is rebuilt from the database."""
+    return getattr(settings, 'ATTENDANCE_COUNTER_TTL_SECONDS', 300)
+
+
+def _counter_key(session_id, status):
+    return f'attendance:session_counts:{session_id}:{status}'
+
+
+def _lock_key(session_id):
+    return f'attendance:session_counts:{session_id}:reconciling'
+
+
+def record_marks(session_id, statuses):
+    """
+    Bump the live counters for newly inserted attendance records.
+
+    Args:
+        session_id: external_session_id the records were inserted for
+        statuses (iterable): Status of each inserted record
+    """
+    for status, count in Counter(statuses).items():
+        try:
+            cache.incr(_counter_key(session_id, status), count)
+        except ValueError:
+            # Not loaded yet: the next read rebuilds it from the database.
+            pass
+        except Exception as e:
+            logger.warning("Failed to update live counter for session %s: %s", session_id, e)
+
+
+def reconcile(session_id):
+    """
+    Rebuild a session's counters from the database.
+
+    Returns:
+        dict: {status: count} for every status
+    """
+    counts = dict.fromkeys(STATUSES, 0)
+    counts.update(
+        AttendanceRecord.objects
+        .filter(external_session_id=session_id)
+        .order_by()
+        .values_list('status')
+        .annotate(total=Count('id'))
+    )
+    cache.set_many(
+        {_counter_key(session_id, status): count for status, count in counts.items()},
+        timeout=get_counter_ttl()
+    )
+    return counts
+
+
+def get_session_counts(session_id, wait=1.0):
+    """
+    Return live attendance counts for a session.
+
+    When the counters are cold only one caller rebuilds them; the others wait
+    up to `wait` seconds for the result before falling back to the database
+    themselves.
+
+    Args:
+        session_id: external_session_id to count
+        wait (float): Seconds to wait for another caller's rebuild
+
+    Returns:
+        dict: {status: count} for every status
+    """
+    keys = {_counter_key(session_id, status): status for status in STATUSES}
+    deadline = time.monotonic() + wait
+    while True:
+        cached = cache.get_many(keys)
+        if len(cached) == len(keys):
+            return {keys[key]: value for key, value in cached.items()}
+
+        lock = _lock_key(session_id)
+        if cache.add(lock, True, timeout=RECONCILE_LOCK_TIMEOUT):
+            try:
+                return reconcile(session_id)
+            finally:
+                cache.delete(lock)
+
+        if time.monotonic() >= deadline:
+            return reconcile(session_id)
+        time.sleep(0.05)
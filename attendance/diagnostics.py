@@ -0,0 +1,92 @@
+"""
+Sampled diagnostics for the attendance authentication path.
+
+Whether a request is sampled is decided before anything is formatted: the
+disabled path is one attribute check, and the configuration is re-read from
+the shared cache at most every REFRESH_SECONDS so it can be switched at
+runtime (see the auth_diagnostics management command) without a deploy.
+
+Settings (AUTH_DIAGNOSTICS):
+    ENABLED: collect diagnostics at all (default False)
+    DEFAULT_SAMPLE_RATE: fraction of requests sampled on unlisted routes
+    SAMPLE_RATES: {url name: fraction}, e.g. {'attendance:mark-attendance': 0.05}
+    REFRESH_SECONDS: how often the runtime override is re-read from the cache
+"""
+import logging
+import random
+import time
+from django.conf import settings
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+OVERRIDE_CACHE_KEY = 'attendance:auth_diagnostics:override'
+
+
+class AuthDiagnostics:
+    """Decides per request whether auth diagnostics should be collected."""
+
+    def __init__(self):
+        self.enabled = False
+        self.default_rate = 0.0
+        self.sample_rates = {}
+        self._refresh_at = 0.0
+
+    def _load(self):
+        config = dict(getattr(settings, 'AUTH_DIAGNOSTICS', {}))
+        try:
+            override = cache.get(OVERRIDE_CACHE_KEY)
+        except Exception:
+            override = None
+        if override:
+            config.update(override)
+
+        self.enabled = bool(config.get('ENABLED', False))
+        self.default_rate = float(config.get('DEFAULT_SAMPLE_RATE', 0.0))
+        self.sample_rates = dict(config.get('SAMPLE_RATES', {}))
+        self._refresh_at = time.monotonic() + config.get('REFRESH_SECONDS', 10)
+
+    def sample(self, request):
+        """Return True if diagnostics should be collected for this request."""
+        if time.monotonic() >= self._refresh_at:
+            self._load()
+        if not self.enabled or not logger.isEnabledFor(logging.INFO):
+            return False
+
+        match = getattr(request, 'resolver_match', None)
+        rate = self.sample_rates.get(match.view_name, self.default_rate) if match else self.default_rate
+        return rate > 0 and (rate >= 1 or random.random() < rate)
+
+    def set_override(self, timeout=None, **config):
+        """
+        Store a runtime override shared by every process using the cache.
+
+        Args:
+            timeout (int, optional): Seconds until the override lapses (default: never)
+            **config: AUTH_DIAGNOSTICS keys to override
+        """
+        cache.set(OVERRIDE_CACHE_KEY, config, timeout=timeout)
+        self._refresh_at = 0.0
+
+    def clear_override(self):
+        """Drop the runtime override and fall back to settings."""
+        cache.delete(OVERRIDE_CACHE_KEY)
+        self._refresh_at = 0.0
+
+
+auth_diagnostics = AuthDiagnostics()
+
+
+def log_request_diagnostics(request, auth_class):
+    """Log the request headers seen by auth_class, with credentials redacted."""
+    headers = {
+        key: ('<redacted>' if key in ('HTTP_AUTHORIZATION', 'HTTP_COOKIE') else value)
+        for key, value in request.META.items()
+        if key.startswith('HTTP_')
+    }
+    auth_header = request.META.get('HTTP_AUTHORIZATION', '')
+    scheme, _, credentials = auth_header.partition(' ')
+    logger.info(
+        "%s diagnostics - path: %s, scheme: %s, credential prefix: %s, headers: %s",
+        auth_class, request.path, scheme or None, credentials[:10] or None, headers
+    )
@@ -0,0 +1,127 @@
+"""
+Streaming exports of attendance records.
+
+Rows are read with a server-side cursor (QuerySet.iterator) as plain tuples
+and encoded a chunk at a time, so memory use does not grow with the size of
+the export. Used by AttendanceExportView and the export_attendance command.
+"""
+import csv
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from .models import ArchivedAttendanceRecord, AttendanceRecord
+
+EXPORT_FORMATS = ('csv', 'jsonl')
+
+EXPORT_COLUMNS = (
+    ('id', 'id'),
+    ('external_session_id', 'external_session_id'),
+    ('course_id', 'course_id'),
+    ('student_id', 'student_id'),
+    ('student_email', 'student__email'),
+    ('student_external_id', 'student_external_id'),
+    ('status', 'status'),
+    ('method', 'method'),
+    ('source', 'source'),
+    ('marked_at', 'marked_at'),
+    ('synced_with_spoc', 'synced_with_spoc'),
+    ('last_sync_attempt', 'last_sync_attempt'),
+    ('sync_error', 'sync_error'),
+)
+
+CONTENT_TYPES = {
+    'csv': 'text/csv',
+    'jsonl': 'application/x-ndjson',
+}
+
+
+def get_chunk_size():
+    """Rows fetched from the server-side cursor per round trip."""
+    return getattr(settings, 'ATTENDANCE_EXPORT_CHUNK_SIZE', 2000)
+
+
+def export_queryset(marked_from=None, marked_before=None, session_id=None, synced=None):
+    """
+    Build the queryset of rows to export, in id order.
+
+    When the range starts before the hot cutoff (or has no start), records
+    moved to ArchivedAttendanceRecord are included with a UNION ALL. Months
+    already written to files by archive_attendance_partitions are not.
+
+    Args:
+        marked_from (datetime, optional): Only records marked at or after this
+        marked_before (datetime, optional): Only records marked before this
+        session_id (UUID, optional): Only records of this session
+        synced (bool, optional): Only records with this synced_with_spoc state
+
+    Returns:
+        QuerySet: Tuples in EXPORT_COLUMNS order
+    """
+    from .partitions import reaches_archive
+
+    models = [AttendanceRecord]
+    if reaches_archive(marked_from):
+        models.append(ArchivedAttendanceRecord)
+
+    querysets = []
+    for model in models:
+        qs = model.objects.all()
+        if marked_from is not None:
+            qs = qs.filter(marked_at__gte=marked_from)
+        if marked_before is not None:
+            qs = qs.filter(marked_at__lt=marked_before)
+        if session_id is not None:
+            qs = qs.filter(external_session_id=session_id)
+        if synced is not None:
+            qs = qs.filter(synced_with_spoc=synced)
+        querysets.append(qs.order_by().values_list(*(lookup for _, lookup in EXPORT_COLUMNS)))
+
+    qs = querysets[0].union(*querysets[1:], all=True) if len(querysets) > 1 else querysets[0]
+    return qs.order_by('id')
+
+
+class _Echo:
+    """File-like object whose write() hands the encoded line back to the caller."""
+
+    def write(self, value):
+        return value
+
+
+def iter_csv(queryset):
+    """Yield the export as CSV, one chunk of rows per yielded string."""
+    writer = csv.writer(_Echo())
+    yield writer.writerow([name for name, _ in EXPORT_COLUMNS])
+    yield from _iter_chunks(queryset, writer.writerow)
+
+
+def iter_jsonl(queryset):
+    """Yield the export as JSON Lines, one chunk of rows per yielded string."""
+    names = [name for name, _ in EXPORT_COLUMNS]
+    encoder = DjangoJSONEncoder()
+    yield from _iter_chunks(queryset, lambda row: encoder.encode(dict(zip(names, row))) + '\n')
+
+
+def _iter_chunks(queryset, encode):
+    chunk_size = get_chunk_size()
+    lines = []
+    for row in queryset.iterator(chunk_size=chunk_size):
+        lines.append(encode(row))
+        if len(lines) >= chunk_size:
+            yield ''.join(lines)
+            lines = []
+    if lines:
+        yield ''.join(lines)
+
+
+def iter_export(queryset, export_format):
+    """
+    Yield the rows of queryset encoded as export_format.
+
+    Args:
+        queryset (QuerySet): Result of export_queryset()
+        export_format (str): One of EXPORT_FORMATS
+    """
+    if export_format == 'csv':
+        return iter_csv(queryset)
+    if export_format == 'jsonl':
+        return iter_jsonl(queryset)
+    raise ValueError(f"Unknown export format: {export_format}")
@@ -1,8 +1,63 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
 import jwt
 from datetime import datetime, timedelta
 from django.conf import settings
 from rest_framework.exceptions import AuthenticationFailed
 
+
+class VerifiedTokenCache:
+    """
+    Bounded in-process LRU cache of verified QR token payloads.
+
+    Entries are keyed by a SHA-256 of the token and expire at the token's
+    own `exp`, so an expired token is never served from the cache.
+    """
+
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(token):
+        return hashlib.sha256(token.encode()).digest()
+
+    def get(self, token):
+        """Return the cached payload for token, or None if absent or expired."""
+        key = self._key(token)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, payload = entry
+            if expires_at <= time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return dict(payload)
+
+    def set(self, token, payload, expires_at):
+        """Cache a verified payload until expires_at (a unix timestamp)."""
+        key = self._key(token)
+        with self._lock:
+            self._entries[key] = (expires_at, dict(payload))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+verified_tokens = VerifiedTokenCache(
+    maxsize=getattr(settings, 'QR_TOKEN_CACHE_MAXSIZE', 1024)
+)
+
+
 class JWTService:
     @staticmethod
     def generate_qr_token(session_id, course_id, teacher_id):
@@ -19,42 +74,79 @@ class JWTService:
             "iat": datetime.utcnow()
         }
         return jwt.encode(
-            payload, 
-            settings.JWT_SECRET_KEY, 
+            payload,
+            settings.JWT_SECRET_KEY,
             algorithm=settings.JWT_ALGORITHM
         )
 
     @staticmethod
     def verify_token(token):
         """
-        Verify JWT token and return payload if valid
+        Verify JWT token and return payload if valid.
+        A token is cryptographically verified once per process; later calls
+        are answered from `verified_tokens` until the token expires.
         """
+        payload = verified_tokens.get(token)
+        if payload is not None:
+            return payload
+
         try:
+            # Expiry is checked below so the expired path can report `exp`
+            # without decoding the token a second time.
             payload = jwt.decode(
                 token,
                 settings.JWT_SECRET_KEY,
                 algorithms=[settings.JWT_ALGORITHM],
                 audience="educate-portal",
-                issuer="spoc-dashboard"
+                issuer="spoc-dashboard",
+                options={"verify_exp": False}
             )
-            return payload
-        except jwt.ExpiredSignatureError:
+        except jwt.InvalidTokenError as e:
             raise AuthenticationFailed({
                 'error': {
-                    'code': 'token_expired',
-                    'message': 'Token has expired',
-                    'details': {
-                        'expired_at': datetime.fromtimestamp(
-                            jwt.decode(token, options={"verify_signature": False})['exp']
-                        ).isoformat()
-                    }
+                    'code': 'invalid_token',
+                    'message': str(e),
+                    'retryable': True
                 }
             })
-        except jwt.InvalidTokenError as e:
+
+        now = time.time()
+        exp = payload.get('exp')
+        if exp is None:
+            expires_at = now + settings.QR_CODE_EXPIRY_MINUTES * 60
+        elif not isinstance(exp, (int, float)):
             raise AuthenticationFailed({
                 'error': {
                     'code': 'invalid_token',
-                    'message': str(e),
+                    'message': 'Expiration Time claim (exp) must be an integer.',
                     'retryable': True
                 }
             })
+        elif exp <= now:
+            raise AuthenticationFailed({
+                'error': {
+                    'code': 'token_expired',
+                    'message': 'Token has expired',
+                    'details': {
+                        'expired_at': datetime.fromtimestamp(exp).isoformat()
+                    }
+                }
+            })
+        else:
+            expires_at = exp
+
+        verified_tokens.set(token, payload, expires_at)
+        return payload
+
+    @staticmethod
+    def peek_course_id(token):
+        """
+        Return the course_id carried by a valid QR token.
+        Returns '' for anything that is not a valid, unexpired QR token.
+        """
+        if not token:
+            return ''
+        try:
+            return str(JWTService.verify_token(token).get('course_id') or '')
+        except AuthenticationFailed:
+            return ''
@@ -0,0 +1,49 @@
+import os
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from ...partitions import add_months, archive_partition_to_file, list_archive_partitions, month_start
+
+
+class Command(BaseCommand):
+    help = (
+        'Write old monthly attendance archive partitions to gzip-compressed JSON Lines '
+        'files and drop them from the database'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dir', required=True, help='Directory the archive files are written to')
+        parser.add_argument(
+            '--older-than-months',
+            type=int,
+            default=None,
+            help='Archive months older than this (default: settings.ATTENDANCE_ARCHIVE_AFTER_MONTHS)'
+        )
+        parser.add_argument('--dry-run', action='store_true', help='List the partitions without archiving them')
+
+    def handle(self, *args, **options):
+        directory = options['dir']
+        if not os.path.isdir(directory):
+            raise CommandError(f"{directory} is not a directory")
+        older_than = options['older_than_months']
+        if older_than is None:
+            older_than = getattr(settings, 'ATTENDANCE_ARCHIVE_AFTER_MONTHS', 24)
+        hot_months = getattr(settings, 'ATTENDANCE_HOT_MONTHS', 6)
+        if older_than < hot_months:
+            raise CommandError(f'--older-than-months must be at least ATTENDANCE_HOT_MONTHS ({hot_months})')
+
+        before = add_months(month_start(timezone.localdate()), -older_than)
+        months = [month for month in list_archive_partitions() if month < before]
+        if not months:
+            self.stdout.write(f"No archive partitions before {before:%Y-%m}.")
+            return
+
+        for month in months:
+            if options['dry_run']:
+                self.stdout.write(f"Would archive {month:%Y-%m}")
+                continue
+            result = archive_partition_to_file(month, directory)
+            self.stdout.write(f"{month:%Y-%m}: {result['rows']} rows -> {result['path']} (sha256 {result['sha256']})")
+
+        if not options['dry_run']:
+            self.stdout.write(self.style.SUCCESS(f"Archived {len(months)} partitions."))
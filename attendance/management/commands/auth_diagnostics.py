@@ -0,0 +1,62 @@
+from django.core.management.base import BaseCommand, CommandError
+from ...diagnostics import auth_diagnostics
+
+
+class Command(BaseCommand):
+    help = (
+        'Switch sampled attendance auth diagnostics on or off at runtime. '
+        'The switch is stored in the default cache, so it reaches every worker '
+        'only when that cache is shared (REDIS_URL).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('action', choices=['enable', 'disable', 'reset', 'status'])
+        parser.add_argument(
+            '--rate',
+            action='append',
+            default=[],
+            metavar='URL_NAME=RATE',
+            help='Per-route sample rate, e.g. attendance:mark-attendance=0.05 (repeatable)'
+        )
+        parser.add_argument(
+            '--default-rate',
+            type=float,
+            default=None,
+            help='Sample rate for routes without an explicit --rate'
+        )
+        parser.add_argument(
+            '--minutes',
+            type=int,
+            default=None,
+            help='Automatically fall back to settings after this many minutes'
+        )
+
+    def handle(self, *args, **options):
+        action = options['action']
+
+        if action == 'reset':
+            auth_diagnostics.clear_override()
+        elif action in ('enable', 'disable'):
+            override = {'ENABLED': action == 'enable'}
+            if options['default_rate'] is not None:
+                override['DEFAULT_SAMPLE_RATE'] = options['default_rate']
+            if options['rate']:
+                override['SAMPLE_RATES'] = self.parse_rates(options['rate'])
+            timeout = options['minutes'] * 60 if options['minutes'] else None
+            auth_diagnostics.set_override(timeout=timeout, **override)
+
+        auth_diagnostics._load()
+        self.stdout.write(
+            f"Auth diagnostics {'enabled' if auth_diagnostics.enabled else 'disabled'} "
+            f"(default rate {auth_diagnostics.default_rate}, route rates {auth_diagnostics.sample_rates})"
+        )
+
+    def parse_rates(self, values):
+        rates = {}
+        for value in values:
+            name, _, rate = value.partition('=')
+            try:
+                rates[name] = float(rate)
+            except ValueError:
+                raise CommandError(f'Invalid --rate {value!r}; expected URL_NAME=RATE')
+        return rates
@@ -0,0 +1,91 @@
+import logging
+import os
+import time
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.test import RequestFactory
+from rest_framework.request import Request
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.tokens import AccessToken
+from ...authentication import DebugJWTAuthentication
+from ...diagnostics import auth_diagnostics
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Benchmark per-request overhead of the attendance auth classes over plain JWT authentication'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--iterations',
+            type=int,
+            default=5000,
+            help='Number of authentications per run (default: 5000)'
+        )
+        parser.add_argument(
+            '--rounds',
+            type=int,
+            default=5,
+            help='Runs per variant; the fastest is reported (default: 5)'
+        )
+
+    def handle(self, *args, **options):
+        iterations = options['iterations']
+        user, _ = User.objects.get_or_create(
+            email='bench-auth@example.com',
+            defaults={'username': 'bench-auth', 'name': 'Bench Auth'}
+        )
+        token = str(AccessToken.for_user(user))
+        factory = RequestFactory()
+
+        def make_request():
+            request = factory.post(
+                '/api/v1/attendance/mark-attendance/',
+                HTTP_AUTHORIZATION=f'Bearer {token}',
+                HTTP_USER_AGENT='bench-auth/1.0',
+                HTTP_X_FORWARDED_FOR='10.0.0.1',
+            )
+            return Request(request)
+
+        # Authenticate against the user fetched once so the numbers measure
+        # the auth classes rather than the user lookup.
+        variants = (
+            ('JWTAuthentication', JWTAuthentication(), False),
+            ('DebugJWTAuthentication', DebugJWTAuthentication(), False),
+            ('DebugJWT (sampled 100%)', DebugJWTAuthentication(), True),
+        )
+        results = {}
+        logger = logging.getLogger('attendance')
+        previous_level = logger.level
+        sink = logging.StreamHandler(open(os.devnull, 'w'))
+        try:
+            for _ in range(options['rounds']):
+                for name, authenticator, sampled in variants:
+                    authenticator.get_user = lambda validated_token: user
+                    requests_ = [make_request() for _ in range(iterations)]
+                    if sampled:
+                        # Format every record into /dev/null so the logging cost is paid.
+                        logger.setLevel(logging.INFO)
+                        logger.addHandler(sink)
+                        auth_diagnostics.set_override(ENABLED=True, DEFAULT_SAMPLE_RATE=1.0)
+                    start = time.perf_counter()
+                    for request in requests_:
+                        authenticator.authenticate(request)
+                    elapsed = (time.perf_counter() - start) / iterations * 1e6
+                    if sampled:
+                        auth_diagnostics.clear_override()
+                        logger.setLevel(previous_level)
+                        logger.removeHandler(sink)
+                    results[name] = min(results.get(name, elapsed), elapsed)
+        finally:
+            auth_diagnostics.clear_override()
+            logger.setLevel(previous_level)
+            logger.removeHandler(sink)
+            sink.stream.close()
+
+        baseline = results['JWTAuthentication']
+        for name, per_request in results.items():
+            self.stdout.write(
+                f'{name:<24} {per_request:8.1f} us/request  ({per_request - baseline:+.1f} us over plain JWT)'
+            )
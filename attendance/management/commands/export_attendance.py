@@ -0,0 +1,81 @@
+import sys
+import uuid
+from datetime import datetime, timedelta
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from ...exporting import EXPORT_FORMATS, export_queryset, iter_export
+
+
+class Command(BaseCommand):
+    help = 'Stream attendance records to a CSV or JSON Lines file'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--format',
+            choices=EXPORT_FORMATS,
+            default='csv',
+            help='Output format (default: csv)'
+        )
+        parser.add_argument(
+            '--from',
+            dest='date_from',
+            help='First day to export, YYYY-MM-DD (inclusive)'
+        )
+        parser.add_argument(
+            '--to',
+            dest='date_to',
+            help='Last day to export, YYYY-MM-DD (inclusive)'
+        )
+        parser.add_argument(
+            '--session',
+            help='Only export this external session id'
+        )
+        parser.add_argument(
+            '--synced',
+            choices=('true', 'false'),
+            help='Only export records with this SPOC sync state'
+        )
+        parser.add_argument(
+            '--output',
+            '-o',
+            help='File to write to (default: stdout)'
+        )
+
+    def handle(self, *args, **options):
+        queryset = export_queryset(
+            marked_from=self.parse_day(options['date_from'], '--from'),
+            marked_before=self.parse_day(options['date_to'], '--to', next_day=True),
+            session_id=self.parse_session(options['session']),
+            synced=None if options['synced'] is None else options['synced'] == 'true'
+        )
+
+        output = open(options['output'], 'w', newline='', encoding='utf-8') if options['output'] else sys.stdout
+        try:
+            for chunk in iter_export(queryset, options['format']):
+                output.write(chunk)
+        finally:
+            if output is not sys.stdout:
+                output.close()
+
+        if options['output']:
+            self.stderr.write(self.style.SUCCESS(f"Exported attendance to {options['output']}"))
+
+    def parse_day(self, value, option, next_day=False):
+        """Return the start of the given day (or of the day after) as an aware datetime."""
+        if not value:
+            return None
+        day = parse_date(value)
+        if day is None:
+            raise CommandError(f'{option} must be a date in YYYY-MM-DD format')
+        if next_day:
+            day += timedelta(days=1)
+        return timezone.make_aware(datetime.combine(day, datetime.min.time()))
+
+    def parse_session(self, value):
+        if not value:
+            return None
+        try:
+            return uuid.UUID(value)
+        except ValueError:
+            raise CommandError('--session must be a valid UUID')
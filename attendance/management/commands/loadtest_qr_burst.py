@@ -0,0 +1,341 @@
+import json
+import math
+import statistics
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from rest_framework_simplejwt.tokens import AccessToken
+from perfdata import seeding
+from ... import spoc_client
+from ...jwt_utils import JWTService, verified_tokens
+from ...models import AttendanceRecord, SpocSyncOutbox
+from ...outbox import reset_drain_schedule
+from ...tasks import drain_spoc_outbox
+
+User = get_user_model()
+
+EMAIL_DOMAIN = 'loadtest.invalid'
+
+# Requests each student sends, per flow
+FLOWS = {
+    'two-step': ('scan', 'mark'),
+    'one-shot': ('scan-and-mark',),
+}
+
+
+class FakeSpocHandler(BaseHTTPRequestHandler):
+    """Accepts every mark like SPOC would, after an optional delay."""
+    delay = 0.0
+    received = 0
+    lock = threading.Lock()
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        with FakeSpocHandler.lock:
+            FakeSpocHandler.received += 1
+        if self.delay:
+            time.sleep(self.delay)
+        body = b'{"status": "ok"}'
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of values (0 for an empty list)."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(pct / 100 * len(ordered)) - 1)]
+
+
+class Command(BaseCommand):
+    help = (
+        'Simulate a lecture hall scanning one QR code: every student scans and marks '
+        'attendance within the window, against the configured database and a fake SPOC server'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--students', type=int, default=500, help='Students in the hall (default: 500)')
+        parser.add_argument(
+            '--window', type=float, default=60.0,
+            help='Seconds over which the students arrive; 0 sends everyone at once (default: 60)'
+        )
+        parser.add_argument('--concurrency', type=int, default=50, help='Client threads (default: 50)')
+        parser.add_argument(
+            '--spoc-delay-ms', type=float, default=20.0,
+            help='Latency of the fake SPOC server per mark (default: 20)'
+        )
+        parser.add_argument(
+            '--flow', choices=[*FLOWS, 'both'], default='two-step',
+            help='two-step: scan then mark-attendance; one-shot: scan-and-mark; both: run each and compare '
+                 '(default: two-step)'
+        )
+        parser.add_argument(
+            '--rtt-ms', type=float, default=0.0,
+            help='Network round-trip time added to every request, as seen from a phone (default: 0)'
+        )
+        parser.add_argument('--json', action='store_true', help='Print the report as JSON')
+        parser.add_argument(
+            '--dataset', action='store_true',
+            help='Use the first --students users of the seed_perf_data dataset, and its attendance table, '
+                 'instead of throwaway students'
+        )
+        parser.add_argument('--keep', action='store_true', help='Keep the generated students and records')
+        parser.add_argument('--max-p99-ms', type=float, help='Fail if any endpoint p99 exceeds this')
+        parser.add_argument('--max-queries', type=int, help='Fail if any request runs more queries than this')
+        parser.add_argument(
+            '--max-tasks', type=int,
+            help='Fail if the burst publishes more Celery tasks than this'
+        )
+
+    def handle(self, *args, **options):
+        students = self.get_students(options['students'], options['dataset'])
+        session_ids = []
+        flows = list(FLOWS) if options['flow'] == 'both' else [options['flow']]
+
+        FakeSpocHandler.delay = options['spoc_delay_ms'] / 1000
+        FakeSpocHandler.received = 0
+        server = ThreadingHTTPServer(('127.0.0.1', 0), FakeSpocHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+
+        reports = []
+        try:
+            with override_settings(
+                SPOC_BASE_URL=f'http://127.0.0.1:{server.server_port}',
+                SPOC_API_KEY='loadtest',
+                ATTENDANCE_RATE_LIMIT='10/minute',
+            ):
+                for flow in flows:
+                    # Each flow marks a fresh session from a cold start
+                    session_id = uuid.uuid4()
+                    session_ids.append(session_id)
+                    qr_token = JWTService.generate_qr_token(session_id, 'LOADTEST-COURSE', 'LOADTEST-TEACHER')
+                    published = []
+                    FakeSpocHandler.received = 0
+                    self.reset_process_state()
+                    with mock.patch.object(
+                        drain_spoc_outbox, 'apply_async',
+                        side_effect=lambda *a, **kw: published.append(kw.get('countdown'))
+                    ):
+                        reports.append(self.run_burst(students, session_id, qr_token, flow, options, published))
+        finally:
+            server.shutdown()
+            server.server_close()
+            self.reset_process_state()
+            if not options['keep']:
+                if options['dataset']:
+                    AttendanceRecord.objects.filter(external_session_id__in=session_ids).delete()
+                else:
+                    User.objects.filter(email__endswith=f'@{EMAIL_DOMAIN}').delete()
+
+        if options['json']:
+            self.stdout.write(json.dumps(reports[0] if len(reports) == 1 else reports, indent=2))
+        else:
+            for report in reports:
+                self.print_report(report)
+            if len(reports) > 1:
+                self.print_comparison(reports)
+        self.check_gates(reports, options)
+
+    def get_students(self, count, dataset):
+        if dataset:
+            users = list(User.objects.filter(email__endswith=f'@{seeding.EMAIL_DOMAIN}').order_by('id')[:count])
+            if len(users) < count:
+                raise CommandError(f'The seeded dataset has {len(users)} users; run seed_perf_data first')
+        else:
+            User.objects.filter(email__endswith=f'@{EMAIL_DOMAIN}').delete()
+            ids = seeding.seed_users(count, domain=EMAIL_DOMAIN, prefix='loadtest-student')
+            users = list(User.objects.filter(pk__in=ids).order_by('id'))
+        return [(user, str(AccessToken.for_user(user))) for user in users]
+
+    @staticmethod
+    def reset_process_state():
+        """Start from a cold token cache and a client pointed at the current SPOC_BASE_URL."""
+        verified_tokens.clear()
+        reset_drain_schedule()
+        spoc_client._client = None
+        spoc_client._client_pid = None
+
+    def run_burst(self, students, session_id, qr_token, flow, options, published):
+        samples = {name: [] for name in FLOWS[flow]}
+        per_student = []
+        rtt = options['rtt_ms'] / 1000
+        samples_lock = threading.Lock()
+        outbox_depth = []
+        done = threading.Event()
+
+        def sample_outbox():
+            while not done.is_set():
+                outbox_depth.append(SpocSyncOutbox.objects.count())
+                time.sleep(0.25)
+            connection.close()
+
+        def timed(client, name, path, payload, token):
+            with CaptureQueriesContext(connection) as queries:
+                start = time.perf_counter()
+                if rtt:
+                    time.sleep(rtt)
+                response = client.post(
+                    path, json.dumps(payload), content_type='application/json',
+                    HTTP_AUTHORIZATION=f'Bearer {token}'
+                )
+                elapsed = (time.perf_counter() - start) * 1000
+            with samples_lock:
+                samples[name].append((elapsed, len(queries), response.status_code))
+            return elapsed
+
+        def student_flow(index, start_at):
+            user, access_token = students[index]
+            client = Client(SERVER_NAME='localhost')
+            try:
+                time.sleep(max(0.0, start_at - time.perf_counter()))
+                qr_data = json.dumps({'session_id': str(session_id), 'token': qr_token})
+                if flow == 'one-shot':
+                    total = timed(client, 'scan-and-mark', '/api/v1/attendance/scan-and-mark/', {
+                        'qr_data': qr_data
+                    }, access_token)
+                else:
+                    total = timed(client, 'scan', '/api/v1/attendance/scan/', {
+                        'qr_data': qr_data
+                    }, access_token)
+                    total += timed(client, 'mark', '/api/v1/attendance/mark-attendance/', {
+                        'session_id': str(session_id),
+                        'token': qr_token,
+                        'student_external_id': user.student_external_id
+                    }, access_token)
+                with samples_lock:
+                    per_student.append(total)
+            finally:
+                connection.close()
+
+        monitor = threading.Thread(target=sample_outbox, daemon=True)
+        monitor.start()
+        spacing = options['window'] / len(students) if students else 0
+        burst_start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options['concurrency']) as executor:
+            list(executor.map(
+                lambda i: student_flow(i, burst_start + i * spacing),
+                range(len(students))
+            ))
+        burst_seconds = time.perf_counter() - burst_start
+        done.set()
+        monitor.join()
+
+        # What the Celery worker would do once the burst has been queued
+        pending = SpocSyncOutbox.objects.count()
+        drain_start = time.perf_counter()
+        drained = drain_spoc_outbox()
+        drain_seconds = time.perf_counter() - drain_start
+
+        report = {
+            'flow': flow,
+            'students': len(students),
+            'window_seconds': options['window'],
+            'burst_seconds': round(burst_seconds, 2),
+            'throughput_rps': round(sum(len(s) for s in samples.values()) / burst_seconds, 1) if burst_seconds else 0,
+            'per_student': {
+                'round_trips': len(FLOWS[flow]),
+                'p50_ms': round(percentile(per_student, 50), 1),
+                'p99_ms': round(percentile(per_student, 99), 1),
+            },
+            'endpoints': {},
+            'celery': {
+                'tasks_published': len(published),
+                'outbox_max_depth': max([*outbox_depth, pending]),
+                'outbox_pending_after_burst': pending,
+            },
+            'spoc': {
+                'drain_seconds': round(drain_seconds, 2),
+                'synced': drained['synced'],
+                'failed': drained['failed'],
+                'requests_received': FakeSpocHandler.received,
+            },
+            'records': AttendanceRecord.objects.filter(external_session_id=session_id).count(),
+        }
+        for name, rows in samples.items():
+            latencies = [row[0] for row in rows]
+            queries = [row[1] for row in rows]
+            statuses = {}
+            for row in rows:
+                statuses[str(row[2])] = statuses.get(str(row[2]), 0) + 1
+            report['endpoints'][name] = {
+                'requests': len(rows),
+                'status_codes': statuses,
+                'p50_ms': round(percentile(latencies, 50), 1),
+                'p99_ms': round(percentile(latencies, 99), 1),
+                'max_ms': round(max(latencies, default=0), 1),
+                'queries_mean': round(statistics.mean(queries), 2) if queries else 0,
+                'queries_max': max(queries, default=0),
+            }
+        return report
+
+    def print_report(self, report):
+        self.stdout.write(
+            f"[{report['flow']}] {report['students']} students over {report['window_seconds']}s: "
+            f"burst took {report['burst_seconds']}s, {report['throughput_rps']} req/s"
+        )
+        per_student = report['per_student']
+        self.stdout.write(
+            f"  per student: {per_student['round_trips']} round trips, "
+            f"p50={per_student['p50_ms']:.1f}ms p99={per_student['p99_ms']:.1f}ms"
+        )
+        for name, stats in report['endpoints'].items():
+            self.stdout.write(
+                f"  {name:<13} n={stats['requests']:<5} p50={stats['p50_ms']:>7.1f}ms "
+                f"p99={stats['p99_ms']:>7.1f}ms max={stats['max_ms']:>7.1f}ms "
+                f"queries mean={stats['queries_mean']} max={stats['queries_max']} "
+                f"status={stats['status_codes']}"
+            )
+        celery = report['celery']
+        spoc = report['spoc']
+        self.stdout.write(
+            f"  celery tasks published={celery['tasks_published']} "
+            f"outbox max depth={celery['outbox_max_depth']}"
+        )
+        self.stdout.write(
+            f"  drain {spoc['drain_seconds']}s: synced={spoc['synced']} failed={spoc['failed']} "
+            f"spoc requests={spoc['requests_received']}; records={report['records']}"
+        )
+
+    def print_comparison(self, reports):
+        baseline, candidate = reports[0]['per_student'], reports[-1]['per_student']
+        self.stdout.write(
+            f"{reports[-1]['flow']} vs {reports[0]['flow']} per student: "
+            f"p50 {candidate['p50_ms']:.1f}ms vs {baseline['p50_ms']:.1f}ms, "
+            f"p99 {candidate['p99_ms']:.1f}ms vs {baseline['p99_ms']:.1f}ms"
+        )
+
+    def check_gates(self, reports, options):
+        violations = []
+        for report in reports:
+            flow = report['flow']
+            for name, stats in report['endpoints'].items():
+                unexpected = {code: n for code, n in stats['status_codes'].items() if not code.startswith('2')}
+                if unexpected:
+                    violations.append(f"{flow} {name}: non-2xx responses {unexpected}")
+                if options['max_p99_ms'] is not None and stats['p99_ms'] > options['max_p99_ms']:
+                    violations.append(f"{flow} {name}: p99 {stats['p99_ms']}ms > {options['max_p99_ms']}ms")
+                if options['max_queries'] is not None and stats['queries_max'] > options['max_queries']:
+                    violations.append(f"{flow} {name}: {stats['queries_max']} queries > {options['max_queries']}")
+            if options['max_tasks'] is not None and report['celery']['tasks_published'] > options['max_tasks']:
+                violations.append(
+                    f"{flow} celery: {report['celery']['tasks_published']} tasks published > {options['max_tasks']}"
+                )
+            if report['records'] != report['students']:
+                violations.append(f"{flow}: recorded {report['records']} marks for {report['students']} students")
+        if violations:
+            raise CommandError('Load test gates failed:\n  ' + '\n  '.join(violations))
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand, CommandError
+from ...partitions import get_hot_cutoff, list_archive_partitions, move_cold_records
+
+
+class Command(BaseCommand):
+    help = 'Move settled attendance records older than the hot window into the monthly archive partitions'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--hot-months',
+            type=int,
+            default=None,
+            help='Months kept in the hot table (default: settings.ATTENDANCE_HOT_MONTHS)'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=None,
+            help='Records moved per transaction (default: settings.ATTENDANCE_ARCHIVE_BATCH_SIZE)'
+        )
+
+    def handle(self, *args, **options):
+        if options['hot_months'] is not None and options['hot_months'] < 1:
+            raise CommandError('--hot-months must be at least 1')
+        cutoff = get_hot_cutoff(options['hot_months'])
+        moved = move_cold_records(cutoff=cutoff, batch_size=options['batch_size'])
+
+        self.stdout.write(self.style.SUCCESS(f"Moved {moved} records marked before {cutoff:%Y-%m-%d} to the archive."))
+        months = list_archive_partitions()
+        if months:
+            self.stdout.write(f"Archive partitions: {months[0]:%Y-%m} .. {months[-1]:%Y-%m} ({len(months)})")
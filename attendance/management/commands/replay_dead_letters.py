@@ -0,0 +1,54 @@
+import uuid
+from datetime import datetime
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from ...models import SpocDeadLetter
+from ...outbox import replay_dead_letters
+
+
+class Command(BaseCommand):
+    help = 'Queue dead-lettered attendance records for forwarding to SPOC again'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--session',
+            help='Only replay records of this external session id'
+        )
+        parser.add_argument(
+            '--since',
+            help='Only replay records dead-lettered on or after this date (YYYY-MM-DD)'
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=None,
+            help='Dead letters replayed per transaction (default: SPOC_RETRY_SWEEP_CHUNK_SIZE)'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Only report how many dead letters match'
+        )
+
+    def handle(self, *args, **options):
+        dead_letters = SpocDeadLetter.objects.all()
+        if options['session']:
+            try:
+                dead_letters = dead_letters.filter(record__external_session_id=uuid.UUID(options['session']))
+            except ValueError:
+                raise CommandError('--session must be a valid UUID')
+        if options['since']:
+            day = parse_date(options['since'])
+            if day is None:
+                raise CommandError('--since must be a date in YYYY-MM-DD format')
+            dead_letters = dead_letters.filter(
+                dead_at__gte=timezone.make_aware(datetime.combine(day, datetime.min.time()))
+            )
+
+        if options['dry_run']:
+            self.stdout.write(f'{dead_letters.count()} dead letters would be replayed.')
+            return
+
+        replayed = replay_dead_letters(dead_letters, chunk_size=options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(f'Queued {replayed} dead-lettered records for forwarding.'))
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+from ...rollups import rebuild_rollups, run_rollup
+
+
+class Command(BaseCommand):
+    help = 'Fold new attendance records into the reporting rollup tables'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--rebuild',
+            action='store_true',
+            help='Empty the rollup tables and fold every record again'
+        )
+        parser.add_argument(
+            '--max-batches',
+            type=int,
+            default=None,
+            help='Stop after this many batches (default: run to the end)'
+        )
+
+    def handle(self, *args, **options):
+        if options['rebuild']:
+            self.stdout.write('Rebuilding attendance rollups from scratch...')
+            result = rebuild_rollups()
+        else:
+            result = run_rollup(max_batches=options['max_batches'])
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Folded records {result['from_id']}..{result['to_id']} in {result['batches']} batches."
+            )
+        )
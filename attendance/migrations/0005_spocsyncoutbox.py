@@ -0,0 +1,28 @@
+# Generated by Django 5.2.4 on 2026-10-19 07:09
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('attendance', '0004_alter_attendancerecord_options_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SpocSyncOutbox',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('token', models.TextField(blank=True, help_text='QR token to forward the mark with (blank if none was supplied)')),
+                ('created_at', models.DateTimeField(auto_now_add=True, help_text='When the record was queued for forwarding')),
+                ('record', models.OneToOneField(help_text='Attendance record to forward', on_delete=django.db.models.deletion.CASCADE, related_name='spoc_outbox', to='attendance.attendancerecord')),
+            ],
+            options={
+                'verbose_name': 'SPOC Sync Outbox Entry',
+                'verbose_name_plural': 'SPOC Sync Outbox',
+                'ordering': ['id'],
+            },
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.4 on 2026-10-19 07:20
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('attendance', '0005_spocsyncoutbox'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='attendancerecord',
+            index=models.Index(fields=['student', '-marked_at', '-id'], include=('status',), name='attendance_student_recent_idx'),
+        ),
+    ]
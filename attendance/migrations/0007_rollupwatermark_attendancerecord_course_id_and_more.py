@@ -0,0 +1,75 @@
+# Generated by Django 5.2.4 on 2026-10-19 07:24
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('attendance', '0006_attendancerecord_student_recent_idx'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RollupWatermark',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True)),
+                ('last_record_id', models.BigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Rollup Watermark',
+                'verbose_name_plural': 'Rollup Watermarks',
+            },
+        ),
+        migrations.AddField(
+            model_name='attendancerecord',
+            name='course_id',
+            field=models.CharField(blank=True, db_index=True, default='', help_text='Course the session belongs to, from the verified QR token', max_length=64),
+        ),
+        migrations.CreateModel(
+            name='SessionAttendanceSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('external_session_id', models.UUIDField(help_text='External session identifier from the QR code', unique=True)),
+                ('course_id', models.CharField(blank=True, default='', help_text='Course the session belongs to', max_length=64)),
+                ('present', models.PositiveIntegerField(default=0)),
+                ('late', models.PositiveIntegerField(default=0)),
+                ('absent', models.PositiveIntegerField(default=0)),
+                ('excused', models.PositiveIntegerField(default=0)),
+                ('total', models.PositiveIntegerField(default=0)),
+                ('first_marked_at', models.DateTimeField(help_text='Earliest mark in the session')),
+                ('last_marked_at', models.DateTimeField(help_text='Latest mark in the session')),
+            ],
+            options={
+                'verbose_name': 'Session Attendance Summary',
+                'verbose_name_plural': 'Session Attendance Summaries',
+                'ordering': ['-first_marked_at'],
+                'indexes': [models.Index(fields=['course_id', '-first_marked_at'], name='attendance__course__8bae43_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='StudentDailyAttendance',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(help_text='Day the records were marked on (in TIME_ZONE)')),
+                ('present', models.PositiveIntegerField(default=0)),
+                ('late', models.PositiveIntegerField(default=0)),
+                ('absent', models.PositiveIntegerField(default=0)),
+                ('excused', models.PositiveIntegerField(default=0)),
+                ('total', models.PositiveIntegerField(default=0)),
+                ('student', models.ForeignKey(help_text='Student the counts belong to', on_delete=django.db.models.deletion.CASCADE, related_name='daily_attendance', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Student Daily Attendance',
+                'verbose_name_plural': 'Student Daily Attendance',
+                'ordering': ['-date'],
+                'indexes': [models.Index(fields=['date'], name='attendance__date_6d9e9e_idx')],
+                'unique_together': {('student', 'date')},
+            },
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.2.4 on 2026-10-19 07:30
+
+from django.conf import settings
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def schedule_existing_failures(apps, schema_editor):
+    # Records that already failed are retried on the next sweep.
+    AttendanceRecord = apps.get_model('attendance', 'AttendanceRecord')
+    AttendanceRecord.objects.filter(
+        synced_with_spoc=False,
+        last_sync_attempt__isnull=False
+    ).update(retry_count=1, next_attempt_at=timezone.now())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('attendance', '0007_rollupwatermark_attendancerecord_course_id_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='attendancerecord',
+            name='next_attempt_at',
+            field=models.DateTimeField(blank=True, help_text='When the failed sync is due to be retried (empty if none is scheduled)', null=True),
+        ),
+        migrations.AddField(
+            model_name='attendancerecord',
+            name='retry_count',
+            field=models.PositiveIntegerField(default=0, help_text='Number of failed attempts to sync with the SPOC server'),
+        ),
+        migrations.AddIndex(
+            model_name='attendancerecord',
+            index=models.Index(fields=['synced_with_spoc', 'next_attempt_at'], name='attendance_sync_due_idx'),
+        ),
+        migrations.RunPython(schedule_existing_failures, migrations.RunPython.noop),
+    ]
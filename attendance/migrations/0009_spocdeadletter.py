@@ -0,0 +1,30 @@
+# Generated by Django 5.2.4 on 2026-10-19 07:32
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('attendance', '0008_attendancerecord_retry_state'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SpocDeadLetter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('error', models.TextField(blank=True, help_text='Error of the last forwarding attempt')),
+                ('retry_count', models.PositiveIntegerField(default=0, help_text='Failed attempts before the record was given up on')),
+                ('dead_at', models.DateTimeField(db_index=True, default=django.utils.timezone.now, help_text='When the record was given up on')),
+                ('record', models.OneToOneField(help_text='Attendance record that could not be forwarded', on_delete=django.db.models.deletion.CASCADE, related_name='spoc_dead_letter', to='attendance.attendancerecord')),
+            ],
+            options={
+                'verbose_name': 'SPOC Dead Letter',
+                'verbose_name_plural': 'SPOC Dead Letters',
+                'ordering': ['id'],
+            },
+        ),
+    ]
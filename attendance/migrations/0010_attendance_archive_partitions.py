@@ -0,0 +1,94 @@
+# Generated by Django 5.2.4 on 2026-10-19 07:36
+
+from django.db import migrations, models
+
+CREATE_ARCHIVE_TABLE = """
+CREATE TABLE attendance_attendancerecord_archive (
+    id bigint NOT NULL,
+    external_session_id uuid NOT NULL,
+    student_id bigint NOT NULL,
+    course_id varchar(64) NOT NULL,
+    student_external_id varchar(255) NULL,
+    marked_at timestamp with time zone NOT NULL,
+    status varchar(10) NOT NULL,
+    method varchar(10) NOT NULL,
+    source varchar(50) NOT NULL,
+    user_agent text NOT NULL,
+    ip_address inet NULL,
+    synced_with_spoc boolean NOT NULL,
+    sync_error text NULL,
+    last_sync_attempt timestamp with time zone NULL,
+    retry_count integer NOT NULL CHECK (retry_count >= 0),
+    next_attempt_at timestamp with time zone NULL,
+    PRIMARY KEY (id, marked_at)
+) PARTITION BY RANGE (marked_at);
+CREATE INDEX attendance_archive_student_idx
+    ON attendance_attendancerecord_archive (student_id, marked_at);
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('attendance', '0009_spocdeadletter'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedAttendanceRecord',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('external_session_id', models.UUIDField()),
+                ('course_id', models.CharField(blank=True, default='', max_length=64)),
+                ('student_external_id', models.CharField(blank=True, max_length=255, null=True)),
+                ('marked_at', models.DateTimeField()),
+                ('status', models.CharField(choices=[('present', 'Present'), ('absent', 'Absent'), ('late', 'Late'), ('excused', 'Excused')], max_length=10)),
+                ('method', models.CharField(choices=[('QR', 'QR Code'), ('MANUAL', 'Manual Entry'), ('AUTO', 'Automatic')], max_length=10)),
+                ('source', models.CharField(max_length=50)),
+                ('user_agent', models.TextField(blank=True)),
+                ('ip_address', models.GenericIPAddressField(blank=True, null=True)),
+                ('synced_with_spoc', models.BooleanField(default=False)),
+                ('sync_error', models.TextField(blank=True, null=True)),
+                ('last_sync_attempt', models.DateTimeField(blank=True, null=True)),
+                ('retry_count', models.PositiveIntegerField(default=0)),
+                ('next_attempt_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name': 'Archived Attendance Record',
+                'verbose_name_plural': 'Archived Attendance Records',
+                'db_table': 'attendance_attendancerecord_archive',
+                'ordering': ['-marked_at'],
+                'managed': False,
+            },
+        ),
+        migrations.RemoveIndex(
+            model_name='attendancerecord',
+            name='attendance__student_b1beb8_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='attendancerecord',
+            name='attendance__marked__aa864c_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='attendancerecord',
+            name='attendance__student_fe4554_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='attendancerecord',
+            name='attendance__synced__7ee36c_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='attendancerecord',
+            name='attendance__status_741eb8_idx',
+        ),
+        migrations.AlterField(
+            model_name='attendancerecord',
+            name='external_session_id',
+            field=models.UUIDField(help_text='External session identifier from the QR code'),
+        ),
+        # Monthly partitions are created by attendance.partitions as rows are archived.
+        migrations.RunSQL(
+            CREATE_ARCHIVE_TABLE,
+            'DROP TABLE attendance_attendancerecord_archive;'
+        ),
+    ]
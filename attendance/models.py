@@ -1,7 +1,123 @@
-from django.db import models
+from django.db import models, connections
 from django.conf import settings
 from django.utils import timezone
 
+
+class AttendanceRecordManager(models.Manager):
+    """Manager for AttendanceRecord with a race-free single-statement insert."""
+
+    def insert_or_get(self, queue_token=None, **fields):
+        """
+        Insert an attendance record unless the student already has one for the session.
+
+        Uses INSERT ... ON CONFLICT (external_session_id, student_id) DO NOTHING
+        and reads back either the new row or the existing one in the same
+        statement, so concurrent double-scans never raise IntegrityError.
+
+        Args:
+            queue_token (str, optional): Also queue a newly inserted record in
+                SpocSyncOutbox with this token, in the same statement. The
+                caller is responsible for scheduling the drain.
+            **fields: AttendanceRecord field values
+
+        Returns:
+            tuple: (AttendanceRecord, created)
+        """
+        model = self.model
+        record = model(**fields)
+        connection = connections[self.db]
+        opts = model._meta
+        table = connection.ops.quote_name(opts.db_table)
+        columns = [field for field in opts.concrete_fields if not field.primary_key]
+        select_columns = ', '.join(connection.ops.quote_name(field.column) for field in opts.concrete_fields)
+        values = [
+            field.get_db_prep_save(field.pre_save(record, add=True), connection)
+            for field in columns
+        ]
+        key = [record.external_session_id, record.student_id]
+
+        queue_sql = ''
+        queue_params = []
+        if queue_token is not None:
+            queue_sql = f"""
+            , queued AS (
+                INSERT INTO {connection.ops.quote_name(SpocSyncOutbox._meta.db_table)} (record_id, token, created_at)
+                SELECT id, %s, %s FROM inserted
+                ON CONFLICT (record_id) DO NOTHING
+            )"""
+            queue_params = [queue_token, timezone.now()]
+
+        sql = f"""
+            WITH inserted AS (
+                INSERT INTO {table} ({', '.join(connection.ops.quote_name(field.column) for field in columns)})
+                VALUES ({', '.join(['%s'] * len(columns))})
+                ON CONFLICT (external_session_id, student_id) DO NOTHING
+                RETURNING {select_columns}
+            ){queue_sql}
+            SELECT {select_columns}, TRUE AS was_inserted FROM inserted
+            UNION ALL
+            SELECT {select_columns}, FALSE AS was_inserted FROM {table}
+            WHERE external_session_id = %s AND student_id = %s
+              AND NOT EXISTS (SELECT 1 FROM inserted)
+        """
+        rows = list(self.raw(sql, [*values, *queue_params, *key]))
+        if not rows:
+            # A concurrent insert committed after this statement's snapshot
+            # was taken; it is visible to a fresh one.
+            rows = list(self.raw(
+                f"SELECT {select_columns}, FALSE AS was_inserted FROM {table} "
+                f"WHERE external_session_id = %s AND student_id = %s",
+                key
+            ))
+
+        record = rows[0]
+        return record, record.__dict__.pop('was_inserted')
+
+    def insert_new(self, records):
+        """
+        Insert many attendance records, skipping students already marked for their session.
+
+        Uses one multi-row INSERT ... ON CONFLICT (external_session_id, student_id)
+        DO NOTHING RETURNING, so only rows that were actually inserted are
+        reported, including when a concurrent mark wins the race.
+
+        Args:
+            records (list): Unsaved AttendanceRecord instances
+
+        Returns:
+            list: The records that were inserted, with their primary keys set
+        """
+        if not records:
+            return []
+        connection = connections[self.db]
+        opts = self.model._meta
+        columns = [field for field in opts.concrete_fields if not field.primary_key]
+        row_sql = f"({', '.join(['%s'] * len(columns))})"
+        params = [
+            field.get_db_prep_save(field.pre_save(record, add=True), connection)
+            for record in records
+            for field in columns
+        ]
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {connection.ops.quote_name(opts.db_table)} "
+                f"({', '.join(connection.ops.quote_name(field.column) for field in columns)}) "
+                f"VALUES {', '.join([row_sql] * len(records))} "
+                f"ON CONFLICT (external_session_id, student_id) DO NOTHING "
+                f"RETURNING id, student_id",
+                params
+            )
+            inserted = dict((student_id, pk) for pk, student_id in cursor.fetchall())
+
+        created = []
+        for record in records:
+            if record.student_id in inserted:
+                record.pk = inserted[record.student_id]
+                record._state.adding = False
+                created.append(record)
+        return created
+
+
 class AttendanceRecord(models.Model):
     """
     Model to track student attendance records.
@@ -19,8 +135,8 @@ class AttendanceRecord(models.Model):
         ('excused', 'Excused')
     )
 
+    # Looked up through the (external_session_id, student) unique index
     external_session_id = models.UUIDField(
-        db_index=True,
         help_text="External session identifier from the QR code"
     )
     student = models.ForeignKey(
@@ -29,6 +145,13 @@ class AttendanceRecord(models.Model):
         related_name='attendance_records',
         help_text="Student who marked the attendance"
     )
+    course_id = models.CharField(
+        max_length=64,
+        blank=True,
+        default='',
+        db_index=True,
+        help_text="Course the session belongs to, from the verified QR token"
+    )
     student_external_id = models.CharField(
         max_length=255,
         db_index=True,
@@ -81,17 +204,36 @@ class AttendanceRecord(models.Model):
         blank=True,
         help_text="When the last sync attempt was made"
     )
+    retry_count = models.PositiveIntegerField(
+        default=0,
+        help_text="Number of failed attempts to sync with the SPOC server"
+    )
+    next_attempt_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        help_text="When the failed sync is due to be retried (empty if none is scheduled)"
+    )
+
+    objects = AttendanceRecordManager()
 
     class Meta:
         verbose_name = "Attendance Record"
         verbose_name_plural = "Attendance Records"
         unique_together = (('external_session_id', 'student'),)
+        # Kept to the indexes the hot paths use: every insert maintains all of them.
         indexes = [
-            models.Index(fields=['student', 'external_session_id']),
-            models.Index(fields=['marked_at']),
-            models.Index(fields=['student_external_id']),
-            models.Index(fields=['synced_with_spoc']),
-            models.Index(fields=['status']),
+            # Serves the retry sweep: unsynced records whose retry is due.
+            models.Index(
+                fields=['synced_with_spoc', 'next_attempt_at'],
+                name='attendance_sync_due_idx'
+            ),
+            # Serves MyAttendanceListView: one student's records newest first,
+            # with status available to the filter without visiting the table.
+            models.Index(
+                fields=['student', '-marked_at', '-id'],
+                include=['status'],
+                name='attendance_student_recent_idx'
+            ),
         ]
         ordering = ['-marked_at']
 
@@ -114,3 +256,196 @@ class AttendanceRecord(models.Model):
             'sync_error', 
             'last_sync_attempt'
         ])
+
+
+class ArchivedAttendanceRecord(models.Model):
+    """
+    Attendance records moved out of the hot table once they are older than
+    ATTENDANCE_HOT_MONTHS.
+
+    Backed by a table partitioned by month on marked_at (created in
+    migration 0010 and extended by attendance.partitions), so whole months
+    can later be written to files and dropped. Its primary key is
+    (id, marked_at); ids are carried over from AttendanceRecord unchanged.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    external_session_id = models.UUIDField()
+    # No database constraint: partitions cannot be referenced cheaply and
+    # archived rows outlive their users' hot data.
+    student = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        related_name='+'
+    )
+    course_id = models.CharField(max_length=64, blank=True, default='')
+    student_external_id = models.CharField(max_length=255, null=True, blank=True)
+    marked_at = models.DateTimeField()
+    status = models.CharField(max_length=10, choices=AttendanceRecord.ATTENDANCE_STATUS)
+    method = models.CharField(max_length=10, choices=AttendanceRecord.ATTENDANCE_METHODS)
+    source = models.CharField(max_length=50)
+    user_agent = models.TextField(blank=True)
+    ip_address = models.GenericIPAddressField(null=True, blank=True)
+    synced_with_spoc = models.BooleanField(default=False)
+    sync_error = models.TextField(blank=True, null=True)
+    last_sync_attempt = models.DateTimeField(null=True, blank=True)
+    retry_count = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        managed = False
+        db_table = 'attendance_attendancerecord_archive'
+        verbose_name = "Archived Attendance Record"
+        verbose_name_plural = "Archived Attendance Records"
+        ordering = ['-marked_at']
+
+    def __str__(self):
+        return f"{self.student_id} - {self.external_session_id} - {self.status.upper()} at {self.marked_at}"
+
+
+class SpocSyncOutbox(models.Model):
+    """
+    Attendance records waiting to be forwarded to the SPOC server.
+    Rows are written next to the record insert and drained in batches by
+    attendance.tasks.drain_spoc_outbox, which deletes them once dispatched.
+    """
+    record = models.OneToOneField(
+        AttendanceRecord,
+        on_delete=models.CASCADE,
+        related_name='spoc_outbox',
+        help_text="Attendance record to forward"
+    )
+    token = models.TextField(
+        blank=True,
+        help_text="QR token to forward the mark with (blank if none was supplied)"
+    )
+    created_at = models.DateTimeField(
+        auto_now_add=True,
+        help_text="When the record was queued for forwarding"
+    )
+
+    class Meta:
+        verbose_name = "SPOC Sync Outbox Entry"
+        verbose_name_plural = "SPOC Sync Outbox"
+        ordering = ['id']
+
+    def __str__(self):
+        return f"Outbox entry for record {self.record_id}"
+
+
+class SpocDeadLetter(models.Model):
+    """
+    Attendance records whose SPOC forward failed SPOC_SYNC_MAX_RETRIES times.
+    They are no longer retried automatically; replay them in bulk with the
+    replay_dead_letters command or the admin action once the cause is fixed.
+    """
+    record = models.OneToOneField(
+        AttendanceRecord,
+        on_delete=models.CASCADE,
+        related_name='spoc_dead_letter',
+        help_text="Attendance record that could not be forwarded"
+    )
+    error = models.TextField(
+        blank=True,
+        help_text="Error of the last forwarding attempt"
+    )
+    retry_count = models.PositiveIntegerField(
+        default=0,
+        help_text="Failed attempts before the record was given up on"
+    )
+    dead_at = models.DateTimeField(
+        default=timezone.now,
+        db_index=True,
+        help_text="When the record was given up on"
+    )
+
+    class Meta:
+        verbose_name = "SPOC Dead Letter"
+        verbose_name_plural = "SPOC Dead Letters"
+        ordering = ['id']
+
+    def __str__(self):
+        return f"Dead letter for record {self.record_id}"
+
+
+class StudentDailyAttendance(models.Model):
+    """
+    Rollup of one student's attendance records for one day.
+    Maintained incrementally by attendance.rollups; never written by requests.
+    """
+    student = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='daily_attendance',
+        help_text="Student the counts belong to"
+    )
+    date = models.DateField(help_text="Day the records were marked on (in TIME_ZONE)")
+    present = models.PositiveIntegerField(default=0)
+    late = models.PositiveIntegerField(default=0)
+    absent = models.PositiveIntegerField(default=0)
+    excused = models.PositiveIntegerField(default=0)
+    total = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        verbose_name = "Student Daily Attendance"
+        verbose_name_plural = "Student Daily Attendance"
+        unique_together = (('student', 'date'),)
+        indexes = [
+            models.Index(fields=['date']),
+        ]
+        ordering = ['-date']
+
+    def __str__(self):
+        return f"{self.student_id} - {self.date}: {self.present}/{self.total} present"
+
+
+class SessionAttendanceSummary(models.Model):
+    """
+    Rollup of all attendance records of one session, grouped under its course.
+    Maintained incrementally by attendance.rollups; never written by requests.
+    """
+    external_session_id = models.UUIDField(
+        unique=True,
+        help_text="External session identifier from the QR code"
+    )
+    course_id = models.CharField(
+        max_length=64,
+        blank=True,
+        default='',
+        help_text="Course the session belongs to"
+    )
+    present = models.PositiveIntegerField(default=0)
+    late = models.PositiveIntegerField(default=0)
+    absent = models.PositiveIntegerField(default=0)
+    excused = models.PositiveIntegerField(default=0)
+    total = models.PositiveIntegerField(default=0)
+    first_marked_at = models.DateTimeField(help_text="Earliest mark in the session")
+    last_marked_at = models.DateTimeField(help_text="Latest mark in the session")
+
+    class Meta:
+        verbose_name = "Session Attendance Summary"
+        verbose_name_plural = "Session Attendance Summaries"
+        indexes = [
+            models.Index(fields=['course_id', '-first_marked_at']),
+        ]
+        ordering = ['-first_marked_at']
+
+    def __str__(self):
+        return f"{self.course_id or '-'} / {self.external_session_id}: {self.present}/{self.total} present"
+
+
+class RollupWatermark(models.Model):
+    """
+    Highest AttendanceRecord id already folded into the rollup tables.
+    One row per rollup job; locked while the job advances it.
+    """
+    name = models.CharField(max_length=50, unique=True)
+    last_record_id = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Rollup Watermark"
+        verbose_name_plural = "Rollup Watermarks"
+
+    def __str__(self):
+        return f"{self.name}: {self.last_record_id}"
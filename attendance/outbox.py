@@ -0,0 +1,239 @@
+"""
+Coalescing outbox for forwarding attendance marks to the SPOC server.
+
+Views write one SpocSyncOutbox row per new attendance record instead of
+enqueuing one Celery task per record. The first write in a flush window
+schedules a single drain task for the end of the window; a burst that fills
+a whole batch before then triggers the drain straight away. The drain task
+(attendance.tasks.drain_spoc_outbox) sends everything pending in batches.
+"""
+import logging
+import math
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+from .models import AttendanceRecord, SpocDeadLetter, SpocSyncOutbox
+
+logger = logging.getLogger(__name__)
+
+DRAIN_SCHEDULED_KEY = 'attendance:spoc_outbox:drain_scheduled'
+PENDING_COUNT_KEY = 'attendance:spoc_outbox:pending'
+
+
+def get_flush_interval():
+    """Seconds to wait after the first queued mark before draining."""
+    return getattr(settings, 'SPOC_OUTBOX_FLUSH_INTERVAL_MS', 500) / 1000
+
+
+def get_batch_size():
+    """Number of marks that triggers an immediate drain and the size of each drained batch."""
+    return getattr(settings, 'SPOC_OUTBOX_BATCH_SIZE', 100)
+
+
+def enqueue_spoc_sync(queryset, token=''):
+    """
+    Queue attendance records for forwarding to SPOC.
+
+    The outbox rows are written with a single INSERT ... SELECT, so queuing a
+    whole roster costs the same one statement as queuing a single mark.
+    Records that are already queued are left alone.
+
+    Args:
+        queryset (QuerySet): AttendanceRecord rows to forward
+        token (str): QR token to forward the marks with
+
+    Returns:
+        int: Number of records queued
+    """
+    select_sql, params = queryset.order_by().values('pk').query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {SpocSyncOutbox._meta.db_table} (record_id, token, created_at) "
+            f"SELECT pending.pk, %s, %s FROM ({select_sql}) AS pending "
+            f"ON CONFLICT (record_id) DO NOTHING",
+            [token or '', timezone.now(), *params]
+        )
+        queued = cursor.rowcount
+
+    if queued:
+        # Inside a transaction the drain must not look for the rows before they commit.
+        transaction.on_commit(lambda: schedule_drain(queued))
+    return queued
+
+
+def insert_and_enqueue(token='', **fields):
+    """
+    Insert an attendance record and queue it for forwarding in one statement.
+
+    Like AttendanceRecord.objects.insert_or_get(), but a newly inserted record
+    is written to the outbox by the same INSERT, and the drain is scheduled
+    once it commits. An existing record is returned untouched.
+
+    Args:
+        token (str): QR token to forward the mark with
+        **fields: AttendanceRecord field values
+
+    Returns:
+        tuple: (AttendanceRecord, created)
+    """
+    record, created = AttendanceRecord.objects.insert_or_get(queue_token=token or '', **fields)
+    if created:
+        transaction.on_commit(lambda: schedule_drain(1))
+    return record, created
+
+
+def get_retry_delay(retry_count):
+    """
+    Seconds to wait before retrying a forward that has failed retry_count times.
+    Doubles from SPOC_SYNC_RETRY_BASE_SECONDS up to SPOC_SYNC_RETRY_MAX_SECONDS.
+    """
+    base = getattr(settings, 'SPOC_SYNC_RETRY_BASE_SECONDS', 60)
+    ceiling = getattr(settings, 'SPOC_SYNC_RETRY_MAX_SECONDS', 3600)
+    return min(ceiling, base * 2 ** max(0, retry_count - 1))
+
+
+def requeue_due_syncs(chunk_size=None):
+    """
+    Put failed forwards whose retry is due back into the outbox.
+
+    Due records are read in (next_attempt_at, id) keyset order along the
+    (synced_with_spoc, next_attempt_at) index, chunk_size at a time. Each chunk
+    is queued with a blank token, so the dispatcher authenticates with the
+    server credential rather than the long-expired QR token. The chunk's
+    next_attempt_at is cleared in the same transaction, and the dispatcher sets
+    it again if the retry fails.
+
+    Args:
+        chunk_size (int, optional): Records per chunk (default: settings.SPOC_RETRY_SWEEP_CHUNK_SIZE)
+
+    Returns:
+        int: Number of records queued
+    """
+    chunk_size = chunk_size or getattr(settings, 'SPOC_RETRY_SWEEP_CHUNK_SIZE', 500)
+    due = AttendanceRecord.objects.filter(synced_with_spoc=False, next_attempt_at__lte=timezone.now())
+
+    queued = 0
+    last = None
+    while True:
+        chunk = due
+        if last is not None:
+            last_at, last_id = last
+            chunk = chunk.filter(next_attempt_at__gte=last_at).filter(
+                Q(next_attempt_at__gt=last_at) | Q(id__gt=last_id)
+            )
+        rows = list(chunk.order_by('next_attempt_at', 'id').values_list('next_attempt_at', 'id')[:chunk_size])
+        if not rows:
+            break
+
+        ids = [record_id for _, record_id in rows]
+        with transaction.atomic():
+            queued += enqueue_spoc_sync(AttendanceRecord.objects.filter(pk__in=ids))
+            AttendanceRecord.objects.filter(pk__in=ids).update(next_attempt_at=None)
+
+        last = rows[-1]
+        if len(rows) < chunk_size:
+            break
+
+    if queued:
+        logger.info("Requeued %d failed SPOC forwards", queued)
+    return queued
+
+
+def schedule_drain(queued=0):
+    """
+    Make sure a drain task will run soon, without enqueuing one per mark.
+
+    Args:
+        queued (int): Number of marks just added to the outbox
+    """
+    from .tasks import drain_spoc_outbox
+
+    try:
+        pending = _add_pending(queued)
+        if pending >= get_batch_size():
+            cache.delete(PENDING_COUNT_KEY)
+            drain_spoc_outbox.delay()
+        elif cache.add(DRAIN_SCHEDULED_KEY, True, timeout=max(1, math.ceil(get_flush_interval()))):
+            drain_spoc_outbox.apply_async(countdown=get_flush_interval())
+    except Exception as e:
+        # The periodic drain in CELERY_BEAT_SCHEDULE still picks these rows up.
+        logger.warning(f"Failed to schedule SPOC outbox drain: {e}")
+
+
+def defer_drain(countdown):
+    """
+    Schedule a single drain countdown seconds from now, e.g. while dispatch is paused.
+    Marks queued in the meantime do not schedule drains of their own.
+    """
+    from .tasks import drain_spoc_outbox
+
+    try:
+        if cache.add(DRAIN_SCHEDULED_KEY, True, timeout=max(1, math.ceil(countdown))):
+            drain_spoc_outbox.apply_async(countdown=countdown)
+    except Exception as e:
+        logger.warning(f"Failed to schedule SPOC outbox drain: {e}")
+
+
+def reset_drain_schedule():
+    """Allow the next queued mark to schedule a fresh drain."""
+    cache.delete_many([DRAIN_SCHEDULED_KEY, PENDING_COUNT_KEY])
+
+
+def _add_pending(count):
+    if cache.add(PENDING_COUNT_KEY, count, timeout=60):
+        return count
+    try:
+        return cache.incr(PENDING_COUNT_KEY, count)
+    except ValueError:
+        # The key expired between add() and incr().
+        cache.set(PENDING_COUNT_KEY, count, timeout=60)
+        return count
+
+
+def replay_dead_letters(dead_letters=None, chunk_size=None):
+    """
+    Give dead-lettered records a fresh set of retries and queue them again.
+
+    Works through the dead letters in id-ordered chunks. For each chunk it
+    resets the records' retry state, queues them with the server credential
+    and deletes the dead letters, all in one transaction.
+
+    Args:
+        dead_letters (QuerySet, optional): SpocDeadLetter rows to replay (default: all)
+        chunk_size (int, optional): Rows per chunk (default: settings.SPOC_RETRY_SWEEP_CHUNK_SIZE)
+
+    Returns:
+        int: Number of records queued
+    """
+    if dead_letters is None:
+        dead_letters = SpocDeadLetter.objects.all()
+    chunk_size = chunk_size or getattr(settings, 'SPOC_RETRY_SWEEP_CHUNK_SIZE', 500)
+
+    replayed = 0
+    last_id = 0
+    while True:
+        rows = list(
+            dead_letters.filter(id__gt=last_id).order_by('id').values_list('id', 'record_id')[:chunk_size]
+        )
+        if not rows:
+            break
+
+        record_ids = [record_id for _, record_id in rows]
+        with transaction.atomic():
+            AttendanceRecord.objects.filter(pk__in=record_ids).update(
+                retry_count=0, next_attempt_at=None, sync_error=None
+            )
+            replayed += enqueue_spoc_sync(
+                AttendanceRecord.objects.filter(pk__in=record_ids, synced_with_spoc=False)
+            )
+            SpocDeadLetter.objects.filter(pk__in=[pk for pk, _ in rows]).delete()
+
+        last_id = rows[-1][0]
+        if len(rows) < chunk_size:
+            break
+
+    if replayed:
+        logger.info("Replayed %d dead-lettered SPOC forwards", replayed)
+    return replayed
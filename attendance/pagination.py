@@ -0,0 +1,45 @@
+from operator import attrgetter
+from rest_framework.pagination import CursorPagination
+
+
+class AttendanceCursorPagination(CursorPagination):
+    """
+    Keyset pagination over (marked_at, id), newest first.
+    Each page is a bounded range scan of the (student, -marked_at, -id) index
+    however deep the client pages.
+    """
+    ordering = ('-marked_at', '-id')
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 200
+
+
+class MergedRecords:
+    """
+    Several record querysets paged as one ordered sequence.
+
+    Used to page the hot and archived attendance tables together with
+    AttendanceCursorPagination. Supports the part of the QuerySet API the
+    paginator uses: filter(), order_by() and slicing. A slice reads at most
+    `stop` rows from each queryset, in index order, and merges them in Python,
+    so a page costs one bounded range scan per table.
+    """
+
+    def __init__(self, *querysets, ordering=()):
+        self.querysets = querysets
+        self.ordering = ordering
+
+    def filter(self, *args, **kwargs):
+        return MergedRecords(*(qs.filter(*args, **kwargs) for qs in self.querysets), ordering=self.ordering)
+
+    def order_by(self, *fields):
+        return MergedRecords(*(qs.order_by(*fields) for qs in self.querysets), ordering=fields)
+
+    def __getitem__(self, key):
+        if not isinstance(key, slice) or key.stop is None:
+            raise TypeError("MergedRecords only supports bounded slices")
+        rows = [row for qs in self.querysets for row in qs[:key.stop]]
+        # Stable sorts from the last ordering field to the first
+        for field in reversed(self.ordering):
+            rows.sort(key=attrgetter(field.lstrip('-')), reverse=field.startswith('-'))
+        return rows[key]
@@ -0,0 +1,250 @@
+"""
+Hot and cold storage for attendance records.
+
+AttendanceRecord only holds the last ATTENDANCE_HOT_MONTHS months. Every
+request path reads it, and each insert maintains its indexes. Older rows are
+moved in batches to ArchivedAttendanceRecord, a table range-partitioned by
+month on marked_at. A row is moved only when it is:
+* settled: synced, or no longer scheduled for a retry;
+* not referenced by the outbox or the dead-letter table;
+* already folded into the rollups.
+Months older than ATTENDANCE_ARCHIVE_AFTER_MONTHS can then be written to
+gzip-compressed JSON Lines files and their partitions dropped.
+
+Partition boundaries follow TIME_ZONE. Partitions are created on demand as
+rows are moved into them.
+"""
+import gzip
+import hashlib
+import logging
+import os
+import re
+from datetime import date, datetime
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection, transaction
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+from .models import (
+    ArchivedAttendanceRecord,
+    AttendanceRecord,
+    RollupWatermark,
+    SpocDeadLetter,
+    SpocSyncOutbox,
+)
+from .exporting import get_chunk_size
+from .rollups import WATERMARK_NAME
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_TABLE = ArchivedAttendanceRecord._meta.db_table
+PARTITION_NAME_RE = re.compile(rf'^{ARCHIVE_TABLE}_y(\d{{4}})m(\d{{2}})$')
+
+
+def month_start(value):
+    """Return the first day of the month of a date or datetime."""
+    return date(value.year, value.month, 1)
+
+
+def add_months(month, count):
+    years, month_index = divmod(month.month - 1 + count, 12)
+    return date(month.year + years, month_index + 1, 1)
+
+
+def month_bounds(month):
+    """Return the aware [start, end) datetimes of a month in the current time zone."""
+    def to_datetime(day):
+        return timezone.make_aware(datetime.combine(day, datetime.min.time()))
+    return to_datetime(month), to_datetime(add_months(month, 1))
+
+
+def partition_name(month):
+    return f'{ARCHIVE_TABLE}_y{month.year}m{month.month:02d}'
+
+
+def get_hot_cutoff(hot_months=None):
+    """Start of the oldest month kept in the hot table."""
+    if hot_months is None:
+        hot_months = getattr(settings, 'ATTENDANCE_HOT_MONTHS', 6)
+    return month_bounds(add_months(month_start(timezone.localdate()), -hot_months))[0]
+
+
+def reaches_archive(marked_from):
+    """
+    Return True if records marked at or after marked_from may be in the archive.
+
+    Records are only moved once they are older than the hot cutoff, which
+    only moves forward, so a range starting at or after the current cutoff
+    is served by the hot table alone.
+
+    Args:
+        marked_from (datetime or None): Start of the requested range (None: unbounded)
+    """
+    return marked_from is None or marked_from < get_hot_cutoff()
+
+
+def ensure_archive_partition(month):
+    """Create the archive partition for a month if it does not exist yet."""
+    start, end = month_bounds(month)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"CREATE TABLE IF NOT EXISTS {partition_name(month)} "
+            f"PARTITION OF {ARCHIVE_TABLE} FOR VALUES FROM (%s) TO (%s)",
+            [start, end]
+        )
+
+
+def list_archive_partitions():
+    """Return the months that currently have an archive partition, oldest first."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT child.relname FROM pg_inherits "
+            "JOIN pg_class parent ON parent.oid = pg_inherits.inhparent "
+            "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+            "WHERE parent.relname = %s",
+            [ARCHIVE_TABLE]
+        )
+        names = [row[0] for row in cursor.fetchall()]
+    months = []
+    for name in names:
+        match = PARTITION_NAME_RE.match(name)
+        if match:
+            months.append(date(int(match.group(1)), int(match.group(2)), 1))
+    return sorted(months)
+
+
+def move_cold_records(cutoff=None, batch_size=None):
+    """
+    Move settled records marked before cutoff from the hot table to the archive.
+
+    Each batch is one DELETE ... RETURNING feeding an INSERT into the archive,
+    run while holding the rollup watermark so rollups cannot be rebuilt
+    underneath it.
+
+    Args:
+        cutoff (datetime, optional): Move records marked before this (default: get_hot_cutoff())
+        batch_size (int, optional): Rows per batch (default: settings.ATTENDANCE_ARCHIVE_BATCH_SIZE)
+
+    Returns:
+        int: Number of records moved
+    """
+    cutoff = cutoff or get_hot_cutoff()
+    batch_size = batch_size or getattr(settings, 'ATTENDANCE_ARCHIVE_BATCH_SIZE', 5000)
+
+    # Every cold month gets a partition, not just those with settled rows, in
+    # case a record settles while the batches below are running.
+    months = (
+        AttendanceRecord.objects.filter(marked_at__lt=cutoff)
+        .annotate(month=TruncMonth('marked_at')).order_by('month')
+        .values_list('month', flat=True).distinct()
+    )
+    for month in months:
+        ensure_archive_partition(month_start(timezone.localtime(month)))
+
+    hot = AttendanceRecord._meta.db_table
+    columns = ', '.join(field.column for field in AttendanceRecord._meta.concrete_fields)
+    sql = f"""
+        WITH moved AS (
+            DELETE FROM {hot} WHERE id IN (
+                SELECT record.id FROM {hot} AS record
+                WHERE record.marked_at < %s
+                  AND record.id <= %s
+                  AND (record.synced_with_spoc OR record.next_attempt_at IS NULL)
+                  AND NOT EXISTS (
+                      SELECT 1 FROM {SpocSyncOutbox._meta.db_table} WHERE record_id = record.id
+                  )
+                  AND NOT EXISTS (
+                      SELECT 1 FROM {SpocDeadLetter._meta.db_table} WHERE record_id = record.id
+                  )
+                ORDER BY record.marked_at
+                LIMIT %s
+                FOR UPDATE SKIP LOCKED
+            )
+            RETURNING {columns}
+        )
+        INSERT INTO {ARCHIVE_TABLE} ({columns}) SELECT {columns} FROM moved
+    """
+
+    RollupWatermark.objects.get_or_create(name=WATERMARK_NAME)
+    moved = 0
+    while True:
+        with transaction.atomic():
+            watermark = RollupWatermark.objects.select_for_update().get(name=WATERMARK_NAME)
+            with connection.cursor() as cursor:
+                cursor.execute(sql, [cutoff, watermark.last_record_id, batch_size])
+                count = cursor.rowcount
+        moved += count
+        if count < batch_size:
+            break
+
+    if moved:
+        logger.info("Moved %d attendance records marked before %s to the archive", moved, cutoff)
+    return moved
+
+
+def archive_partition_to_file(month, directory):
+    """
+    Write one archive partition to a gzip-compressed JSON Lines file and drop it.
+
+    The partition is locked against writes while it is exported. It is only
+    detached and dropped after the file has been written and flushed to disk
+    with the expected number of rows, all in the same transaction.
+
+    Args:
+        month (date): First day of the month to archive
+        directory (str): Directory to write the file to
+
+    Returns:
+        dict: path, rows and sha256 of the written file
+    """
+    name = partition_name(month)
+    fields = [field.attname for field in ArchivedAttendanceRecord._meta.concrete_fields]
+    start, end = month_bounds(month)
+    path = _unused_path(directory, f'attendance-{month:%Y-%m}')
+    partial = f'{path}.partial'
+    encoder = DjangoJSONEncoder()
+
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute(f"LOCK TABLE {name} IN SHARE MODE")
+            cursor.execute(f"SELECT count(*) FROM {name}")
+            expected = cursor.fetchone()[0]
+
+        rows = 0
+        try:
+            with gzip.open(partial, 'wt', encoding='utf-8') as output:
+                queryset = (
+                    ArchivedAttendanceRecord.objects
+                    .filter(marked_at__gte=start, marked_at__lt=end)
+                    .order_by('id').values_list(*fields)
+                )
+                for row in queryset.iterator(chunk_size=get_chunk_size()):
+                    output.write(encoder.encode(dict(zip(fields, row))) + '\n')
+                    rows += 1
+            if rows != expected:
+                raise RuntimeError(f"Exported {rows} rows from {name}, expected {expected}")
+            with open(partial, 'rb') as written:
+                os.fsync(written.fileno())
+                digest = hashlib.sha256(written.read()).hexdigest()
+            os.replace(partial, path)
+        except BaseException:
+            if os.path.exists(partial):
+                os.remove(partial)
+            raise
+
+        with connection.cursor() as cursor:
+            cursor.execute(f"ALTER TABLE {ARCHIVE_TABLE} DETACH PARTITION {name}")
+            cursor.execute(f"DROP TABLE {name}")
+
+    logger.info("Archived %d attendance records from %s to %s", rows, name, path)
+    return {'path': path, 'rows': rows, 'sha256': digest}
+
+
+def _unused_path(directory, stem):
+    """A month can be archived more than once if late rows were moved into it again."""
+    path = os.path.join(directory, f'{stem}.jsonl.gz')
+    suffix = 1
+    while os.path.exists(path):
+        path = os.path.join(directory, f'{stem}.{suffix}.jsonl.gz')
+        suffix += 1
+    return path
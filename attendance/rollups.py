@@ -0,0 +1,197 @@
+"""
+Incremental attendance rollups.
+
+StudentDailyAttendance and SessionAttendanceSummary are folded forward from
+AttendanceRecord in id order. RollupWatermark stores the last folded id, and
+each batch is folded in one transaction that also advances the watermark, so
+a batch is counted exactly once even if a run is interrupted. Each batch is
+two INSERT ... SELECT ... GROUP BY statements whose conflicts add to the
+existing counts.
+
+Records newer than ATTENDANCE_ROLLUP_LAG_SECONDS are left for the next run,
+so rows whose ids were allocated by transactions that have not committed yet
+are not skipped. Status changes and deletions of already folded records are
+not tracked; run `manage.py rollup_attendance --rebuild` after bulk
+corrections.
+
+Records only move to the archive table (see attendance.partitions) once the
+watermark has passed them, so each record is folded from exactly one of the
+two tables.
+"""
+import logging
+from datetime import timedelta
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Count, Max, Min, Q
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+from .models import (
+    ArchivedAttendanceRecord,
+    AttendanceRecord,
+    RollupWatermark,
+    SessionAttendanceSummary,
+    StudentDailyAttendance,
+)
+
+logger = logging.getLogger(__name__)
+
+WATERMARK_NAME = 'attendance'
+STATUSES = [choice for choice, _ in AttendanceRecord.ATTENDANCE_STATUS]
+
+
+def get_batch_size():
+    """Number of record ids folded per transaction."""
+    return getattr(settings, 'ATTENDANCE_ROLLUP_BATCH_SIZE', 50000)
+
+
+def get_lag():
+    """Seconds a record must have existed before it is folded."""
+    return getattr(settings, 'ATTENDANCE_ROLLUP_LAG_SECONDS', 60)
+
+
+def _status_counts():
+    counts = {status: Count('id', filter=Q(status=status)) for status in STATUSES}
+    counts['total'] = Count('id')
+    return counts
+
+
+def _upsert(table, columns, conflict, updates, queryset):
+    """INSERT the rows selected by queryset into table, merging conflicts with updates."""
+    select_sql, params = queryset.query.sql_with_params()
+    target = ', '.join(columns)
+    assignments = ', '.join(f'{column} = {expression}' for column, expression in updates.items())
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {table} ({target}) "
+            f"SELECT {', '.join(f'batch.{alias}' for alias in columns.values())} "
+            f"FROM ({select_sql}) AS batch "
+            f"ON CONFLICT ({conflict}) DO UPDATE SET {assignments}",
+            params
+        )
+        return cursor.rowcount
+
+
+def fold_records(first_id, last_id, model=AttendanceRecord):
+    """
+    Add rows of model with first_id < id <= last_id to the rollups.
+
+    Must run inside a transaction that holds the watermark row.
+
+    Args:
+        first_id (int): Exclusive lower id bound
+        last_id (int): Inclusive upper id bound
+        model: AttendanceRecord or ArchivedAttendanceRecord
+
+    Returns:
+        tuple: (daily rows touched, session rows touched)
+    """
+    records = model.objects.filter(id__gt=first_id, id__lte=last_id).order_by()
+    additive = {
+        status: f'{{table}}.{status} + EXCLUDED.{status}' for status in [*STATUSES, 'total']
+    }
+
+    daily_table = StudentDailyAttendance._meta.db_table
+    daily = _upsert(
+        daily_table,
+        {'student_id': 'student_id', 'date': 'day', **{name: name for name in additive}},
+        'student_id, date',
+        {column: expression.format(table=daily_table) for column, expression in additive.items()},
+        records.annotate(day=TruncDate('marked_at')).values('student_id', 'day').annotate(**_status_counts())
+    )
+
+    session_table = SessionAttendanceSummary._meta.db_table
+    sessions = _upsert(
+        session_table,
+        {
+            'external_session_id': 'external_session_id',
+            'course_id': 'course',
+            **{name: name for name in additive},
+            'first_marked_at': 'first_marked',
+            'last_marked_at': 'last_marked',
+        },
+        'external_session_id',
+        {
+            **{column: expression.format(table=session_table) for column, expression in additive.items()},
+            'course_id': f"COALESCE(NULLIF({session_table}.course_id, ''), EXCLUDED.course_id)",
+            'first_marked_at': f'LEAST({session_table}.first_marked_at, EXCLUDED.first_marked_at)',
+            'last_marked_at': f'GREATEST({session_table}.last_marked_at, EXCLUDED.last_marked_at)',
+        },
+        records.values('external_session_id').annotate(
+            course=Max('course_id'),
+            first_marked=Min('marked_at'),
+            last_marked=Max('marked_at'),
+            **_status_counts()
+        )
+    )
+    return daily, sessions
+
+
+def run_rollup(max_batches=None):
+    """
+    Fold every settled record past the watermark into the rollups.
+
+    Args:
+        max_batches (int, optional): Stop after this many batches (default: run to the end)
+
+    Returns:
+        dict: Watermark before and after the run and the number of batches folded
+    """
+    RollupWatermark.objects.get_or_create(name=WATERMARK_NAME)
+    cutoff = timezone.now() - timedelta(seconds=get_lag())
+    upper = (
+        AttendanceRecord.objects.filter(marked_at__lt=cutoff)
+        .order_by('-id').values_list('id', flat=True).first()
+    ) or 0
+    batch_size = get_batch_size()
+
+    start = None
+    batches = 0
+    while max_batches is None or batches < max_batches:
+        with transaction.atomic():
+            watermark = RollupWatermark.objects.select_for_update().get(name=WATERMARK_NAME)
+            if start is None:
+                start = watermark.last_record_id
+            if watermark.last_record_id >= upper:
+                break
+            last_id = min(watermark.last_record_id + batch_size, upper)
+            fold_records(watermark.last_record_id, last_id)
+            watermark.last_record_id = last_id
+            watermark.save(update_fields=['last_record_id', 'updated_at'])
+        batches += 1
+
+    end = RollupWatermark.objects.get(name=WATERMARK_NAME).last_record_id
+    if batches:
+        logger.info("Attendance rollup advanced from id %s to %s in %d batches", start, end, batches)
+    return {'from_id': start, 'to_id': end, 'batches': batches}
+
+
+def rebuild_rollups():
+    """
+    Empty the rollup tables and fold every record again from the start.
+
+    The archive table is folded first, then the hot table. Months that have
+    already been written to files by archive_attendance_partitions are not
+    in the database anymore and drop out of the rebuilt rollups. Reports
+    read empty or partial rollups until the rebuild finishes.
+    """
+    with transaction.atomic():
+        watermark, _ = RollupWatermark.objects.select_for_update().get_or_create(name=WATERMARK_NAME)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"TRUNCATE {StudentDailyAttendance._meta.db_table}, "
+                f"{SessionAttendanceSummary._meta.db_table}"
+            )
+        watermark.last_record_id = 0
+        watermark.save(update_fields=['last_record_id', 'updated_at'])
+
+    # Nothing moves to the archive while the watermark is 0, so the archive
+    # can be folded in batches without racing move_cold_records.
+    archived_upper = (
+        ArchivedAttendanceRecord.objects.order_by('-id').values_list('id', flat=True).first()
+    ) or 0
+    batch_size = get_batch_size()
+    for first_id in range(0, archived_upper, batch_size):
+        with transaction.atomic():
+            RollupWatermark.objects.select_for_update().get(name=WATERMARK_NAME)
+            fold_records(first_id, min(first_id + batch_size, archived_upper), model=ArchivedAttendanceRecord)
+    return run_rollup()
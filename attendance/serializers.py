@@ -1,9 +1,33 @@
 from rest_framework import serializers
+import ipaddress
 import uuid
 import json
+from django.conf import settings
+from django.contrib.auth import get_user_model
 from django.utils import timezone
 from django.core.exceptions import ValidationError
-from .models import AttendanceRecord
+from .jwt_utils import JWTService
+from .models import AttendanceRecord, SessionAttendanceSummary, StudentDailyAttendance
+from .outbox import insert_and_enqueue
+
+User = get_user_model()
+
+
+def get_client_ip(request):
+    """
+    Return the client address of a request.
+
+    Uses the first X-Forwarded-For entry when it parses as an IP address, and
+    REMOTE_ADDR otherwise, so a malformed header never reaches the inet column.
+    """
+    x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
+    if x_forwarded_for:
+        try:
+            return str(ipaddress.ip_address(x_forwarded_for.split(',')[0].strip()))
+        except ValueError:
+            pass
+    return request.META.get('REMOTE_ADDR') or None
+
 
 class MarkAttendanceSerializer(serializers.Serializer):
     """
@@ -63,24 +87,32 @@ class MarkAttendanceSerializer(serializers.Serializer):
         if request and not attrs.get('user_agent'):
             attrs['user_agent'] = request.META.get('HTTP_USER_AGENT', '')[:1000]
         if request and not attrs.get('ip_address'):
-            x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
-            attrs['ip_address'] = x_forwarded_for.split(',')[0] if x_forwarded_for else request.META.get('REMOTE_ADDR')
+            attrs['ip_address'] = get_client_ip(request)
         
         # Coerce blank ip_address to None to satisfy IPAddressField(allow_null=True)
         if attrs.get('ip_address') in ['', ' ', None]:
             attrs['ip_address'] = None
         
+        # Only a verified QR token is trusted for the course
+        attrs['course_id'] = JWTService.peek_course_id(attrs.get('token'))
+        
         return attrs
 
     def create(self, validated_data):
-        """Create an AttendanceRecord from validated data."""
+        """
+        Create an AttendanceRecord from validated data and queue it for SPOC.
+        The record and its outbox entry are written by one statement. If the
+        student already has a record for the session, that record is returned
+        instead and `self.created` is set to False.
+        """
         request = self.context.get('request')
         user = getattr(request, 'user', None) if request else None
 
         if not user or not user.is_authenticated:
             raise ValidationError('User must be authenticated to mark attendance')
 
-        attendance = AttendanceRecord.objects.create(
+        attendance, self.created = insert_and_enqueue(
+            token=validated_data.get('token'),
             external_session_id=validated_data['session_id'],
             student=user,
             student_external_id=validated_data.get('student_external_id') or getattr(user, 'student_external_id', None),
@@ -89,10 +121,88 @@ class MarkAttendanceSerializer(serializers.Serializer):
             source=validated_data.get('source', 'EDUCATE'),
             user_agent=validated_data.get('user_agent', '') or '',
             ip_address=validated_data.get('ip_address') or None,
+            course_id=validated_data.get('course_id', ''),
         )
         return attendance
 
 
+class BulkMarkEntrySerializer(serializers.Serializer):
+    """A single roster line in a bulk attendance upload."""
+    student_external_id = serializers.CharField(max_length=255)
+    status = serializers.ChoiceField(
+        required=False,
+        default='present',
+        choices=AttendanceRecord.ATTENDANCE_STATUS
+    )
+
+
+class BulkMarkAttendanceSerializer(serializers.Serializer):
+    """
+    Serializer for marking attendance for many students of one session.
+    Resolves every student_external_id with a single query and reports all
+    unknown or duplicated ids together instead of failing on the first one.
+    """
+    session_id = serializers.UUIDField(required=True)
+    token = serializers.CharField(required=False, allow_blank=True, max_length=500, default='')
+    method = serializers.ChoiceField(
+        required=False,
+        choices=AttendanceRecord.ATTENDANCE_METHODS,
+        default='MANUAL'
+    )
+    source = serializers.CharField(required=False, default='EDUCATE', max_length=50)
+    marks = BulkMarkEntrySerializer(many=True, allow_empty=False)
+
+    def validate_marks(self, value):
+        max_marks = getattr(settings, 'ATTENDANCE_BULK_MAX_MARKS', 1000)
+        if len(value) > max_marks:
+            raise serializers.ValidationError(f"At most {max_marks} marks can be uploaded at once.")
+
+        seen = set()
+        duplicates = set()
+        for entry in value:
+            external_id = entry['student_external_id']
+            if external_id in seen:
+                duplicates.add(external_id)
+            seen.add(external_id)
+        if duplicates:
+            raise serializers.ValidationError(
+                f"Duplicate student_external_id values: {', '.join(sorted(duplicates))}"
+            )
+        return value
+
+    def validate(self, attrs):
+        external_ids = [entry['student_external_id'] for entry in attrs['marks']]
+        students = {
+            user.student_external_id: user
+            for user in User.objects.filter(student_external_id__in=external_ids).only('id', 'student_external_id')
+        }
+        unknown = [external_id for external_id in external_ids if external_id not in students]
+        if unknown:
+            raise serializers.ValidationError({
+                'marks': f"Unknown student_external_id values: {', '.join(unknown)}"
+            })
+        attrs['students'] = students
+        return attrs
+
+    def build_records(self):
+        """Return unsaved AttendanceRecord instances for every validated mark."""
+        data = self.validated_data
+        students = data['students']
+        course_id = JWTService.peek_course_id(data.get('token'))
+        return [
+            AttendanceRecord(
+                external_session_id=data['session_id'],
+                student=students[entry['student_external_id']],
+                student_external_id=entry['student_external_id'],
+                status=entry['status'],
+                method=data['method'],
+                source=data['source'],
+                course_id=course_id,
+            )
+            for entry in data['marks']
+        ]
+
+
 class MarkAttendanceOutSerializer(serializers.Serializer):
     """Serializer for attendance marking response."""
     status = serializers.ChoiceField(choices=[('ok', 'OK'), ('already_marked', 'Already Marked')])
@@ -110,11 +220,46 @@ class QRCodeScanSerializer(serializers.Serializer):
         """Validate the QR code data format."""
         try:
             data = json.loads(value)
-            if not all(key in data for key in ['session_id', 'token']):
-                raise ValidationError('QR code data must contain session_id and token')
-            return value
         except json.JSONDecodeError:
             raise ValidationError('Invalid QR code format. Expected valid JSON.')
+        if not isinstance(data, dict) or not all(key in data for key in ['session_id', 'token']):
+            raise ValidationError('QR code data must contain session_id and token')
+        if not isinstance(data['token'], str) or not data['token']:
+            raise ValidationError('QR code token must be a non-empty string.')
+        try:
+            uuid.UUID(data['session_id'])
+        except (TypeError, ValueError, AttributeError):
+            raise ValidationError('Invalid session_id format. Must be a valid UUID.')
+        return value
+
+
+class ScanAndMarkSerializer(QRCodeScanSerializer):
+    """
+    Serializer for marking attendance straight from the scanned QR payload.
+    Verifies the QR token once and resolves the session, course and request
+    metadata needed to insert the record.
+    """
+
+    def validate(self, attrs):
+        # Shape already checked by validate_qr_data
+        qr_content = json.loads(attrs['qr_data'])
+        token = qr_content['token']
+        session_id = uuid.UUID(qr_content['session_id'])
+
+        # Raises AuthenticationFailed with the invalid/expired details
+        payload = JWTService.verify_token(token)
+        if payload.get('session_id') != str(session_id):
+            raise serializers.ValidationError({'qr_data': 'Invalid session ID in QR code'})
+
+        request = self.context.get('request')
+        return {
+            'session_id': session_id,
+            'token': token,
+            'payload': payload,
+            'course_id': str(payload.get('course_id') or ''),
+            'user_agent': request.META.get('HTTP_USER_AGENT', '')[:1000] if request else '',
+            'ip_address': get_client_ip(request) if request else None,
+        }
 
 
 class QRCodeValidationResponseSerializer(serializers.Serializer):
@@ -192,3 +337,22 @@ class AttendanceRecordListSerializer(serializers.ModelSerializer):
             'synced_with_spoc',
             'sync_error',
         ]
+
+
+class StudentDailyAttendanceSerializer(serializers.ModelSerializer):
+    """Serializer for one student/day attendance rollup."""
+
+    class Meta:
+        model = StudentDailyAttendance
+        fields = ['date', 'present', 'late', 'absent', 'excused', 'total']
+
+
+class SessionAttendanceSummarySerializer(serializers.ModelSerializer):
+    """Serializer for one session attendance rollup."""
+
+    class Meta:
+        model = SessionAttendanceSummary
+        fields = [
+            'external_session_id', 'course_id', 'present', 'late', 'absent',
+            'excused', 'total', 'first_marked_at', 'last_marked_at'
+        ]
@@ -1,11 +1,12 @@
-import json
 import logging
-from urllib.parse import urljoin
+import os
+import threading
 import requests
 from requests.adapters import HTTPAdapter
 from requests.packages.urllib3.util.retry import Retry
 from django.conf import settings
 from django.core.exceptions import ImproperlyConfigured
+from django.utils import timezone
 
 logger = logging.getLogger(__name__)
 
@@ -20,56 +21,194 @@ class SPOCClientError(Exception):
     """Base exception for SPOC client errors."""
     pass
 
-def create_session():
-    """Create a requests session with retry logic."""
+def create_session(pool_maxsize=None):
+    """
+    Create a keep-alive requests session with the shared retry policy.
+
+    Connection errors and SPOC_RETRY_STATUS_FORCELIST responses are retried
+    for POST too, which urllib3 leaves out by default: every SPOC call is a
+    POST, and each is safe to repeat (marks are idempotent per session and
+    student, verification reads only). Once the retries are used up the last
+    response is returned rather than raised, so callers still see its status.
+
+    Args:
+        pool_maxsize (int, optional): Connections kept per host
+            (default: settings.SPOC_POOL_MAXSIZE)
+    """
     session = requests.Session()
     retries = Retry(
-        total=3,
-        backoff_factor=0.5,
-        status_forcelist=[500, 502, 503, 504],
+        total=getattr(settings, 'SPOC_RETRY_TOTAL', 3),
+        backoff_factor=getattr(settings, 'SPOC_RETRY_BACKOFF_FACTOR', 0.5),
+        status_forcelist=getattr(settings, 'SPOC_RETRY_STATUS_FORCELIST', [500, 502, 503, 504]),
+        allowed_methods=Retry.DEFAULT_ALLOWED_METHODS | {'POST'},
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(
+        pool_connections=1,
+        pool_maxsize=pool_maxsize or getattr(settings, 'SPOC_POOL_MAXSIZE', 10),
+        max_retries=retries
     )
-    session.mount('https://', HTTPAdapter(max_retries=retries))
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
     return session
 
+
+class SPOCClient:
+    """
+    Client for the SPOC server shared by every call site in a process.
+
+    Holds one pooled keep-alive session so connections are reused across
+    requests and Celery tasks, and keeps simple counters for pool metrics.
+    """
+
+    def __init__(self, base_url=None, pool_maxsize=None):
+        """Initialize the SPOC client.
+
+        Args:
+            base_url: Base URL of the SPOC server (default: settings.SPOC_BASE_URL)
+            pool_maxsize: Connections kept per host (default: settings.SPOC_POOL_MAXSIZE)
+        """
+        self.base_url = base_url or get_required_setting('SPOC_BASE_URL')
+        self.pool_maxsize = pool_maxsize or getattr(settings, 'SPOC_POOL_MAXSIZE', 10)
+        self.connect_timeout = getattr(settings, 'SPOC_CONNECT_TIMEOUT_SECONDS', 3)
+        self.session = create_session(self.pool_maxsize)
+        self._lock = threading.Lock()
+        self._requests = 0
+        self._errors = 0
+        self._in_flight = 0
+        self._max_in_flight = 0
+
+    def post(self, path, json_data, headers=None, read_timeout=10):
+        """
+        POST to a SPOC endpoint over the pooled session.
+
+        Raises:
+            requests.exceptions.RequestException: If the request fails
+        """
+        # Joined by hand: urljoin() would drop a path prefix of SPOC_BASE_URL
+        # for the absolute endpoint paths used below.
+        url = f"{self.base_url.rstrip('/')}/{path.lstrip('/')}"
+        with self._lock:
+            self._requests += 1
+            self._in_flight += 1
+            self._max_in_flight = max(self._max_in_flight, self._in_flight)
+        try:
+            return self.session.post(
+                url,
+                headers={'Content-Type': 'application/json', **(headers or {})},
+                json=json_data,
+                timeout=(self.connect_timeout, read_timeout)
+            )
+        except requests.exceptions.RequestException:
+            with self._lock:
+                self._errors += 1
+            raise
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+
+    def forward_mark(self, record, token=''):
+        """
+        Forward an attendance record to SPOC's mark endpoint.
+
+        Args:
+            record: AttendanceRecord to forward
+            token: QR JWT to authenticate with (per SPOC contract). When blank,
+                as for retries after the QR token has expired, the server
+                credential settings.SPOC_API_KEY is sent instead.
+
+        Returns:
+            requests.Response: Response from the SPOC service
+        """
+        if token:
+            headers = {'Authorization': f'Bearer {token}'}
+        else:
+            api_key = getattr(settings, 'SPOC_API_KEY', '')
+            headers = {'X-API-Key': api_key} if api_key else {}
+        return self.post(
+            '/api/attendance/mark',
+            {
+                "session_id": str(record.external_session_id),
+                "student_external_id": record.student_external_id,
+                "status": record.status,
+                "method": record.method,
+                "source": "EDUCATE"
+            },
+            headers=headers,
+            read_timeout=getattr(settings, 'SPOC_FORWARD_TIMEOUT_SECONDS', 10)
+        )
+
+    def pool_stats(self):
+        """Return request counters and connection pool usage for this process."""
+        with self._lock:
+            stats = {
+                'pid': os.getpid(),
+                'pool_maxsize': self.pool_maxsize,
+                'requests': self._requests,
+                'errors': self._errors,
+                'in_flight': self._in_flight,
+                'max_in_flight': self._max_in_flight,
+                'connections_opened': 0,
+                'idle_connections': 0,
+            }
+        pools = self.session.get_adapter(self.base_url).poolmanager.pools
+        for key in pools.keys():
+            pool = pools.get(key)
+            if pool is None:
+                continue
+            stats['connections_opened'] += pool.num_connections
+            stats['idle_connections'] += sum(1 for conn in list(pool.pool.queue) if conn is not None)
+        return stats
+
+
+_client = None
+_client_pid = None
+_client_lock = threading.Lock()
+
+def get_spoc_client():
+    """
+    Return the SPOC client for this process, creating it on first use.
+    A forked worker gets its own client instead of sharing the parent's sockets.
+    """
+    global _client, _client_pid
+    pid = os.getpid()
+    if _client is None or _client_pid != pid:
+        with _client_lock:
+            if _client is None or _client_pid != pid:
+                _client = SPOCClient()
+                _client_pid = pid
+    return _client
+
 def verify_token(session_id, token):
     """
     Verify a session token with the SPOC service.
-    
+
     Args:
         session_id: UUID of the session
         token: JWT token from the QR code
-        
+
     Returns:
         dict: Response from the SPOC service
-        
+
     Raises:
         SPOCClientError: If verification fails or response is invalid
     """
-    base_url = get_required_setting('SPOC_BASE_URL')
     timeout = getattr(settings, 'SPOC_VERIFY_TIMEOUT_SECONDS', 5)
-    
-    # Get QR code for the session
-    url = urljoin(base_url, f'/api/attendance/verify/')  # Updated endpoint
-    headers = {
-        'Content-Type': 'application/json',
-        'Authorization': f'Bearer {token}'  # Add Authorization header
-    }
-    
+
     try:
-        session = create_session()
-        response = session.post(
-            url,
-            headers=headers,
-            json={
+        response = get_spoc_client().post(
+            '/api/attendance/verify/',
+            {
                 'session_id': str(session_id),
                 'token': token
             },
-            timeout=timeout
+            headers={'Authorization': f'Bearer {token}'},
+            read_timeout=timeout
         )
-        
+
         response.raise_for_status()
         return response.json()
-        
+
     except requests.exceptions.RequestException as e:
         error_msg = f"Failed to verify token: {str(e)}"
         if hasattr(e, 'response') and e.response is not None:
@@ -84,51 +223,43 @@ def verify_token(session_id, token):
 def push_mark(session_id, student_id):
     """
     Notify SPOC service about a student's attendance.
-    
+
     Args:
         session_id: UUID of the session
         student_id: ID of the student
-        
+
     Returns:
         bool: True if successful, False otherwise
     """
     if not getattr(settings, 'SPOC_MARK_ENABLED', True):
         return False
-        
-    base_url = get_required_setting('SPOC_BASE_URL')
+
     api_key = get_required_setting('SPOC_API_KEY')
     timeout = getattr(settings, 'SPOC_MARK_TIMEOUT_SECONDS', 3)
-    
-    url = urljoin(base_url, '/api/attendance/mark-attendance/')
-    headers = {
-        'X-API-Key': api_key,
-        'Content-Type': 'application/json',
-    }
-    
+
     data = {
         'session_id': str(session_id),
         'student_id': str(student_id),
         'timestamp': timezone.now().isoformat(),
     }
-    
+
     try:
-        session = create_session()
-        response = session.post(
-            url,
-            headers=headers,
-            json=data,
-            timeout=timeout
+        response = get_spoc_client().post(
+            '/api/attendance/mark-attendance/',
+            data,
+            headers={'X-API-Key': api_key},
+            read_timeout=timeout
         )
-        
+
         # We don't raise for status here since this is fire-and-forget
         if response.status_code == 200:
             return True
-            
+
         logger.warning(
             f'SPOC mark request failed with status {response.status_code}: {response.text}'
         )
         return False
-        
+
     except Exception as e:
         logger.error(f'SPOC mark request failed: {str(e)}')
         return False
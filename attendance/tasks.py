@@ -1,119 +1,246 @@
-import json
 import logging
-import requests
+import time
+from concurrent.futures import ThreadPoolExecutor
 from celery import shared_task
 from django.conf import settings
-from django.core.cache import cache
+from django.db import transaction
+from datetime import timedelta
+from django.db.models import Case, F, When, Value
+from django.utils import timezone
 from requests.exceptions import RequestException
-from .models import AttendanceRecord
+from .backpressure import HALF_OPEN, OPEN, dispatch_rate_limiter, spoc_breaker
+from .models import AttendanceRecord, SpocDeadLetter, SpocSyncOutbox
+from .spoc_client import get_spoc_client
+from .outbox import (
+    defer_drain,
+    enqueue_spoc_sync,
+    get_batch_size,
+    get_retry_delay,
+    requeue_due_syncs,
+    reset_drain_schedule,
+)
+from .partitions import move_cold_records
+from .rollups import run_rollup
 
 logger = logging.getLogger(__name__)
 
-@shared_task(bind=True, max_retries=3, default_retry_delay=60)
-def push_mark_to_spoc(self, session_id, student_external_id, token, method='QR'):
+
+@shared_task
+def push_mark_to_spoc(session_id, student_external_id, token, method='QR'):
     """
-    Background task to forward attendance data to the SPOC server.
-    
+    Forward a single attendance mark to the SPOC server.
+
+    Kept so that tasks queued before the outbox existed still complete; the
+    mark is routed through the outbox like every new one.
+
     Args:
         session_id (str): The session ID for the attendance
         student_external_id (str): External ID of the student
         token (str): Authentication token for the SPOC server
-        method (str): Method of attendance marking (default: 'QR')
-    """
-    # Get SPOC base URL from settings (prefer SPOC_BASE_URL per contract)
-    spoc_base = getattr(settings, 'SPOC_BASE_URL', None) or getattr(settings, 'SPOC_SERVER_URL', '')
-    endpoint = f"{spoc_base.rstrip('/')}/api/attendance/mark"
-    
-    # Prepare the payload
-    payload = {
-        "session_id": str(session_id),
-        "student_external_id": student_external_id,
-        "status": "present",
-        "method": method,
-        "source": "EDUCATE"
-    }
-    
-    # Add headers
-    headers = {
-        'Content-Type': 'application/json',
-        # Per SPOC contract: pass QR JWT in Authorization header as Bearer
-        'Authorization': f'Bearer {token}'
-    }
-    
-    # Create a unique key for this attendance record to prevent duplicates
-    cache_key = f'attendance_{session_id}_{student_external_id}'
-    
-    try:
-        # Check if this attendance has already been processed
-        if cache.get(cache_key):
-            logger.info(f"Attendance already processed for session {session_id} and student {student_external_id}")
-            return {"status": "already_processed", "message": "Attendance already processed"}
-        
-        logger.info(f"Forwarding attendance to SPOC server: {endpoint}")
-        
-        # Make the POST request to SPOC server
-        response = requests.post(
-            endpoint,
-            json=payload,
-            headers=headers,
-            timeout=10  # 10 seconds timeout
+        method (str): Method of attendance marking (unused, read from the record)
+    """
+    queued = enqueue_spoc_sync(
+        AttendanceRecord.objects.filter(
+            external_session_id=session_id,
+            student_external_id=student_external_id,
+            synced_with_spoc=False
+        ),
+        token=token
+    )
+    return {"status": "queued", "queued": queued}
+
+
+@shared_task
+def drain_spoc_outbox():
+    """
+    Forward every pending outbox entry to the SPOC server.
+
+    Entries are claimed in batches of SPOC_OUTBOX_BATCH_SIZE (skipping rows
+    another worker already holds) and posted concurrently over the pooled
+    session of the process-wide SPOC client. The outcome of each batch is
+    written back with one UPDATE. Records that fail keep synced_with_spoc=False
+    and are given a next_attempt_at for retry_failed_syncs. Claimed records
+    carry a lease in next_attempt_at until then, so a batch lost with its
+    worker is retried too (see _claim_outbox_batch).
+
+    Dispatch goes through attendance.backpressure. While the circuit breaker
+    is open, entries stay in the outbox and a drain is scheduled for when the
+    breaker allows a probe. Batch sizes are limited by the shared token bucket.
+    """
+    reset_drain_schedule()
+
+    batch_size = get_batch_size()
+    concurrency = getattr(settings, 'SPOC_DISPATCH_CONCURRENCY', 8)
+    client = get_spoc_client()
+    totals = {"synced": 0, "failed": 0, "paused": False}
+
+    while True:
+        state = spoc_breaker.state()
+        if state == OPEN:
+            defer_drain(spoc_breaker.seconds_until_probe())
+            totals["paused"] = True
+            break
+        if state == HALF_OPEN:
+            if not spoc_breaker.claim_probe():
+                # Another worker is probing; its drain carries on if SPOC is back.
+                break
+            limit = 1
+        else:
+            limit = dispatch_rate_limiter.acquire(batch_size)
+            if not limit:
+                time.sleep(dispatch_rate_limiter.seconds_until_refill())
+                continue
+
+        entries = _claim_outbox_batch(limit)
+        if not entries:
+            break
+
+        with ThreadPoolExecutor(max_workers=min(concurrency, len(entries))) as executor:
+            outcomes = list(executor.map(lambda entry: _post_mark(client, entry), entries))
+
+        synced_ids = [entry.record_id for entry, outcome in zip(entries, outcomes) if outcome is None]
+        failed = {entry.record: outcome[0] for entry, outcome in zip(entries, outcomes) if outcome is not None}
+        _record_sync_results(synced_ids, failed)
+
+        unhealthy = sum(1 for outcome in outcomes if outcome is not None and outcome[1])
+        if unhealthy:
+            spoc_breaker.record_failures(unhealthy)
+        else:
+            spoc_breaker.record_success()
+
+        totals["synced"] += len(synced_ids)
+        totals["failed"] += len(failed)
+
+    if totals["synced"] or totals["failed"]:
+        logger.info(
+            "Drained SPOC outbox: %d synced, %d failed",
+            totals["synced"], totals["failed"]
         )
-        
-        # Attempt to parse response JSON for logging
-        resp_json = None
-        try:
-            resp_json = response.json()
-        except Exception:
-            resp_json = None
-
-        # Check for successful response
+    return totals
+
+
+@shared_task
+def retry_failed_syncs():
+    """
+    Requeue failed SPOC forwards whose retry is due.
+    Cheap enough to run every minute: it only reads due rows off an index.
+    """
+    return {"queued": requeue_due_syncs()}
+
+
+@shared_task
+def rollup_attendance():
+    """
+    Fold attendance records marked since the last run into the rollup tables.
+    See attendance.rollups.
+    """
+    return run_rollup()
+
+
+@shared_task
+def move_cold_attendance():
+    """
+    Move settled records older than ATTENDANCE_HOT_MONTHS to the archive table.
+    See attendance.partitions.
+    """
+    return move_cold_records()
+
+
+def _claim_outbox_batch(batch_size):
+    """
+    Remove up to batch_size entries from the outbox and return them.
+
+    The claimed records get a next_attempt_at SPOC_OUTBOX_CLAIM_LEASE_SECONDS
+    ahead in the same transaction. _record_sync_results() replaces it once the
+    batch is dispatched; if the worker dies first, the lease runs out and
+    retry_failed_syncs queues the records again.
+    """
+    lease = getattr(settings, 'SPOC_OUTBOX_CLAIM_LEASE_SECONDS', 300)
+    with transaction.atomic():
+        entries = list(
+            SpocSyncOutbox.objects
+            .select_for_update(skip_locked=True, of=('self',))
+            .select_related('record')[:batch_size]
+        )
+        if entries:
+            AttendanceRecord.objects.filter(pk__in=[entry.record_id for entry in entries]).update(
+                next_attempt_at=timezone.now() + timedelta(seconds=lease)
+            )
+            SpocSyncOutbox.objects.filter(pk__in=[entry.pk for entry in entries]).delete()
+    return entries
+
+
+def _post_mark(client, entry):
+    """
+    Post one outbox entry to SPOC.
+
+    Returns:
+        tuple or None: None if the mark was accepted, otherwise
+            (error message, whether the failure means SPOC itself is unhealthy)
+    """
+    try:
+        response = client.forward_mark(entry.record, token=entry.token)
         if response.status_code >= 400:
-            # Log error details from SPOC
             logger.error(
-                "SPOC mark failed: %s %s | body=%s",
-                response.status_code,
-                response.text[:500],
-                json.dumps(resp_json) if resp_json is not None else 'N/A'
+                "SPOC mark failed for record %s: %s %s",
+                entry.record_id, response.status_code, response.text[:500]
             )
-            response.raise_for_status()
-        
-        # Mark as processed in cache (expires in 24 hours)
-        cache.set(cache_key, True, timeout=60 * 60 * 24)
-        
-        logger.info(f"Successfully forwarded attendance to SPOC server: {response.text}")
-
-        # Mark the corresponding attendance record as synced if we can locate it
-        try:
-            rec = AttendanceRecord.objects.filter(
-                external_session_id=session_id,
-                student_external_id=student_external_id
-            ).order_by('-marked_at').first()
-            if rec:
-                rec.mark_synced(True)
-        except Exception as e:
-            logger.warning(f"Could not mark AttendanceRecord as synced: {e}")
-
-        return {"status": "success", "data": resp_json or {}}
-        
+        response.raise_for_status()
+        return None
     except RequestException as e:
-        error_msg = f"Failed to forward attendance to SPOC server: {str(e)}"
-        logger.error(error_msg)
-
-        # Try to mark record as not synced with error
-        try:
-            rec = AttendanceRecord.objects.filter(
-                external_session_id=session_id,
-                student_external_id=student_external_id
-            ).order_by('-marked_at').first()
-            if rec:
-                rec.mark_synced(False, error_msg)
-        except Exception as mark_err:
-            logger.warning(f"Could not update AttendanceRecord sync status: {mark_err}")
-        
-        # Retry on failure (Celery will handle the retry logic)
-        if self.request.retries < self.max_retries:
-            retry_in = self.default_retry_delay * (2 ** self.request.retries)
-            logger.warning(f"Retrying in {retry_in} seconds... (Attempt {self.request.retries + 1}/{self.max_retries})")
-            raise self.retry(exc=e, countdown=retry_in)
-        
-        return {"status": "error", "message": error_msg}
+        response = getattr(e, 'response', None)
+        unhealthy = response is None or response.status_code >= 500
+        return f"Failed to forward attendance to SPOC server: {str(e)}", unhealthy
+    except Exception as e:
+        # Anything else is retried like a failed request rather than aborting the drain
+        logger.exception("Unexpected error forwarding record %s to SPOC", entry.record_id)
+        return f"Failed to forward attendance to SPOC server: {str(e)}", False
+
+
+def _record_sync_results(synced_ids, failed):
+    """
+    Write the outcome of a dispatched batch back with one UPDATE.
+
+    Failed records get their retry_count bumped and, until
+    SPOC_SYNC_MAX_RETRIES is reached, a next_attempt_at with exponential backoff.
+    After that they are moved to SpocDeadLetter instead.
+
+    Args:
+        synced_ids (list): Ids of records SPOC accepted
+        failed (dict): {AttendanceRecord: error message} for the rest
+    """
+    if not synced_ids and not failed:
+        return
+
+    now = timezone.now()
+    max_retries = getattr(settings, 'SPOC_SYNC_MAX_RETRIES', 8)
+    failed_ids = [record.pk for record in failed]
+    error_whens = [When(pk=record.pk, then=Value(error)) for record, error in failed.items()]
+    retry_whens = [
+        When(pk=record.pk, then=Value(now + timedelta(seconds=get_retry_delay(record.retry_count + 1))))
+        for record in failed
+        if record.retry_count + 1 <= max_retries
+    ]
+    exhausted = [record for record in failed if record.retry_count + 1 > max_retries]
+    if exhausted:
+        SpocDeadLetter.objects.bulk_create(
+            [
+                SpocDeadLetter(record=record, error=failed[record], retry_count=record.retry_count + 1, dead_at=now)
+                for record in exhausted
+            ],
+            update_conflicts=True,
+            unique_fields=['record'],
+            update_fields=['error', 'retry_count', 'dead_at']
+        )
+        logger.warning("Moved %d SPOC forwards to the dead-letter table", len(exhausted))
+    AttendanceRecord.objects.filter(pk__in=[*synced_ids, *failed_ids]).update(
+        synced_with_spoc=Case(When(pk__in=synced_ids, then=Value(True)), default=Value(False)),
+        sync_error=Case(*error_whens, default=Value(None)) if error_whens else None,
+        retry_count=Case(
+            When(pk__in=failed_ids, then=F('retry_count') + 1),
+            default=F('retry_count'),
+            output_field=AttendanceRecord._meta.get_field('retry_count')
+        ),
+        next_attempt_at=Case(*retry_whens, default=Value(None)) if retry_whens else None,
+        last_sync_attempt=now
+    )
@@ -1,3 +1,1291 @@
-from django.test import TestCase
+import csv
+import gzip
+import io
+import json
+import tempfile
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+import jwt
+import requests
+from unittest import mock
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.test import APIClient, APIRequestFactory, force_authenticate
+from rest_framework_simplejwt.tokens import AccessToken
+from .backpressure import CLOSED, HALF_OPEN, OPEN, DispatchRateLimiter, SpocCircuitBreaker
+from .counters import get_session_counts, record_marks
+from .diagnostics import OVERRIDE_CACHE_KEY, AuthDiagnostics
+from .exporting import EXPORT_COLUMNS
+from .jwt_utils import JWTService, VerifiedTokenCache, verified_tokens
+from .management.commands.loadtest_qr_burst import percentile
+from .models import (
+    ArchivedAttendanceRecord,
+    AttendanceRecord,
+    SessionAttendanceSummary,
+    SpocDeadLetter,
+    SpocSyncOutbox,
+    StudentDailyAttendance,
+)
+from .outbox import enqueue_spoc_sync, replay_dead_letters, requeue_due_syncs, schedule_drain
+from .partitions import (
+    add_months,
+    archive_partition_to_file,
+    list_archive_partitions,
+    month_start,
+    move_cold_records,
+)
+from .rollups import rebuild_rollups, run_rollup
+from .spoc_client import SPOCClient
+from .tasks import drain_spoc_outbox
+from .throttling import AttendanceRateThrottle
+from .views import MarkAttendanceAfterScanView
 
-# Create your tests here.
+User = get_user_model()
+
+
+class InsertOrGetTests(TestCase):
+    def setUp(self):
+        self.student = User.objects.create_user(
+            email='student@example.com',
+            username='student',
+            name='Student',
+            password='password',
+            student_external_id='STU-1'
+        )
+        self.session_id = uuid.uuid4()
+
+    def test_first_mark_is_inserted(self):
+        record, created = AttendanceRecord.objects.insert_or_get(
+            external_session_id=self.session_id,
+            student=self.student,
+            student_external_id='STU-1'
+        )
+        self.assertTrue(created)
+        self.assertIsNotNone(record.pk)
+        self.assertEqual(record.status, 'present')
+        self.assertIsNotNone(record.marked_at)
+
+    def test_second_mark_returns_existing_record(self):
+        first, _ = AttendanceRecord.objects.insert_or_get(
+            external_session_id=self.session_id,
+            student=self.student
+        )
+        second, created = AttendanceRecord.objects.insert_or_get(
+            external_session_id=self.session_id,
+            student=self.student,
+            status='late'
+        )
+        self.assertFalse(created)
+        self.assertEqual(second.pk, first.pk)
+        self.assertEqual(second.status, 'present')
+        self.assertEqual(AttendanceRecord.objects.count(), 1)
+
+
+@override_settings(ATTENDANCE_RATE_LIMIT='100/minute')
+@mock.patch('attendance.outbox.schedule_drain')
+class ConcurrentMarkAttendanceTests(TransactionTestCase):
+    workers = 8
+
+    def setUp(self):
+        self.student = User.objects.create_user(
+            email='student@example.com',
+            username='student',
+            name='Student',
+            password='password',
+            student_external_id='STU-1'
+        )
+
+    def test_parallel_marks_for_same_session_record_once(self, schedule_drain):
+        session_id = str(uuid.uuid4())
+        barrier = threading.Barrier(self.workers)
+        status_codes = []
+
+        def mark():
+            client = APIClient()
+            client.force_authenticate(self.student)
+            try:
+                barrier.wait()
+                response = client.post(
+                    '/api/v1/attendance/mark-attendance/',
+                    {'session_id': session_id, 'token': 'qr-token'},
+                    format='json'
+                )
+                status_codes.append(response.status_code)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=mark) for _ in range(self.workers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(sorted(status_codes), [200] * (self.workers - 1) + [201])
+        self.assertEqual(
+            AttendanceRecord.objects.filter(external_session_id=session_id, student=self.student).count(),
+            1
+        )
+        self.assertEqual(SpocSyncOutbox.objects.filter(record__external_session_id=session_id).count(), 1)
+        schedule_drain.assert_called_once_with(1)
+
+
+@mock.patch('attendance.views.enqueue_spoc_sync')
+class BulkMarkAttendanceTests(TestCase):
+    url = '/api/v1/attendance/mark-attendance/bulk/'
+
+    def setUp(self):
+        cache.clear()
+        self.staff = User.objects.create_user(
+            email='staff@example.com',
+            username='staff',
+            name='Staff',
+            password='password',
+            is_staff=True
+        )
+        self.students = [
+            User.objects.create_user(
+                email=f'student{n}@example.com',
+                username=f'student{n}',
+                name=f'Student {n}',
+                password='password',
+                student_external_id=f'STU-{n}'
+            )
+            for n in range(3)
+        ]
+        self.session_id = uuid.uuid4()
+        self.client = APIClient()
+        self.client.force_authenticate(self.staff)
+
+    def post_marks(self, external_ids):
+        return self.client.post(self.url, {
+            'session_id': str(self.session_id),
+            'marks': [{'student_external_id': external_id} for external_id in external_ids],
+        }, format='json')
+
+    def test_reports_inserted_and_already_marked_rows(self, enqueue_spoc_sync):
+        AttendanceRecord.objects.insert_or_get(external_session_id=self.session_id, student=self.students[0])
+
+        response = self.post_marks(['STU-0', 'STU-1', 'STU-2'])
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['created'], 2)
+        self.assertEqual(response.data['already_marked'], ['STU-0'])
+        queued = enqueue_spoc_sync.call_args[0][0]
+        self.assertEqual(
+            sorted(queued.values_list('student_external_id', flat=True)),
+            ['STU-1', 'STU-2']
+        )
+
+    def test_mark_that_wins_the_race_is_reported_as_already_marked(self, enqueue_spoc_sync):
+        real_insert_new = AttendanceRecord.objects.insert_new
+
+        def insert_after_concurrent_mark(records):
+            # Another request marks STU-1 between validation and the insert
+            AttendanceRecord.objects.insert_or_get(external_session_id=self.session_id, student=self.students[1])
+            return real_insert_new(records)
+
+        with mock.patch.object(AttendanceRecord.objects, 'insert_new', side_effect=insert_after_concurrent_mark):
+            response = self.post_marks(['STU-0', 'STU-1'])
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['created'], 1)
+        self.assertEqual(response.data['already_marked'], ['STU-1'])
+
+    def test_all_marked_returns_200(self, enqueue_spoc_sync):
+        self.post_marks(['STU-0'])
+        response = self.post_marks(['STU-0'])
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['created'], 0)
+        self.assertEqual(enqueue_spoc_sync.call_count, 1)
+
+
+class FakeThrottleRequest:
+    def __init__(self, user_id):
+        self.user = mock.Mock(id=user_id, is_authenticated=True)
+        self.data = {}
+        self.META = {'REMOTE_ADDR': '127.0.0.1'}
+
+
+@override_settings(ATTENDANCE_RATE_LIMIT='10/minute')
+class SlidingWindowThrottleTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def allow_at(self, now, user_id=1):
+        throttle = AttendanceRateThrottle()
+        throttle.timer = lambda: now
+        return throttle.allow_request(FakeThrottleRequest(user_id), None), throttle.wait()
+
+    def test_parallel_clients_share_one_limit(self):
+        workers = 40
+        barrier = threading.Barrier(workers)
+        allowed = []
+
+        def hit():
+            barrier.wait()
+            allowed.append(AttendanceRateThrottle().allow_request(FakeThrottleRequest(1), None))
+
+        threads = [threading.Thread(target=hit) for _ in range(workers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(allowed.count(True), 10)
+        self.assertEqual(allowed.count(False), workers - 10)
+
+    def test_previous_window_is_weighted_by_remaining_time(self):
+        start = 600 * 60.0
+        for _ in range(10):
+            self.assertTrue(self.allow_at(start + 30)[0])
+        allowed, wait = self.allow_at(start + 31)
+        self.assertFalse(allowed)
+        self.assertAlmostEqual(wait, 29 + 6)
+
+        # A quarter into the next window, 10 * 0.75 of the limit is still used
+        results = [self.allow_at(start + 75)[0] for _ in range(4)]
+        self.assertEqual(results, [True, True, False, False])
+
+        # Other keys are not affected
+        self.assertTrue(self.allow_at(start + 75, user_id=2)[0])
+
+    def test_rejected_requests_are_not_counted(self):
+        start = 600 * 60.0
+        for _ in range(10):
+            self.allow_at(start)
+        for _ in range(50):
+            self.assertFalse(self.allow_at(start + 1)[0])
+        self.assertTrue(self.allow_at(start + 60 + 6.1)[0])
+
+
+@override_settings(ATTENDANCE_RATE_LIMIT='3/minute')
+class ConcurrentThrottledRequestTests(TransactionTestCase):
+    workers = 8
+
+    def setUp(self):
+        cache.clear()
+        self.student = User.objects.create_user(
+            email='student@example.com',
+            username='student',
+            name='Student',
+            password='password',
+            student_external_id='STU-1'
+        )
+
+    def test_parallel_requests_over_the_limit_get_429(self):
+        barrier = threading.Barrier(self.workers)
+        status_codes = []
+
+        def scan():
+            client = APIClient()
+            client.force_authenticate(self.student)
+            try:
+                barrier.wait()
+                response = client.post('/api/v1/attendance/scan/', {'qr_data': 'not json'}, format='json')
+                status_codes.append(response.status_code)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=scan) for _ in range(self.workers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(status_codes.count(429), self.workers - 3)
+        self.assertEqual(status_codes.count(400), 3)
+
+
+def spoc_response(status_code=200):
+    response = mock.Mock(status_code=status_code, text='')
+    if status_code >= 400:
+        response.raise_for_status.side_effect = requests.HTTPError(response=response)
+    return response
+
+
+@override_settings(SPOC_DISPATCH_RATE_PER_SECOND=0, SPOC_OUTBOX_BATCH_SIZE=2)
+class SpocOutboxTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.records = [
+            AttendanceRecord.objects.insert_or_get(
+                external_session_id=uuid.uuid4(),
+                student=User.objects.create_user(
+                    email=f'student{n}@example.com',
+                    username=f'student{n}',
+                    name=f'Student {n}',
+                    password='password',
+                    student_external_id=f'STU-{n}'
+                ),
+                student_external_id=f'STU-{n}'
+            )[0]
+            for n in range(3)
+        ]
+        self.client_patcher = mock.patch('attendance.tasks.get_spoc_client')
+        self.spoc = self.client_patcher.start().return_value
+        self.addCleanup(self.client_patcher.stop)
+
+    def test_records_are_queued_once(self):
+        queued = enqueue_spoc_sync(AttendanceRecord.objects.all(), token='qr-token')
+        again = enqueue_spoc_sync(AttendanceRecord.objects.all(), token='qr-token')
+
+        self.assertEqual((queued, again), (3, 0))
+        self.assertEqual(SpocSyncOutbox.objects.count(), 3)
+
+    @mock.patch('attendance.tasks.drain_spoc_outbox.apply_async')
+    @mock.patch('attendance.tasks.drain_spoc_outbox.delay')
+    def test_drain_is_scheduled_once_per_window_until_a_batch_is_full(self, delay, apply_async):
+        schedule_drain(1)
+        self.assertEqual((apply_async.call_count, delay.call_count), (1, 0))
+
+        schedule_drain(1)
+        self.assertEqual((apply_async.call_count, delay.call_count), (1, 1))
+
+    def test_drain_forwards_every_queued_record_in_batches(self):
+        self.spoc.forward_mark.return_value = spoc_response(200)
+        enqueue_spoc_sync(AttendanceRecord.objects.all(), token='qr-token')
+
+        totals = drain_spoc_outbox()
+
+        self.assertEqual(totals, {'synced': 3, 'failed': 0, 'paused': False})
+        self.assertEqual(self.spoc.forward_mark.call_count, 3)
+        self.assertEqual(self.spoc.forward_mark.call_args.kwargs['token'], 'qr-token')
+        self.assertFalse(SpocSyncOutbox.objects.exists())
+        self.assertEqual(AttendanceRecord.objects.filter(synced_with_spoc=True).count(), 3)
+
+    def test_failed_forward_leaves_the_outbox_and_is_scheduled_for_retry(self):
+        self.spoc.forward_mark.side_effect = [
+            spoc_response(200), spoc_response(400), requests.ConnectionError('refused')
+        ]
+        enqueue_spoc_sync(AttendanceRecord.objects.all())
+
+        totals = drain_spoc_outbox()
+
+        self.assertEqual((totals['synced'], totals['failed']), (1, 2))
+        self.assertFalse(SpocSyncOutbox.objects.exists())
+        failed = AttendanceRecord.objects.filter(synced_with_spoc=False)
+        self.assertEqual(failed.count(), 2)
+        for record in failed:
+            self.assertEqual(record.retry_count, 1)
+            self.assertIsNotNone(record.next_attempt_at)
+            self.assertTrue(record.sync_error.startswith('Failed to forward attendance'))
+
+    def test_unexpected_error_is_retried_like_a_failed_forward(self):
+        self.spoc.forward_mark.side_effect = [spoc_response(200), ValueError('bad payload'), spoc_response(200)]
+        enqueue_spoc_sync(AttendanceRecord.objects.all())
+
+        totals = drain_spoc_outbox()
+
+        self.assertEqual((totals['synced'], totals['failed']), (2, 1))
+        failed = AttendanceRecord.objects.get(synced_with_spoc=False)
+        self.assertEqual(failed.retry_count, 1)
+        self.assertIsNotNone(failed.next_attempt_at)
+        self.assertIn('bad payload', failed.sync_error)
+
+    @override_settings(SPOC_OUTBOX_CLAIM_LEASE_SECONDS=60, SPOC_OUTBOX_BATCH_SIZE=3)
+    def test_batch_lost_with_its_worker_is_retried_after_the_lease(self):
+        self.spoc.forward_mark.return_value = spoc_response(200)
+        enqueue_spoc_sync(AttendanceRecord.objects.all(), token='qr-token')
+
+        with mock.patch('attendance.tasks._record_sync_results', side_effect=SystemExit):
+            with self.assertRaises(SystemExit):
+                drain_spoc_outbox()
+
+        self.assertFalse(SpocSyncOutbox.objects.exists())
+        self.assertFalse(AttendanceRecord.objects.filter(next_attempt_at__isnull=True).exists())
+        self.assertEqual(requeue_due_syncs(), 0)
+
+        with mock.patch('attendance.outbox.timezone.now', return_value=timezone.now() + timedelta(seconds=61)):
+            self.assertEqual(requeue_due_syncs(), 3)
+        self.assertEqual(drain_spoc_outbox()['synced'], 3)
+        self.assertEqual(AttendanceRecord.objects.filter(synced_with_spoc=True).count(), 3)
+
+    def test_due_retries_are_requeued_in_chunks_with_the_server_credential(self):
+        now = timezone.now()
+        due = self.records[:2]
+        AttendanceRecord.objects.filter(pk__in=[record.pk for record in due]).update(
+            next_attempt_at=now - timedelta(seconds=1), retry_count=1
+        )
+        AttendanceRecord.objects.filter(pk=self.records[2].pk).update(
+            next_attempt_at=now + timedelta(hours=1), retry_count=1
+        )
+
+        self.assertEqual(requeue_due_syncs(chunk_size=1), 2)
+
+        self.assertEqual(
+            sorted(SpocSyncOutbox.objects.values_list('record_id', 'token')),
+            sorted((record.pk, '') for record in due)
+        )
+        self.assertFalse(AttendanceRecord.objects.filter(
+            pk__in=[record.pk for record in due], next_attempt_at__isnull=False
+        ).exists())
+        self.assertEqual(requeue_due_syncs(), 0)
+
+    @override_settings(SPOC_SYNC_MAX_RETRIES=2, SPOC_SYNC_RETRY_BASE_SECONDS=60)
+    def test_record_is_dead_lettered_after_the_last_retry_and_can_be_replayed(self):
+        self.spoc.forward_mark.return_value = spoc_response(400)
+        record = self.records[0]
+        delays = []
+        for _ in range(3):
+            enqueue_spoc_sync(AttendanceRecord.objects.filter(pk=record.pk))
+            drain_spoc_outbox()
+            record.refresh_from_db()
+            if record.next_attempt_at:
+                delays.append(round((record.next_attempt_at - record.last_sync_attempt).total_seconds()))
+
+        self.assertEqual(delays, [60, 120])
+        self.assertEqual(record.retry_count, 3)
+        self.assertIsNone(record.next_attempt_at)
+        self.assertTrue(SpocDeadLetter.objects.filter(record=record, retry_count=3).exists())
+
+        self.assertEqual(replay_dead_letters(), 1)
+        record.refresh_from_db()
+        self.assertEqual(record.retry_count, 0)
+        self.assertFalse(SpocDeadLetter.objects.exists())
+        self.assertTrue(SpocSyncOutbox.objects.filter(record=record).exists())
+
+
+class SPOCClientTests(TestCase):
+    def test_post_keeps_the_base_url_path_prefix(self):
+        for base_url in ('https://spoc.example.com/backend', 'https://spoc.example.com/backend/'):
+            client = SPOCClient(base_url=base_url)
+            with mock.patch.object(client.session, 'post') as post:
+                client.post('/api/attendance/mark', {})
+            self.assertEqual(post.call_args.args[0], 'https://spoc.example.com/backend/api/attendance/mark')
+
+    @override_settings(SPOC_RETRY_TOTAL=3, SPOC_RETRY_STATUS_FORCELIST=[503])
+    def test_posts_are_retried_on_server_errors(self):
+        retries = SPOCClient(base_url='https://spoc.example.com').session.get_adapter('https://').max_retries
+
+        self.assertTrue(retries.is_retry('POST', 503))
+        self.assertFalse(retries.is_retry('POST', 400))
+        self.assertFalse(retries.raise_on_status)
+
+
+class VerifiedTokenCacheTests(TestCase):
+    def test_expired_entry_is_not_served(self):
+        tokens = VerifiedTokenCache()
+        tokens.set('fresh', {'session_id': '1'}, time.time() + 60)
+        tokens.set('stale', {'session_id': '2'}, time.time() - 1)
+
+        self.assertEqual(tokens.get('fresh'), {'session_id': '1'})
+        self.assertIsNone(tokens.get('stale'))
+
+    def test_least_recently_used_entry_is_evicted(self):
+        tokens = VerifiedTokenCache(maxsize=2)
+        expires_at = time.time() + 60
+        tokens.set('a', {}, expires_at)
+        tokens.set('b', {}, expires_at)
+        tokens.get('a')
+        tokens.set('c', {}, expires_at)
+
+        self.assertIsNotNone(tokens.get('a'))
+        self.assertIsNone(tokens.get('b'))
+        self.assertIsNotNone(tokens.get('c'))
+
+    def test_verify_token_decodes_each_token_once(self):
+        verified_tokens.clear()
+        self.addCleanup(verified_tokens.clear)
+        session_id = uuid.uuid4()
+        token = JWTService.generate_qr_token(session_id, 'course-1', 'teacher-1')
+
+        with mock.patch('attendance.jwt_utils.jwt.decode', wraps=jwt.decode) as decode:
+            first = JWTService.verify_token(token)
+            second = JWTService.verify_token(token)
+
+        self.assertEqual(decode.call_count, 1)
+        self.assertEqual(first, second)
+        self.assertEqual(second['session_id'], str(session_id))
+
+    def test_expired_token_is_rejected_and_not_cached(self):
+        verified_tokens.clear()
+        self.addCleanup(verified_tokens.clear)
+        with override_settings(QR_CODE_EXPIRY_MINUTES=-1):
+            token = JWTService.generate_qr_token(uuid.uuid4(), 'course-1', 'teacher-1')
+
+        with self.assertRaises(AuthenticationFailed) as raised:
+            JWTService.verify_token(token)
+        self.assertEqual(raised.exception.detail['error']['code'], 'token_expired')
+        self.assertIsNone(verified_tokens.get(token))
+
+
+@override_settings(AUTH_DIAGNOSTICS={
+    'ENABLED': True,
+    'DEFAULT_SAMPLE_RATE': 0.0,
+    'SAMPLE_RATES': {'attendance:mark-attendance': 1.0},
+})
+@mock.patch('attendance.diagnostics.logger.isEnabledFor', return_value=True)
+class AuthDiagnosticsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.diagnostics = AuthDiagnostics()
+
+    def request_for(self, view_name):
+        return mock.Mock(resolver_match=mock.Mock(view_name=view_name))
+
+    def test_routes_are_sampled_at_their_own_rate(self, is_enabled_for):
+        self.assertTrue(self.diagnostics.sample(self.request_for('attendance:mark-attendance')))
+        self.assertFalse(self.diagnostics.sample(self.request_for('attendance:qr-scan')))
+
+    def test_runtime_override_switches_sampling_off(self, is_enabled_for):
+        self.diagnostics.set_override(ENABLED=False)
+        self.assertFalse(self.diagnostics.sample(self.request_for('attendance:mark-attendance')))
+
+        self.diagnostics.clear_override()
+        self.assertTrue(self.diagnostics.sample(self.request_for('attendance:mark-attendance')))
+
+    def test_configuration_is_reread_only_after_the_refresh_interval(self, is_enabled_for):
+        request = self.request_for('attendance:mark-attendance')
+        self.assertTrue(self.diagnostics.sample(request))
+
+        # Written by another process: this one keeps its loaded config until the refresh
+        cache.set(OVERRIDE_CACHE_KEY, {'ENABLED': False})
+        self.assertTrue(self.diagnostics.sample(request))
+
+        self.diagnostics._refresh_at = 0.0
+        self.assertFalse(self.diagnostics.sample(request))
+
+    @override_settings(ATTENDANCE_RATE_LIMIT='100/minute')
+    @mock.patch('attendance.outbox.schedule_drain')
+    @mock.patch('attendance.views.auth_diagnostics.sample', return_value=True)
+    def test_sampled_mark_log_leaves_out_the_qr_token(self, sample, schedule_drain, is_enabled_for):
+        student = User.objects.create_user(
+            email='student@example.com',
+            username='student',
+            name='Student',
+            password='password',
+            student_external_id='STU-1'
+        )
+        client = APIClient()
+        client.force_authenticate(student)
+        with self.assertLogs('attendance.views', 'INFO') as logs:
+            response = client.post(
+                '/api/v1/attendance/mark-attendance/',
+                {'session_id': str(uuid.uuid4()), 'token': 'secret-qr-token'},
+                format='json'
+            )
+
+        self.assertEqual(response.status_code, 201)
+        self.assertIn('session_id', logs.output[0])
+        self.assertNotIn('secret-qr-token', '\n'.join(logs.output))
+
+
+class MyAttendanceListTests(TestCase):
+    url = '/api/v1/attendance/my/'
+
+    def setUp(self):
+        self.student = User.objects.create_user(
+            email='student@example.com',
+            username='student',
+            name='Student',
+            password='password',
+            student_external_id='STU-1'
+        )
+        other = User.objects.create_user(
+            email='other@example.com',
+            username='other',
+            name='Other',
+            password='password',
+            student_external_id='STU-2'
+        )
+        now = timezone.now()
+        # Two records share a marked_at, so the id breaks the tie
+        self.marked_at = [now - timedelta(days=days) for days in (0, 1, 1, 2, 3)]
+        self.ids = []
+        for marked_at in self.marked_at:
+            record, _ = AttendanceRecord.objects.insert_or_get(external_session_id=uuid.uuid4(), student=self.student)
+            AttendanceRecord.objects.filter(pk=record.pk).update(marked_at=marked_at)
+            self.ids.append(record.pk)
+        AttendanceRecord.objects.insert_or_get(external_session_id=uuid.uuid4(), student=other)
+        self.client = APIClient()
+        self.client.force_authenticate(self.student)
+
+    def collect_pages(self, url):
+        ids = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            ids.extend(int(row['id']) for row in response.data['results'])
+            url = response.data['next']
+        return ids
+
+    def test_pages_walk_every_record_newest_first(self):
+        ids = self.collect_pages(f'{self.url}?page_size=2')
+
+        expected = [pk for _, pk in sorted(zip(self.marked_at, self.ids), reverse=True)]
+        self.assertEqual(ids, expected)
+
+    def test_date_range_covers_whole_days(self):
+        day = timezone.localdate(self.marked_at[1])
+        ids = self.collect_pages(f'{self.url}?from={day}&to={day}')
+
+        self.assertEqual(sorted(ids), sorted(self.ids[1:3]))
+
+
+class LiveCountsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.staff = User.objects.create_user(
+            email='staff@example.com',
+            username='staff',
+            name='Staff',
+            password='password',
+            is_staff=True
+        )
+        self.students = [
+            User.objects.create_user(
+                email=f'student{n}@example.com',
+                username=f'student{n}',
+                name=f'Student {n}',
+                password='password',
+                student_external_id=f'STU-{n}'
+            )
+            for n in range(2)
+        ]
+        self.session_id = uuid.uuid4()
+        self.client = APIClient()
+        self.client.force_authenticate(self.staff)
+
+    def test_cold_counters_are_rebuilt_then_bumped_without_queries(self):
+        AttendanceRecord.objects.insert_or_get(external_session_id=self.session_id, student=self.students[0])
+        self.assertEqual(get_session_counts(self.session_id)['present'], 1)
+
+        record_marks(self.session_id, ['present', 'late'])
+        with self.assertNumQueries(0):
+            counts = get_session_counts(self.session_id)
+        self.assertEqual(counts, {'present': 2, 'absent': 0, 'late': 1, 'excused': 0})
+
+    @mock.patch('attendance.views.enqueue_spoc_sync')
+    def test_bulk_mark_counts_only_inserted_rows(self, enqueue_spoc_sync):
+        get_session_counts(self.session_id)
+        real_insert_new = AttendanceRecord.objects.insert_new
+
+        def insert_after_concurrent_mark(records):
+            # Another request marks STU-1 and bumps the counter first
+            AttendanceRecord.objects.insert_or_get(external_session_id=self.session_id, student=self.students[1])
+            record_marks(self.session_id, ['present'])
+            return real_insert_new(records)
+
+        with mock.patch.object(AttendanceRecord.objects, 'insert_new', side_effect=insert_after_concurrent_mark):
+            self.client.post('/api/v1/attendance/mark-attendance/bulk/', {
+                'session_id': str(self.session_id),
+                'marks': [{'student_external_id': 'STU-0'}, {'student_external_id': 'STU-1'}],
+            }, format='json')
+
+        self.assertEqual(get_session_counts(self.session_id)['present'], 2)
+
+    def test_live_counts_view(self):
+        AttendanceRecord.objects.insert_or_get(
+            external_session_id=self.session_id, student=self.students[0], status='late'
+        )
+
+        response = self.client.get(f'/api/v1/attendance/sessions/{self.session_id}/live/')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['counts']['late'], 1)
+        self.assertEqual(response.data['total'], 1)
+
+    @override_settings(ATTENDANCE_LIVE_STREAM_INTERVAL_SECONDS=0.01, ATTENDANCE_LIVE_STREAM_MAX_SECONDS=0.05)
+    def test_live_stream_sends_counts_and_closes(self):
+        AttendanceRecord.objects.insert_or_get(external_session_id=self.session_id, student=self.students[0])
+
+        response = self.client.get(
+            f'/api/v1/attendance/sessions/{self.session_id}/live/stream/', HTTP_ACCEPT='text/event-stream'
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        body = b''.join(response.streaming_content).decode()
+        self.assertTrue(body.startswith('retry: 10\n\n'))
+        # Unchanged counts are sent once, however many times they are read
+        self.assertEqual(body.count('event: counts'), 1)
+        self.assertIn('"present": 1', body)
+
+    def test_live_views_are_staff_only(self):
+        self.client.force_authenticate(self.students[0])
+        for url in (
+            f'/api/v1/attendance/sessions/{self.session_id}/live/',
+            f'/api/v1/attendance/sessions/{self.session_id}/live/stream/',
+        ):
+            self.assertEqual(self.client.get(url).status_code, 403)
+
+
+@override_settings(ATTENDANCE_ROLLUP_LAG_SECONDS=0, ATTENDANCE_ROLLUP_BATCH_SIZE=2)
+class RollupTests(TransactionTestCase):
+    # A TransactionTestCase because the rebuild TRUNCATEs the rollup tables;
+    # record ids restart at 1 so batches line up with the watermark
+    reset_sequences = True
+    def setUp(self):
+        self.students = [
+            User.objects.create_user(
+                email=f'student{n}@example.com',
+                username=f'student{n}',
+                name=f'Student {n}',
+                password='password',
+                student_external_id=f'STU-{n}'
+            )
+            for n in range(3)
+        ]
+        self.session_id = uuid.uuid4()
+
+    def mark(self, student, status='present', session_id=None):
+        return AttendanceRecord.objects.insert_or_get(
+            external_session_id=session_id or self.session_id,
+            student=student,
+            status=status,
+            course_id='course-1'
+        )[0]
+
+    def test_later_batches_add_to_existing_rollup_rows(self):
+        self.mark(self.students[0])
+        self.mark(self.students[1], 'late')
+        self.mark(self.students[2], 'absent')
+        # The second batch folds into the session row the first one created
+        self.assertEqual(run_rollup()['batches'], 2)
+
+        self.mark(self.students[0], 'late', session_id=uuid.uuid4())
+        self.mark(self.students[0], 'present', session_id=uuid.uuid4())
+        run_rollup()
+        self.assertEqual(run_rollup()['batches'], 0)
+
+        summary = SessionAttendanceSummary.objects.get(external_session_id=self.session_id)
+        self.assertEqual(
+            (summary.present, summary.late, summary.absent, summary.total, summary.course_id),
+            (1, 1, 1, 3, 'course-1')
+        )
+        daily = StudentDailyAttendance.objects.get(student=self.students[0])
+        self.assertEqual((daily.present, daily.late, daily.total), (2, 1, 3))
+
+    def test_rebuild_matches_incremental_rollups(self):
+        for student in self.students:
+            self.mark(student)
+        run_rollup()
+        self.mark(self.students[0], 'late', session_id=uuid.uuid4())
+        run_rollup()
+        incremental = list(StudentDailyAttendance.objects.order_by('student_id').values())
+
+        rebuild_rollups()
+
+        rebuilt = list(StudentDailyAttendance.objects.order_by('student_id').values())
+        self.assertEqual(
+            [{**row, 'id': None} for row in rebuilt],
+            [{**row, 'id': None} for row in incremental]
+        )
+
+
+@override_settings(ATTENDANCE_EXPORT_CHUNK_SIZE=2)
+class AttendanceExportTests(TestCase):
+    url = '/api/v1/attendance/export/'
+
+    def setUp(self):
+        staff = User.objects.create_user(
+            email='staff@example.com',
+            username='staff',
+            name='Staff',
+            password='password',
+            is_staff=True
+        )
+        self.session_id = uuid.uuid4()
+        for n in range(5):
+            student = User.objects.create_user(
+                email=f'student{n}@example.com',
+                username=f'student{n}',
+                name=f'Student {n}',
+                password='password',
+                student_external_id=f'STU-{n}'
+            )
+            AttendanceRecord.objects.insert_or_get(
+                external_session_id=self.session_id if n < 3 else uuid.uuid4(),
+                student=student,
+                student_external_id=f'STU-{n}'
+            )
+        self.client = APIClient()
+        self.client.force_authenticate(staff)
+
+    def export(self, query):
+        response = self.client.get(f'{self.url}?{query}')
+        self.assertEqual(response.status_code, 200)
+        return response, b''.join(response.streaming_content).decode()
+
+    def test_csv_has_a_header_and_one_line_per_record(self):
+        response, body = self.export('output=csv')
+
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        rows = list(csv.reader(io.StringIO(body)))
+        self.assertEqual(rows[0], [name for name, _ in EXPORT_COLUMNS])
+        self.assertEqual(len(rows), 6)
+        self.assertEqual([row[5] for row in rows[1:]], [f'STU-{n}' for n in range(5)])
+        self.assertEqual(rows[1][4], 'student0@example.com')
+
+    def test_jsonl_is_filtered_by_session(self):
+        response, body = self.export(f'output=jsonl&session={self.session_id}')
+
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        rows = [json.loads(line) for line in body.splitlines()]
+        self.assertEqual(len(rows), 3)
+        self.assertEqual(set(rows[0]), {name for name, _ in EXPORT_COLUMNS})
+        self.assertEqual({row['external_session_id'] for row in rows}, {str(self.session_id)})
+
+    def test_invalid_parameters_are_rejected(self):
+        for query in ('output=xml', 'from=yesterday', 'session=42', 'synced=maybe'):
+            self.assertEqual(self.client.get(f'{self.url}?{query}').status_code, 400, query)
+
+
+@override_settings(
+    SPOC_BREAKER_FAILURE_THRESHOLD=3,
+    SPOC_BREAKER_OPEN_SECONDS=60,
+    SPOC_DISPATCH_RATE_PER_SECOND=50,
+    SPOC_RECOVERY_RATE_PER_SECOND=5,
+    SPOC_RECOVERY_RAMP_SECONDS=100,
+)
+class SpocCircuitBreakerTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.breaker = SpocCircuitBreaker()
+        self.now = 1000.0
+        clock = mock.patch('attendance.backpressure.time.time', side_effect=lambda: self.now)
+        clock.start()
+        self.addCleanup(clock.stop)
+
+    def test_opens_once_the_failure_threshold_is_reached(self):
+        self.breaker.record_failures(2)
+        self.assertEqual(self.breaker.state(), CLOSED)
+
+        self.breaker.record_failures(1)
+        self.assertEqual(self.breaker.state(), OPEN)
+        self.assertEqual(self.breaker.seconds_until_probe(), 60)
+
+    def test_lets_one_probe_through_after_the_open_period(self):
+        self.breaker.trip()
+        self.now += 61
+
+        self.assertEqual(self.breaker.state(), HALF_OPEN)
+        self.assertTrue(self.breaker.claim_probe())
+        self.assertFalse(self.breaker.claim_probe())
+
+    def test_failed_probe_opens_it_again(self):
+        self.breaker.trip()
+        self.now += 61
+        self.breaker.record_failures(1)
+
+        self.assertEqual(self.breaker.state(), OPEN)
+        self.assertTrue(self.breaker.claim_probe())
+
+    def test_successful_probe_closes_it_and_ramps_the_dispatch_rate(self):
+        limiter = DispatchRateLimiter()
+        self.breaker.trip()
+        self.now += 61
+        self.breaker.record_success()
+
+        self.assertEqual(self.breaker.state(), CLOSED)
+        self.assertEqual(limiter.current_rate(), 5)
+        self.now += 50
+        self.assertEqual(limiter.current_rate(), 27)
+        self.assertEqual(limiter.acquire(100), 27)
+        self.assertEqual(limiter.acquire(100), 0)
+
+    @mock.patch('attendance.tasks.defer_drain')
+    @mock.patch('attendance.tasks.get_spoc_client')
+    def test_drain_pauses_while_open(self, get_spoc_client, defer_drain):
+        student = User.objects.create_user(
+            email='student@example.com',
+            username='student',
+            name='Student',
+            password='password',
+            student_external_id='STU-1'
+        )
+        record, _ = AttendanceRecord.objects.insert_or_get(external_session_id=uuid.uuid4(), student=student)
+        enqueue_spoc_sync(AttendanceRecord.objects.filter(pk=record.pk))
+        self.breaker.trip()
+
+        totals = drain_spoc_outbox()
+
+        self.assertTrue(totals['paused'])
+        defer_drain.assert_called_once_with(60)
+        get_spoc_client.return_value.forward_mark.assert_not_called()
+        self.assertTrue(SpocSyncOutbox.objects.filter(record=record).exists())
+
+
+class IdempotencyTestMixin:
+    url = '/api/v1/attendance/mark-attendance/'
+
+    def setUp(self):
+        cache.clear()
+        self.student = User.objects.create_user(
+            email='student@example.com',
+            username='student',
+            name='Student',
+            password='password',
+            student_external_id='STU-1'
+        )
+        self.authorization = f'Bearer {AccessToken.for_user(self.student)}'
+        self.body = {'session_id': str(uuid.uuid4()), 'token': 'qr-token'}
+
+    def post(self, body=None, key='key-1'):
+        client = APIClient()
+        return client.post(
+            self.url, body or self.body, format='json',
+            HTTP_AUTHORIZATION=self.authorization, HTTP_IDEMPOTENCY_KEY=key
+        )
+
+
+@override_settings(ATTENDANCE_RATE_LIMIT='100/minute')
+@mock.patch('attendance.outbox.schedule_drain')
+class IdempotencyMiddlewareTests(IdempotencyTestMixin, TestCase):
+    def test_repeat_gets_the_stored_response(self, schedule_drain):
+        first = self.post()
+        second = self.post()
+
+        self.assertEqual((first.status_code, second.status_code), (201, 201))
+        self.assertEqual(second.content, first.content)
+        self.assertEqual(second['Idempotent-Replayed'], 'true')
+        self.assertFalse(first.has_header('Idempotent-Replayed'))
+        self.assertEqual(AttendanceRecord.objects.count(), 1)
+
+    def test_other_key_runs_the_view(self, schedule_drain):
+        self.post()
+        second = self.post(key='key-2')
+
+        self.assertEqual(second.status_code, 200)
+        self.assertFalse(second.has_header('Idempotent-Replayed'))
+
+    def test_repeat_while_in_flight_gets_409(self, schedule_drain):
+        duplicates = []
+        with mock.patch(
+            'attendance.views.record_marks', side_effect=lambda *args, **kwargs: duplicates.append(self.post())
+        ):
+            first = self.post()
+
+        self.assertEqual(first.status_code, 201)
+        self.assertEqual(duplicates[0].status_code, 409)
+        self.assertEqual(duplicates[0]['Retry-After'], '1')
+
+    def test_same_key_with_another_body_gets_422(self, schedule_drain):
+        self.post()
+        response = self.post(body={**self.body, 'status': 'late'})
+
+        self.assertEqual(response.status_code, 422)
+
+    def test_server_errors_are_not_stored(self, schedule_drain):
+        with mock.patch('attendance.views.record_marks', side_effect=RuntimeError('cache down')):
+            first = self.post()
+        second = self.post()
+
+        self.assertEqual(first.status_code, 500)
+        self.assertEqual(second.status_code, 200)
+        self.assertFalse(second.has_header('Idempotent-Replayed'))
+        # The record was queued by the statement that inserted it
+        self.assertEqual(list(SpocSyncOutbox.objects.values_list('token', flat=True)), ['qr-token'])
+
+    def test_already_recorded_mark_requeues_a_record_that_was_never_queued(self, schedule_drain):
+        record, _ = AttendanceRecord.objects.insert_or_get(
+            external_session_id=self.body['session_id'], student=self.student, student_external_id='STU-1'
+        )
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.post()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(list(SpocSyncOutbox.objects.values_list('record_id', 'token')), [(record.pk, 'qr-token')])
+        schedule_drain.assert_called_once_with(1)
+
+        # One waiting for a retry is left to the retry sweep
+        SpocSyncOutbox.objects.all().delete()
+        AttendanceRecord.objects.filter(pk=record.pk).update(next_attempt_at=timezone.now())
+        self.assertEqual(self.post(key='key-2').status_code, 200)
+        self.assertFalse(SpocSyncOutbox.objects.exists())
+
+
+@override_settings(ATTENDANCE_RATE_LIMIT='100/minute')
+@mock.patch('attendance.views.record_marks')
+@mock.patch('attendance.outbox.schedule_drain')
+class ConcurrentIdempotentRequestTests(IdempotencyTestMixin, TransactionTestCase):
+    workers = 8
+
+    def test_parallel_duplicates_run_the_view_once(self, schedule_drain, record_marks):
+        barrier = threading.Barrier(self.workers)
+        rejected = threading.Event()
+        status_codes = []
+        lock = threading.Lock()
+
+        # The request that gets through stays in flight until every duplicate has been answered
+        record_marks.side_effect = lambda *args, **kwargs: rejected.wait(timeout=10)
+
+        def post():
+            try:
+                barrier.wait()
+                response = self.post()
+                with lock:
+                    status_codes.append(response.status_code)
+                    if len(status_codes) == self.workers - 1:
+                        rejected.set()
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=post) for _ in range(self.workers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(sorted(status_codes), [201] + [409] * (self.workers - 1))
+        self.assertEqual(record_marks.call_count, 1)
+        self.assertEqual(AttendanceRecord.objects.count(), 1)
+
+
+class LoadtestQrBurstTests(TransactionTestCase):
+    def test_percentile_is_nearest_rank(self):
+        values = list(range(1, 101))
+        self.assertEqual(percentile(values, 50), 50)
+        self.assertEqual(percentile(values, 99), 99)
+        self.assertEqual(percentile([7], 99), 7)
+        self.assertEqual(percentile([], 50), 0.0)
+
+    def test_small_burst_marks_and_forwards_every_student(self):
+        out = io.StringIO()
+        call_command(
+            'loadtest_qr_burst', students=4, window=0, concurrency=4, spoc_delay_ms=0,
+            flow='both', json=True, stdout=out
+        )
+
+        reports = json.loads(out.getvalue())
+        self.assertEqual([report['flow'] for report in reports], ['two-step', 'one-shot'])
+        for report in reports:
+            self.assertEqual(report['records'], 4)
+            self.assertEqual(report['spoc']['synced'], 4)
+            self.assertEqual(report['spoc']['requests_received'], 4)
+            for stats in report['endpoints'].values():
+                self.assertEqual(sum(stats['status_codes'].values()), 4)
+                self.assertTrue(all(code.startswith('2') for code in stats['status_codes']))
+        self.assertFalse(User.objects.filter(email__endswith='@loadtest.invalid').exists())
+
+
+@override_settings(ATTENDANCE_HOT_MONTHS=6, ATTENDANCE_ROLLUP_LAG_SECONDS=0)
+class ArchivePartitionTests(TestCase):
+    def setUp(self):
+        self.student = User.objects.create_user(
+            email='student@example.com',
+            username='student',
+            name='Student',
+            password='password',
+            student_external_id='STU-1',
+            is_staff=True
+        )
+        this_month = month_start(timezone.localdate())
+        self.cold_months = [add_months(this_month, -9), add_months(this_month, -8)]
+        self.ids = []
+        for marked_month in [*self.cold_months, this_month]:
+            record, _ = AttendanceRecord.objects.insert_or_get(external_session_id=uuid.uuid4(), student=self.student)
+            AttendanceRecord.objects.filter(pk=record.pk).update(
+                marked_at=timezone.make_aware(datetime(marked_month.year, marked_month.month, 1, 12)),
+                synced_with_spoc=True
+            )
+            self.ids.append(record.pk)
+        # Unsynced records still scheduled for a retry stay in the hot table
+        pending, _ = AttendanceRecord.objects.insert_or_get(external_session_id=uuid.uuid4(), student=self.student)
+        AttendanceRecord.objects.filter(pk=pending.pk).update(
+            marked_at=timezone.make_aware(datetime(self.cold_months[0].year, self.cold_months[0].month, 2, 12)),
+            next_attempt_at=timezone.now()
+        )
+        self.ids.append(pending.pk)
+        run_rollup()
+        self.client = APIClient()
+        self.client.force_authenticate(self.student)
+
+    def list_ids(self, query=''):
+        ids = []
+        url = f'/api/v1/attendance/my/?page_size=1&{query}'
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            ids.extend(int(row['id']) for row in response.data['results'])
+            url = response.data['next']
+        return ids
+
+    def export_ids(self, query=''):
+        response = self.client.get(f'/api/v1/attendance/export/?output=jsonl&{query}')
+        self.assertEqual(response.status_code, 200)
+        return [json.loads(line)['id'] for line in b''.join(response.streaming_content).decode().splitlines()]
+
+    def test_settled_cold_records_move_to_monthly_partitions(self):
+        self.assertEqual(move_cold_records(batch_size=1), 2)
+
+        self.assertEqual(list_archive_partitions(), self.cold_months)
+        self.assertEqual(sorted(ArchivedAttendanceRecord.objects.values_list('id', flat=True)), self.ids[:2])
+        self.assertEqual(sorted(AttendanceRecord.objects.values_list('id', flat=True)), self.ids[2:])
+
+    def test_list_and_export_read_across_the_archive(self):
+        move_cold_records()
+
+        # Newest first: this month, then the pending record and the two archived months
+        self.assertEqual(self.list_ids(), [self.ids[2], self.ids[1], self.ids[3], self.ids[0]])
+        self.assertEqual(self.export_ids(), sorted(self.ids))
+        cold_day = self.cold_months[1]
+        self.assertEqual(self.list_ids(f'from={cold_day}&to={cold_day + timedelta(days=3)}'), [self.ids[1]])
+        self.assertEqual(self.export_ids(f'from={cold_day}&to={cold_day + timedelta(days=3)}'), [self.ids[1]])
+
+    def test_ranges_after_the_hot_cutoff_read_the_hot_table_only(self):
+        move_cold_records()
+        today = timezone.localdate()
+
+        with mock.patch.object(ArchivedAttendanceRecord, 'objects') as archive:
+            self.assertEqual(self.list_ids(f'from={month_start(today)}'), [self.ids[2]])
+            self.assertEqual(self.export_ids(f'from={month_start(today)}'), [self.ids[2]])
+        self.assertEqual(archive.mock_calls, [])
+
+    def test_archived_month_round_trips_through_a_file(self):
+        move_cold_records()
+
+        with tempfile.TemporaryDirectory() as directory:
+            result = archive_partition_to_file(self.cold_months[0], directory)
+            with gzip.open(result['path'], 'rt', encoding='utf-8') as archived:
+                rows = [json.loads(line) for line in archived]
+
+        self.assertEqual(result['rows'], 1)
+        self.assertEqual([row['id'] for row in rows], [self.ids[0]])
+        self.assertEqual(rows[0]['student_id'], self.student.pk)
+        self.assertEqual(list_archive_partitions(), self.cold_months[1:])
+        self.assertEqual(self.export_ids(), sorted(self.ids[1:]))
+
+
+@override_settings(ATTENDANCE_RATE_LIMIT='100/minute')
+@mock.patch('attendance.outbox.schedule_drain')
+class ScanAndMarkTests(TestCase):
+    url = '/api/v1/attendance/scan-and-mark/'
+
+    def setUp(self):
+        cache.clear()
+        verified_tokens.clear()
+        self.student = User.objects.create_user(
+            email='student@example.com',
+            username='student',
+            name='Student',
+            password='password',
+            student_external_id='STU-1'
+        )
+        self.session_id = uuid.uuid4()
+        self.token = JWTService.generate_qr_token(self.session_id, 'course-1', 'teacher-1')
+        self.client = APIClient()
+        self.client.force_authenticate(self.student)
+
+    def scan(self, qr_content=None, **extra):
+        if qr_content is None:
+            qr_content = {'session_id': str(self.session_id), 'token': self.token}
+        return self.client.post(self.url, {'qr_data': json.dumps(qr_content)}, format='json', **extra)
+
+    def test_first_scan_marks_and_queues_the_record(self, schedule_drain):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.scan(HTTP_X_FORWARDED_FOR='203.0.113.7, 10.0.0.1')
+
+        self.assertEqual(response.status_code, 201)
+        record = AttendanceRecord.objects.get(external_session_id=self.session_id, student=self.student)
+        self.assertEqual(
+            (record.course_id, record.student_external_id, record.method, record.ip_address),
+            ('course-1', 'STU-1', 'QR', '203.0.113.7')
+        )
+        self.assertTrue(SpocSyncOutbox.objects.filter(record=record, token=self.token).exists())
+        schedule_drain.assert_called_once_with(1)
+
+    def test_repeat_scan_is_already_marked(self, schedule_drain):
+        self.scan()
+        response = self.scan()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['status'], 'already_marked')
+        self.assertEqual(AttendanceRecord.objects.count(), 1)
+
+    def test_malformed_forwarded_address_falls_back_to_remote_addr(self, schedule_drain):
+        response = self.scan(HTTP_X_FORWARDED_FOR='not-an-ip, 10.0.0.1', REMOTE_ADDR='198.51.100.2')
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(AttendanceRecord.objects.get().ip_address, '198.51.100.2')
+
+    def test_malformed_qr_data_is_rejected(self, schedule_drain):
+        for qr_content in (
+            [str(self.session_id), self.token],
+            {'session_id': str(self.session_id), 'token': ['not', 'a', 'string']},
+            {'session_id': str(self.session_id), 'token': 42},
+            {'session_id': 'not-a-uuid', 'token': self.token},
+            {'session_id': 42, 'token': self.token},
+            {'token': self.token},
+        ):
+            response = self.scan(qr_content)
+            self.assertEqual(response.status_code, 400, qr_content)
+            self.assertIn('qr_data', response.data)
+        self.assertEqual(self.client.post(self.url, {'qr_data': '{'}, format='json').status_code, 400)
+        self.assertFalse(AttendanceRecord.objects.exists())
+
+    def test_token_for_another_session_is_rejected(self, schedule_drain):
+        response = self.scan({'session_id': str(uuid.uuid4()), 'token': self.token})
+
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(AttendanceRecord.objects.exists())
+
+    def test_invalid_token_is_rejected(self, schedule_drain):
+        response = self.scan({'session_id': str(self.session_id), 'token': 'not-a-jwt'})
+
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response.data['error']['code'], 'invalid_token')
+        self.assertFalse(AttendanceRecord.objects.exists())
+
+    def test_retry_with_idempotency_key_is_replayed(self, schedule_drain):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.student)}')
+        body = {'qr_data': json.dumps({'session_id': str(self.session_id), 'token': self.token})}
+
+        first = client.post(self.url, body, format='json', HTTP_IDEMPOTENCY_KEY='scan-1')
+        second = client.post(self.url, body, format='json', HTTP_IDEMPOTENCY_KEY='scan-1')
+
+        self.assertEqual((first.status_code, second.status_code), (201, 201))
+        self.assertEqual(second['Idempotent-Replayed'], 'true')
+
+
+@mock.patch('attendance.outbox.schedule_drain')
+class MarkAttendanceAfterScanTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        verified_tokens.clear()
+        self.student = User.objects.create_user(
+            email='student@example.com',
+            username='student',
+            name='Student',
+            password='password',
+            student_external_id='STU-1'
+        )
+        self.session_id = uuid.uuid4()
+        self.token = JWTService.generate_qr_token(self.session_id, 'course-1', 'teacher-1')
+
+    def mark(self):
+        request = APIRequestFactory().post(
+            '/', {'session_id': str(self.session_id), 'token': self.token}, format='json'
+        )
+        force_authenticate(request, self.student)
+        return MarkAttendanceAfterScanView.as_view()(request)
+
+    def test_mark_is_inserted_and_queued(self, schedule_drain):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.mark()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['status'], 'success')
+        record = AttendanceRecord.objects.get(external_session_id=self.session_id, student=self.student)
+        self.assertEqual((record.course_id, record.student_external_id), ('course-1', 'STU-1'))
+        self.assertTrue(SpocSyncOutbox.objects.filter(record=record, token=self.token).exists())
+        schedule_drain.assert_called_once_with(1)
+
+    def test_repeat_is_already_marked(self, schedule_drain):
+        self.mark()
+        response = self.mark()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['status'], 'already_marked')
+        self.assertEqual(AttendanceRecord.objects.count(), 1)
+        self.assertEqual(SpocSyncOutbox.objects.count(), 1)
@@ -1,7 +1,78 @@
-from rest_framework.throttling import UserRateThrottle
 from django.conf import settings
+from rest_framework.throttling import SimpleRateThrottle
 
-class AttendanceRateThrottle(UserRateThrottle):
+
+class SlidingWindowRateThrottle(SimpleRateThrottle):
+    """
+    Rate throttle that keeps one atomic counter per key per window.
+
+    SimpleRateThrottle stores the timestamp of every request in the window and
+    rewrites the whole list on each hit. This keeps a counter for the current
+    and the previous fixed window instead, and estimates the sliding-window
+    count as:
+
+        previous * (time left in the current window / duration) + current
+
+    Each request costs one add, one incr and one get, however many requests
+    the key has made. It is counted with an atomic cache.incr, so limits
+    hold across worker processes as long as the cache is shared (Redis when
+    REDIS_URL is set; LocMemCache only limits each process separately).
+    Rejected requests are not counted.
+    """
+
+    def allow_request(self, request, view):
+        if self.rate is None:
+            return True
+
+        self.key = self.get_cache_key(request, view)
+        if self.key is None:
+            return True
+
+        self.now = self.timer()
+        window, elapsed = divmod(self.now, self.duration)
+        current_key = f'{self.key}:{int(window)}'
+        previous_key = f'{self.key}:{int(window) - 1}'
+
+        # Each window's counter has to outlive the window that follows it.
+        self.cache.add(current_key, 0, timeout=2 * self.duration)
+        try:
+            current = self.cache.incr(current_key)
+        except ValueError:
+            # Evicted between add and incr
+            self.cache.set(current_key, 1, timeout=2 * self.duration)
+            current = 1
+        previous = self.cache.get(previous_key, 0)
+
+        weight = 1 - elapsed / self.duration
+        if previous * weight + current <= self.num_requests:
+            return True
+
+        try:
+            self.cache.decr(current_key)
+        except ValueError:
+            pass
+        self._wait = self._seconds_until_allowed(previous, current - 1, elapsed)
+        return self.throttle_failure()
+
+    def _seconds_until_allowed(self, previous, current, elapsed):
+        """Seconds until one more request fits, assuming no other requests arrive."""
+        allowance = self.num_requests - 1 - current
+        if allowance >= 0 and previous:
+            # The previous window's weight has to fall to allowance / previous
+            return max(0.0, (1 - allowance / previous) * self.duration - elapsed)
+        # The current window is full by itself; it starts counting as the
+        # previous window once the next one begins.
+        allowance = self.num_requests - 1
+        remaining = self.duration - elapsed
+        if current:
+            remaining += max(0.0, 1 - allowance / current) * self.duration
+        return remaining
+
+    def wait(self):
+        return getattr(self, '_wait', None)
+
+
+class AttendanceRateThrottle(SlidingWindowRateThrottle):
     """
     Custom throttle for attendance marking endpoint.
     Rate limit is configurable via ATTENDANCE_RATE_LIMIT setting.
@@ -9,9 +80,12 @@ class AttendanceRateThrottle(UserRateThrottle):
     """
     scope = 'attendance'
     
-    def __init__(self):
-        super().__init__()
-        self.rate = getattr(settings, 'ATTENDANCE_RATE_LIMIT', '5/minute')
+    def get_rate(self):
+        """
+        Read the rate from ATTENDANCE_RATE_LIMIT instead of DEFAULT_THROTTLE_RATES,
+        which has no 'attendance' entry.
+        """
+        return getattr(settings, 'ATTENDANCE_RATE_LIMIT', '5/minute')
     
     def get_cache_key(self, request, view):
         """
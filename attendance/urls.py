@@ -2,9 +2,16 @@ from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from .views import (
     QRCodeScanView,
+    ScanAndMarkView,
     MarkAttendanceView,
+    BulkMarkAttendanceView,
     HealthCheckView,
-    MyAttendanceListView
+    MyAttendanceListView,
+    SessionLiveCountsView,
+    SessionLiveStreamView,
+    StudentDailyReportView,
+    CourseSessionReportView,
+    AttendanceExportView
 )
 
 app_name = 'attendance'
@@ -17,12 +24,29 @@ urlpatterns = [
     # QR Code scanning endpoint (for students)
     path('api/v1/attendance/scan/', QRCodeScanView.as_view(), name='qr-scan'),
     
+    # Scan and mark in one request (for students)
+    path('api/v1/attendance/scan-and-mark/', ScanAndMarkView.as_view(), name='scan-and-mark'),
+    
     # Mark attendance after validation (for Educate Portal)
     path('api/v1/attendance/mark-attendance/', MarkAttendanceView.as_view(), name='mark-attendance'),
     
+    # Mark attendance for a whole roster in one request (for staff)
+    path('api/v1/attendance/mark-attendance/bulk/', BulkMarkAttendanceView.as_view(), name='mark-attendance-bulk'),
+    
     # Fetch authenticated user's attendance records
     path('api/v1/attendance/my/', MyAttendanceListView.as_view(), name='my-attendance'),
     
+    # Live attendance counts for a session, polled or as a server-sent event feed
+    path('api/v1/attendance/sessions/<uuid:session_id>/live/', SessionLiveCountsView.as_view(), name='session-live'),
+    path('api/v1/attendance/sessions/<uuid:session_id>/live/stream/', SessionLiveStreamView.as_view(), name='session-live-stream'),
+    
+    # Attendance reports served from the rollup tables (for staff)
+    path('api/v1/attendance/reports/students/<int:student_id>/daily/', StudentDailyReportView.as_view(), name='report-student-daily'),
+    path('api/v1/attendance/reports/courses/<str:course_id>/sessions/', CourseSessionReportView.as_view(), name='report-course-sessions'),
+    
+    # Streaming CSV / JSON Lines export of attendance records (for staff)
+    path('api/v1/attendance/export/', AttendanceExportView.as_view(), name='export'),
+    
     # Health check endpoint
     path('api/v1/attendance/health/', HealthCheckView.as_view(), name='health-check'),
 ]
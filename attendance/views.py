@@ -1,88 +1,47 @@
 import logging
 import json
+import time
 import uuid
 from datetime import datetime, timedelta
 from django.conf import settings
+from django.http import StreamingHttpResponse
 from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
 from rest_framework import status, generics
 from rest_framework.views import APIView
 from rest_framework.response import Response
-from rest_framework.permissions import IsAuthenticated
-from rest_framework.authentication import TokenAuthentication, BaseAuthentication
-from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework.permissions import IsAuthenticated, IsAdminUser
+from rest_framework.authentication import TokenAuthentication
 from rest_framework.exceptions import AuthenticationFailed, ValidationError
-
-class DebugJWTAuthentication(JWTAuthentication):
-    def authenticate(self, request):
-        logger.debug("=== Starting JWT Authentication ===")
-        try:
-            # Log all headers for debugging
-            logger.debug("All headers: %s", {k: v for k, v in request.META.items() if k.startswith('HTTP_')})
-            
-            # Get the authorization header
-            auth_header = request.META.get('HTTP_AUTHORIZATION', '')
-            logger.debug(f"Raw Auth Header: {auth_header}")
-            
-            # Check if the header is in the correct format
-            if not auth_header.startswith('Bearer '):
-                logger.warning("JWT Authentication failed: No Bearer token in header")
-                return None
-                
-            # Extract the token
-            token = auth_header.split(' ')[1] if len(auth_header.split(' ')) > 1 else ''
-            logger.debug(f"Extracted token: {token[:10]}...")
-            
-            # Try to authenticate with the token
-            try:
-                logger.debug("Attempting to validate JWT token...")
-                user_jwt = super().authenticate(request)
-                if user_jwt is not None:
-                    user, token = user_jwt
-                    logger.info(f"JWT Authentication SUCCESS for user: {user.username}")
-                    logger.debug(f"Token type: {type(token).__name__}")
-                    logger.debug(f"Token payload: {token.payload}")
-                    return user_jwt
-                else:
-                    logger.warning("JWT Authentication failed: No user returned")
-                    return None
-            except Exception as auth_error:
-                import traceback
-                error_trace = traceback.format_exc()
-                logger.error(f"JWT Authentication ERROR: {str(auth_error)}\n{error_trace}")
-                
-                # Log additional debug info
-                from rest_framework_simplejwt.settings import api_settings as jwt_settings
-                logger.debug(f"JWT Settings - SECRET_KEY: {jwt_settings.SIGNING_KEY}")
-                logger.debug(f"JWT Settings - ALGORITHM: {jwt_settings.ALGORITHM}")
-                
-                return None
-                
-        except Exception as e:
-            logger.critical(f"Unexpected error in JWT Authentication: {str(e)}", exc_info=True)
-            return None
-
-class DebugTokenAuthentication(TokenAuthentication):
-    def authenticate(self, request):
-        logger.debug("Attempting Token Authentication")
-        try:
-            result = super().authenticate(request)
-            if result is not None:
-                logger.debug(f"Token Authentication successful for user: {result[0].username}")
-            else:
-                logger.debug("Token Authentication failed - no user returned")
-            return result
-        except Exception as e:
-            logger.error(f"Token Authentication error: {str(e)}", exc_info=True)
-            return None
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from .authentication import DebugJWTAuthentication, DebugTokenAuthentication
+from .backpressure import spoc_breaker
+from .counters import get_session_counts, record_marks
+from .diagnostics import auth_diagnostics
+from .exporting import CONTENT_TYPES, EXPORT_FORMATS, export_queryset, iter_export
 from .serializers import (
     MarkAttendanceSerializer,
+    BulkMarkAttendanceSerializer,
     QRCodeScanSerializer,
+    ScanAndMarkSerializer,
     HealthCheckSerializer,
-    AttendanceRecordListSerializer
+    AttendanceRecordListSerializer,
+    SessionAttendanceSummarySerializer,
+    StudentDailyAttendanceSerializer,
+    get_client_ip
 )
+from .pagination import AttendanceCursorPagination, MergedRecords
+from .partitions import reaches_archive
 from .throttling import AttendanceRateThrottle
 from .jwt_utils import JWTService
-from .models import AttendanceRecord
+from .models import (
+    ArchivedAttendanceRecord,
+    AttendanceRecord,
+    SessionAttendanceSummary,
+    StudentDailyAttendance,
+)
+from .outbox import enqueue_spoc_sync, insert_and_enqueue
+from .spoc_client import get_spoc_client
 
 logger = logging.getLogger(__name__)
 
@@ -96,21 +55,13 @@ class MarkAttendanceView(APIView):
     throttle_classes = [AttendanceRateThrottle]
     
     def post(self, request, *args, **kwargs):
-        # Add debug logging for the incoming request
-        logger.debug(
-            f"MarkAttendanceView - Request received. "
-            f"User: {request.user.id if request.user.is_authenticated else 'Not authenticated'}, "
-            f"Auth headers: {request.META.get('HTTP_AUTHORIZATION', 'No auth header')}, "
-            f"Data: {request.data}"
-        )
-        
-        # Log authentication classes being used
-        logger.debug(f"Authentication classes: {[auth.__name__ for auth in self.authentication_classes]}")
-        
-        # If not authenticated, log why
-        if not request.user.is_authenticated:
-            logger.warning("User not authenticated. Available auth headers: %s", 
-                         {k: v for k, v in request.META.items() if k.startswith('HTTP_')})
+        if auth_diagnostics.sample(request):
+            logger.info(
+                "MarkAttendanceView - Request received. User: %s, Data: %s, Authentication classes: %s",
+                request.user.id if request.user.is_authenticated else 'Not authenticated',
+                {key: value for key, value in request.data.items() if key != 'token'},
+                [auth.__name__ for auth in self.authentication_classes]
+            )
         
         # Get student_external_id from request data or user profile
         data = request.data.copy()
@@ -140,15 +91,10 @@ class MarkAttendanceView(APIView):
                         "3. If this is a test account, make sure it's properly configured with a student_external_id"
                     ]
                 }
-                logger.error(f"Student external ID not found: {error_details}")
+                logger.error("Student external ID not found: %s", error_details)
                 return Response(error_details, status=status.HTTP_400_BAD_REQUEST)
             
-            logger.debug(f"Using student_external_id from user profile: {request.user.student_external_id}")
             data['student_external_id'] = request.user.student_external_id
-        else:
-            logger.debug(f"Using student_external_id from request: {data['student_external_id']}")
-            
-        logger.debug(f"Proceeding with student_external_id: {data['student_external_id']}")
         
         # Add user to context for logging and validation
         context = {'request': request, 'user': request.user}
@@ -168,7 +114,7 @@ class MarkAttendanceView(APIView):
         try:
             serializer = MarkAttendanceSerializer(data=data, context=context)
             if not serializer.is_valid():
-                logger.warning(f"Attendance validation failed: {serializer.errors}")
+                logger.warning("Attendance validation failed: %s", serializer.errors)
                 return Response(
                     {
                         "status": "error",
@@ -179,51 +125,50 @@ class MarkAttendanceView(APIView):
                     status=status.HTTP_400_BAD_REQUEST
                 )
                 
-            # Check for existing attendance record
-            existing_record = AttendanceRecord.objects.filter(
-                external_session_id=serializer.validated_data['session_id'],
-                student_external_id=data['student_external_id']
-            ).first()
+            # Insert and queue the record, or fetch the existing one, in a single statement
+            attendance = serializer.save()
             
-            if existing_record:
+            if not serializer.created:
+                # Picks up a record left unqueued by an earlier failure; one that is
+                # queued, waiting for a retry or dead-lettered is left alone.
+                try:
+                    enqueue_spoc_sync(
+                        AttendanceRecord.objects.filter(
+                            pk=attendance.pk,
+                            synced_with_spoc=False,
+                            next_attempt_at__isnull=True,
+                            spoc_dead_letter__isnull=True
+                        ),
+                        token=serializer.validated_data.get('token')
+                    )
+                except Exception as forward_err:
+                    logger.warning(f"Failed to queue SPOC forward: {forward_err}")
                 return Response(
                     {
                         "status": "success",
                         "message": "Attendance already recorded",
-                        "attendance_id": str(existing_record.id),
-                        "marked_at": existing_record.marked_at.isoformat(),
-                        "synced_with_spoc": existing_record.synced_with_spoc
+                        "attendance_id": str(attendance.id),
+                        "marked_at": attendance.marked_at.isoformat(),
+                        "synced_with_spoc": attendance.synced_with_spoc
                     },
                     status=status.HTTP_200_OK
                 )
             
-            # Create new attendance record
-            attendance = serializer.save()
+            record_marks(attendance.external_session_id, [attendance.status])
             
             # Log successful attendance creation
             logger.info(
-                f"Attendance recorded - Session: {attendance.external_session_id}, "
-                f"Student: {attendance.student_external_id}, "
-                f"User: {request.user.email}"
+                "Attendance recorded - Session: %s, Student: %s, User: %s",
+                attendance.external_session_id,
+                attendance.student_external_id,
+                request.user.email
             )
             
-            # Forward to SPOC server asynchronously
-            try:
-                qr_token = serializer.validated_data.get('token')
-                push_mark_to_spoc.delay(
-                    session_id=str(attendance.external_session_id),
-                    student_external_id=attendance.student_external_id,
-                    token=qr_token,
-                    method=attendance.method
-                )
-            except Exception as forward_err:
-                logger.warning(f"Failed to enqueue SPOC forward task: {forward_err}")
-            
             return Response(
                 {
                     "status": "success",
                     "message": "Attendance recorded successfully",
-                    "data": MarkAttendanceSerializer(attendance).data
+                    "data": AttendanceRecordListSerializer(attendance).data
                 }, 
                 status=status.HTTP_201_CREATED
             )
@@ -240,6 +185,65 @@ class MarkAttendanceView(APIView):
             )
 
 
+class BulkMarkAttendanceView(APIView):
+    """
+    API endpoint for marking a whole roster for one session in a single request.
+    Validates every mark up front, inserts all new records with one statement
+    and queues them for SPOC forwarding with one more.
+    """
+    authentication_classes = [DebugJWTAuthentication, DebugTokenAuthentication]
+    permission_classes = [IsAuthenticated, IsAdminUser]
+
+    def post(self, request, *args, **kwargs):
+        serializer = BulkMarkAttendanceSerializer(data=request.data, context={'request': request})
+        if not serializer.is_valid():
+            return Response(
+                {
+                    "status": "error",
+                    "message": "Invalid data provided",
+                    "errors": serializer.errors
+                },
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        session_id = serializer.validated_data['session_id']
+        records = serializer.build_records()
+
+        # Only rows that were actually inserted count as created; everything
+        # else was already marked, before or during this request.
+        new_records = AttendanceRecord.objects.insert_new(records)
+        created_ids = {record.student_id for record in new_records}
+        already_marked = [
+            record.student_external_id for record in records if record.student_id not in created_ids
+        ]
+        record_marks(session_id, [record.status for record in new_records])
+
+        logger.info(
+            "Bulk attendance recorded - Session: %s, Created: %d, Already marked: %d, User: %s",
+            session_id, len(new_records), len(already_marked), request.user.email
+        )
+
+        if new_records:
+            try:
+                enqueue_spoc_sync(
+                    AttendanceRecord.objects.filter(pk__in=[record.pk for record in new_records]),
+                    token=serializer.validated_data.get('token', '')
+                )
+            except Exception as forward_err:
+                logger.warning(f"Failed to queue batched SPOC forward: {forward_err}")
+
+        return Response(
+            {
+                "status": "success",
+                "message": "Bulk attendance recorded successfully",
+                "session_id": str(session_id),
+                "created": len(new_records),
+                "already_marked": already_marked
+            },
+            status=status.HTTP_201_CREATED if new_records else status.HTTP_200_OK
+        )
+
+
 class QRCodeScanView(APIView):
     """
     Handle QR code scanning from Educate Portal
@@ -314,36 +318,15 @@ class MarkAttendanceAfterScanView(APIView):
     throttle_classes = [AttendanceRateThrottle]
 
     def post(self, request, *args, **kwargs):
-        # Log incoming request data and headers
-        logger.info("=== Incoming Attendance Request ===")
-        logger.info(f"Request Headers: {dict(request.headers)}")
-        logger.info(f"Request Data: {request.data}")
-        logger.info(f"User: {request.user} (Authenticated: {request.user.is_authenticated})")
-        
-        # Log authentication information
-        auth_header = request.META.get('HTTP_AUTHORIZATION', 'No Auth Header')
-        logger.info(f"Authorization Header: {auth_header}")
-        
         serializer = MarkAttendanceSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
         
-        # Log validated data from QR code
-        logger.info("=== QR Code Data ===")
-        for key, value in serializer.validated_data.items():
-            logger.info(f"{key}: {value}")
-            
-        # If token is in the data, log its contents (without the actual token for security)
-        if 'token' in serializer.validated_data:
-            token = serializer.validated_data['token']
-            try:
-                # Decode without verification just to log the contents
-                import jwt
-                decoded = jwt.decode(token, options={"verify_signature": False})
-                logger.info("Decoded JWT Token Contents:")
-                for key, value in decoded.items():
-                    logger.info(f"  {key}: {value}")
-            except Exception as e:
-                logger.warning(f"Could not decode JWT token: {str(e)}")
+        if auth_diagnostics.sample(request):
+            logger.info(
+                "MarkAttendanceAfterScanView - User: %s (Authenticated: %s), QR data: %s",
+                request.user, request.user.is_authenticated,
+                {key: value for key, value in serializer.validated_data.items() if key != 'token'}
+            )
         
         session_id = serializer.validated_data['session_id']
         token = serializer.validated_data['token']
@@ -353,14 +336,22 @@ class MarkAttendanceAfterScanView(APIView):
             payload = JWTService.verify_token(token)
             
             # Verify session_id matches
-            if payload.get('session_id') != session_id:
+            if payload.get('session_id') != str(session_id):
                 raise ValidationError('Invalid session ID')
             
-            # Check if attendance already marked (double-check)
-            if AttendanceRecord.objects.filter(
+            # Insert and queue the record, or fetch the existing one, in a single statement
+            attendance, created = insert_and_enqueue(
+                token=token,
                 external_session_id=session_id,
-                student=request.user
-            ).exists():
+                student=request.user,
+                student_external_id=getattr(request.user, 'student_external_id', None),
+                method='QR',
+                user_agent=request.META.get('HTTP_USER_AGENT', ''),
+                ip_address=self.get_client_ip(request),
+                course_id=str(payload.get('course_id') or '')
+            )
+            
+            if not created:
                 return Response({
                     'status': 'already_marked',
                     'message': 'Attendance already recorded for this session',
@@ -368,23 +359,10 @@ class MarkAttendanceAfterScanView(APIView):
                     'course_id': payload.get('course_id')
                 }, status=status.HTTP_200_OK)
             
-            # Create attendance record
-            attendance = AttendanceRecord.objects.create(
-                external_session_id=session_id,
-                student=request.user,
-                method='QR',
-                user_agent=request.META.get('HTTP_USER_AGENT', ''),
-                ip_address=self.get_client_ip(request),
-                metadata={
-                    'course_id': payload.get('course_id'),
-                    'teacher_id': payload.get('teacher_id'),
-                    'scanned_at': timezone.now().isoformat()
-                }
-            )
+            record_marks(session_id, [attendance.status])
             
             # You can add additional logic here, like:
             # - Sending notifications
-            # - Updating attendance statistics
             # - Triggering webhooks
             
             return Response({
@@ -404,15 +382,158 @@ class MarkAttendanceAfterScanView(APIView):
     
     def get_client_ip(self, request):
         """Get the client's IP address from the request."""
-        x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
-        if x_forwarded_for:
-            return x_forwarded_for.split(',')[0]
-        return request.META.get('REMOTE_ADDR')
+        return get_client_ip(request)
+
+
+class ScanAndMarkView(APIView):
+    """
+    Mark attendance straight from the scanned QR payload in one round trip.
+
+    Replaces QRCodeScanView followed by MarkAttendanceView: the QR token is
+    verified once (from the per-process cache after the first student), and
+    the record is inserted, or the existing one read back, and queued for
+    SPOC forwarding by a single statement.
+    """
+    authentication_classes = [DebugJWTAuthentication, DebugTokenAuthentication]
+    permission_classes = [IsAuthenticated]
+    throttle_classes = [AttendanceRateThrottle]
+
+    def post(self, request, *args, **kwargs):
+        serializer = ScanAndMarkSerializer(data=request.data, context={'request': request})
+        serializer.is_valid(raise_exception=True)
+
+        student_external_id = getattr(request.user, 'student_external_id', None)
+        if not student_external_id:
+            return Response(
+                {
+                    "status": "error",
+                    "message": "Student external ID not found in user profile"
+                },
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        data = serializer.validated_data
+        payload = data['payload']
+        attendance, created = insert_and_enqueue(
+            token=data['token'],
+            external_session_id=data['session_id'],
+            student=request.user,
+            student_external_id=student_external_id,
+            method='QR',
+            user_agent=data['user_agent'],
+            ip_address=data['ip_address'],
+            course_id=data['course_id'],
+        )
+
+        if not created:
+            return Response({
+                'status': 'already_marked',
+                'message': 'Attendance already marked for this session',
+                'session_id': str(attendance.external_session_id),
+                'course_id': payload.get('course_id'),
+                'data': AttendanceRecordListSerializer(attendance).data
+            }, status=status.HTTP_200_OK)
+
+        record_marks(attendance.external_session_id, [attendance.status])
+        logger.info(
+            "Attendance recorded from scan - Session: %s, Student: %s",
+            attendance.external_session_id, student_external_id
+        )
+        return Response(
+            {
+                "status": "success",
+                "message": "Attendance recorded successfully",
+                "course_id": payload.get('course_id'),
+                "data": AttendanceRecordListSerializer(attendance).data
+            },
+            status=status.HTTP_201_CREATED
+        )
+
+
+class EventStreamRenderer(BaseRenderer):
+    """Lets clients negotiate text/event-stream; errors are sent as plain JSON."""
+    media_type = 'text/event-stream'
+    format = 'sse'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return b'' if data is None else json.dumps(data).encode()
+
+
+class SessionLiveCountsView(APIView):
+    """
+    Live present/late/absent/excused counts for one session.
+    Served from the shared-cache counters in attendance.counters, so polling
+    does not hit the database while the counters are warm. Staff only.
+    """
+    authentication_classes = [DebugJWTAuthentication, DebugTokenAuthentication]
+    permission_classes = [IsAuthenticated, IsAdminUser]
+
+    def get(self, request, session_id, *args, **kwargs):
+        counts = get_session_counts(session_id)
+        return Response({
+            'session_id': str(session_id),
+            'counts': counts,
+            'total': sum(counts.values()),
+            'timestamp': timezone.now().isoformat()
+        })
+
+
+class SessionLiveStreamView(APIView):
+    """
+    Server-sent event feed of a session's live counts.
+    Sends an event whenever the counts change, and a keep-alive comment
+    otherwise. Staff only.
+
+    An open feed holds a worker for its whole lifetime, so it is kept short:
+    it closes after ATTENDANCE_LIVE_STREAM_MAX_SECONDS and EventSource
+    clients reconnect after the advertised retry interval. Raise the limit
+    only when running under an async or gevent worker.
+    """
+    authentication_classes = [DebugJWTAuthentication, DebugTokenAuthentication]
+    permission_classes = [IsAuthenticated, IsAdminUser]
+    renderer_classes = [JSONRenderer, EventStreamRenderer]
+    keepalive_seconds = 15
+
+    def get(self, request, session_id, *args, **kwargs):
+        response = StreamingHttpResponse(
+            self.stream(session_id),
+            content_type='text/event-stream'
+        )
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+    def stream(self, session_id):
+        interval = getattr(settings, 'ATTENDANCE_LIVE_STREAM_INTERVAL_SECONDS', 1.0)
+        deadline = time.monotonic() + getattr(settings, 'ATTENDANCE_LIVE_STREAM_MAX_SECONDS', 30)
+        retry_ms = int(interval * 1000)
+        yield f'retry: {retry_ms}\n\n'
+
+        last_counts = None
+        last_sent = time.monotonic()
+        while time.monotonic() < deadline:
+            counts = get_session_counts(session_id)
+            if counts != last_counts:
+                payload = json.dumps({
+                    'session_id': str(session_id),
+                    'counts': counts,
+                    'total': sum(counts.values())
+                })
+                yield f'event: counts\ndata: {payload}\n\n'
+                last_counts = counts
+                last_sent = time.monotonic()
+            elif time.monotonic() - last_sent >= self.keepalive_seconds:
+                yield ': keep-alive\n\n'
+                last_sent = time.monotonic()
+            time.sleep(interval)
 
 
 class HealthCheckView(APIView):
     """
     Simple health check endpoint.
+    Also reports SPOC connection pool usage for this process and the state
+    of the shared SPOC circuit breaker.
     """
     authentication_classes = []
     permission_classes = []
@@ -421,52 +542,243 @@ class HealthCheckView(APIView):
         return Response({
             'status': 'ok',
             'timestamp': timezone.now().isoformat(),
-            'service': 'attendance'
+            'service': 'attendance',
+            'spoc_pool': get_spoc_client().pool_stats(),
+            'spoc_breaker': spoc_breaker.status()
         })
 
 
 class MyAttendanceListView(generics.ListAPIView):
-    """List the authenticated user's attendance records.
+    """List the authenticated user's attendance records, newest first.
+    Results are cursor-paginated (see AttendanceCursorPagination).
     Supports optional filters:
       - from: ISO date or datetime (inclusive)
-      - to: ISO date or datetime (inclusive)
+      - to: ISO date or datetime (inclusive; a date covers the whole day)
       - status: present|absent|late|excused
+    Records moved to the archive (see attendance.partitions) are included
+    when the range starts before the hot cutoff or has no start.
     """
     serializer_class = AttendanceRecordListSerializer
     authentication_classes = [DebugJWTAuthentication, DebugTokenAuthentication]
     permission_classes = [IsAuthenticated]
+    pagination_class = AttendanceCursorPagination
 
     def get_queryset(self):
         user = self.request.user
-        qs = AttendanceRecord.objects.filter(student=user)
+        filters = {}
 
         # Filters
         from_param = self.request.query_params.get('from')
         to_param = self.request.query_params.get('to')
         status_param = self.request.query_params.get('status')
 
-        def parse_dt(value):
-            try:
-                # Try parsing full ISO datetime first
-                return datetime.fromisoformat(value.replace('Z', '+00:00'))
-            except Exception:
-                try:
-                    # Fallback: parse date only
-                    return datetime.fromisoformat(value + 'T00:00:00')
-                except Exception:
-                    return None
-
+        # A bare date covers the whole day on either side of the range.
+        dt_from = None
         if from_param:
-            dt_from = parse_dt(from_param)
+            day_from = parse_date_param(from_param)
+            dt_from = day_start(day_from) if day_from else parse_datetime_param(from_param)
             if dt_from:
-                qs = qs.filter(marked_at__gte=dt_from)
+                filters['marked_at__gte'] = dt_from
 
         if to_param:
-            dt_to = parse_dt(to_param)
-            if dt_to:
-                qs = qs.filter(marked_at__lte=dt_to)
+            day_to = parse_date_param(to_param)
+            if day_to:
+                filters['marked_at__lt'] = day_start(day_to + timedelta(days=1))
+            else:
+                dt_to = parse_datetime_param(to_param)
+                if dt_to:
+                    filters['marked_at__lte'] = dt_to
 
         if status_param in {'present', 'absent', 'late', 'excused'}:
-            qs = qs.filter(status=status_param)
+            filters['status'] = status_param
+
+        fields = AttendanceRecordListSerializer.Meta.fields
+        qs = AttendanceRecord.objects.filter(student=user, **filters).only(*fields)
+        if not reaches_archive(dt_from):
+            return qs
+        return MergedRecords(qs, ArchivedAttendanceRecord.objects.filter(student=user, **filters).only(*fields))
+
+
+class ReportDateRangeMixin:
+    """
+    Parses the ?from=&to= date range of the reporting views.
+    Defaults to the last `default_days` days and rejects ranges wider than
+    ATTENDANCE_REPORT_MAX_DAYS.
+    """
+    default_days = 30
+
+    def get_date_range(self, request):
+        today = timezone.localdate()
+        day_from = day_to = None
+        if request.query_params.get('from'):
+            day_from = parse_date_param(request.query_params['from'])
+            if day_from is None:
+                raise ValidationError({'from': 'Expected an ISO date (YYYY-MM-DD).'})
+        if request.query_params.get('to'):
+            day_to = parse_date_param(request.query_params['to'])
+            if day_to is None:
+                raise ValidationError({'to': 'Expected an ISO date (YYYY-MM-DD).'})
+
+        day_to = day_to or today
+        day_from = day_from or day_to - timedelta(days=self.default_days - 1)
+        max_days = getattr(settings, 'ATTENDANCE_REPORT_MAX_DAYS', 366)
+        if day_from > day_to:
+            raise ValidationError({'from': 'Must not be after to.'})
+        if (day_to - day_from).days + 1 > max_days:
+            raise ValidationError({'from': f'Date range must not exceed {max_days} days.'})
+        return day_from, day_to
+
+
+def sum_counts(rows):
+    """Add up the status counts of rollup rows."""
+    totals = dict.fromkeys(['present', 'late', 'absent', 'excused', 'total'], 0)
+    for row in rows:
+        for key in totals:
+            totals[key] += row[key]
+    return totals
+
+
+class StudentDailyReportView(ReportDateRangeMixin, APIView):
+    """
+    Per-day attendance counts for one student (staff only).
+    Reads only the StudentDailyAttendance rollup, so its cost depends on the
+    number of days requested and not on the size of the raw attendance table.
+    """
+    authentication_classes = [DebugJWTAuthentication, DebugTokenAuthentication]
+    permission_classes = [IsAuthenticated, IsAdminUser]
+
+    def get(self, request, student_id, *args, **kwargs):
+        day_from, day_to = self.get_date_range(request)
+        rows = StudentDailyAttendanceSerializer(
+            StudentDailyAttendance.objects.filter(
+                student_id=student_id, date__range=(day_from, day_to)
+            ).order_by('date'),
+            many=True
+        ).data
+        return Response({
+            'student_id': student_id,
+            'from': day_from.isoformat(),
+            'to': day_to.isoformat(),
+            'totals': sum_counts(rows),
+            'days': rows
+        })
+
+
+class CourseSessionReportView(ReportDateRangeMixin, APIView):
+    """
+    Per-session attendance counts for one course (staff only).
+    Reads only the SessionAttendanceSummary rollup through its
+    (course_id, first_marked_at) index.
+    """
+    authentication_classes = [DebugJWTAuthentication, DebugTokenAuthentication]
+    permission_classes = [IsAuthenticated, IsAdminUser]
+    default_days = 90
+
+    def get(self, request, course_id, *args, **kwargs):
+        day_from, day_to = self.get_date_range(request)
+        rows = SessionAttendanceSummarySerializer(
+            SessionAttendanceSummary.objects.filter(
+                course_id=course_id,
+                first_marked_at__gte=day_start(day_from),
+                first_marked_at__lt=day_start(day_to + timedelta(days=1))
+            ).order_by('-first_marked_at'),
+            many=True
+        ).data
+        return Response({
+            'course_id': course_id,
+            'from': day_from.isoformat(),
+            'to': day_to.isoformat(),
+            'totals': sum_counts(rows),
+            'sessions': rows
+        })
+
+
+class AttendanceExportView(APIView):
+    """
+    Stream attendance records as CSV or JSON Lines (staff only).
+    Query parameters:
+      - output: csv (default) or jsonl
+      - from / to: ISO date or datetime (inclusive; a date covers the whole day)
+      - session: external session id
+      - synced: true|false
+    Archived records are included when the range starts before the hot
+    cutoff or has no start (see export_queryset).
+    """
+    authentication_classes = [DebugJWTAuthentication, DebugTokenAuthentication]
+    permission_classes = [IsAuthenticated, IsAdminUser]
+
+    def get(self, request, *args, **kwargs):
+        params = request.query_params
+        export_format = params.get('output', 'csv')
+        if export_format not in EXPORT_FORMATS:
+            raise ValidationError({'output': f"Must be one of: {', '.join(EXPORT_FORMATS)}."})
+
+        marked_from = marked_before = session_id = synced = None
+        if params.get('from'):
+            day_from = parse_date_param(params['from'])
+            marked_from = day_start(day_from) if day_from else parse_datetime_param(params['from'])
+            if marked_from is None:
+                raise ValidationError({'from': 'Expected an ISO date or datetime.'})
+        if params.get('to'):
+            day_to = parse_date_param(params['to'])
+            if day_to:
+                marked_before = day_start(day_to + timedelta(days=1))
+            else:
+                dt_to = parse_datetime_param(params['to'])
+                if dt_to is None:
+                    raise ValidationError({'to': 'Expected an ISO date or datetime.'})
+                marked_before = dt_to + timedelta(microseconds=1)
+        if params.get('session'):
+            try:
+                session_id = uuid.UUID(params['session'])
+            except ValueError:
+                raise ValidationError({'session': 'Must be a valid UUID.'})
+        if params.get('synced'):
+            if params['synced'] not in ('true', 'false'):
+                raise ValidationError({'synced': 'Must be true or false.'})
+            synced = params['synced'] == 'true'
+
+        queryset = export_queryset(
+            marked_from=marked_from,
+            marked_before=marked_before,
+            session_id=session_id,
+            synced=synced
+        )
+        logger.info(
+            "Attendance export (%s) started by %s - from: %s, to: %s, session: %s, synced: %s",
+            export_format, request.user.email, marked_from, marked_before, session_id, synced
+        )
+
+        response = StreamingHttpResponse(
+            iter_export(queryset, export_format),
+            content_type=CONTENT_TYPES[export_format]
+        )
+        filename = f"attendance-{timezone.now():%Y%m%d-%H%M%S}.{export_format}"
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+
+def parse_datetime_param(value):
+    """Parse an ISO datetime query parameter into an aware datetime, or return None."""
+    try:
+        # A literal '+' in an offset arrives as a space when not percent-encoded.
+        parsed = parse_datetime(value.replace(' ', '+'))
+    except ValueError:
+        return None
+    if parsed is None:
+        return None
+    return parsed if timezone.is_aware(parsed) else timezone.make_aware(parsed)
+
+
+def parse_date_param(value):
+    """Parse a bare ISO date query parameter, or return None."""
+    try:
+        return parse_date(value)
+    except ValueError:
+        return None
+
 
-        return qs.order_by('-marked_at')
+def day_start(day):
+    """Return midnight at the start of day in the current time zone."""
+    return timezone.make_aware(datetime.combine(day, datetime.min.time()))
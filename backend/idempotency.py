@@ -0,0 +1,140 @@
+"""
+Idempotency-Key support for mutating API endpoints.
+
+A client may send an `Idempotency-Key` header with a POST/PUT/PATCH/DELETE
+to one of the views listed in IDEMPOTENCY['URL_NAMES']. The first response
+for a given (caller, view, key) is stored in the cache for
+IDEMPOTENCY['TTL_SECONDS'], and any repeat of that request gets the stored
+response back without the view, its authentication or its serializers
+running again.
+* A repeat that arrives while the first request is still running gets
+  409 Conflict with a Retry-After header.
+* A repeat with a different body gets 422.
+* 5xx and 429 responses are not stored, so the client can retry them.
+
+The middleware runs before DRF authentication. The caller is therefore
+identified by a hash of the Authorization header, or by the session user
+for cookie-authenticated requests. Requests with neither are passed through
+untouched.
+"""
+import hashlib
+import logging
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse, JsonResponse
+
+logger = logging.getLogger(__name__)
+
+HEADER = 'Idempotency-Key'
+MUTATING_METHODS = frozenset({'POST', 'PUT', 'PATCH', 'DELETE'})
+REPLAYED_HEADERS = ('Content-Type', 'Location')
+IN_FLIGHT = 'in_flight'
+DONE = 'done'
+
+
+def get_config():
+    config = {
+        'URL_NAMES': [],
+        'TTL_SECONDS': 24 * 60 * 60,
+        'LOCK_SECONDS': 30,
+        'MAX_KEY_LENGTH': 255,
+    }
+    config.update(getattr(settings, 'IDEMPOTENCY', {}))
+    return config
+
+
+class IdempotencyMiddleware:
+    """Replays the stored response to repeated requests carrying the same Idempotency-Key."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+
+        pending = getattr(request, '_idempotency', None)
+        if pending is not None:
+            cache_key, fingerprint = pending
+            self.store(cache_key, fingerprint, response)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if request.method not in MUTATING_METHODS:
+            return None
+        key = request.headers.get(HEADER)
+        if not key:
+            return None
+        config = get_config()
+        match = request.resolver_match
+        if match is None or match.view_name not in config['URL_NAMES']:
+            return None
+
+        if len(key) > config['MAX_KEY_LENGTH']:
+            return JsonResponse(
+                {"status": "error", "message": f"{HEADER} must be at most {config['MAX_KEY_LENGTH']} characters"},
+                status=400
+            )
+        caller = self.get_caller(request)
+        if caller is None:
+            return None
+
+        cache_key = 'idempotency:' + hashlib.sha256(
+            f'{caller}\x00{match.view_name}\x00{key}'.encode()
+        ).hexdigest()
+        fingerprint = hashlib.sha256(request.body).hexdigest()
+
+        if cache.add(cache_key, {'state': IN_FLIGHT, 'fingerprint': fingerprint}, timeout=config['LOCK_SECONDS']):
+            request._idempotency = (cache_key, fingerprint)
+            return None
+        return self.replay(cache.get(cache_key), fingerprint)
+
+    @staticmethod
+    def get_caller(request):
+        """Return a stable identifier for the credentials of the request, or None."""
+        authorization = request.META.get('HTTP_AUTHORIZATION')
+        if authorization:
+            return 'auth:' + hashlib.sha256(authorization.encode()).hexdigest()
+        user = getattr(request, 'user', None)
+        if user is not None and user.is_authenticated:
+            return f'user:{user.pk}'
+        return None
+
+    @staticmethod
+    def replay(entry, fingerprint):
+        if entry is None or entry.get('state') == IN_FLIGHT:
+            # Still running, or the lock just lapsed: let the client retry shortly.
+            response = JsonResponse(
+                {"status": "error", "message": "A request with this Idempotency-Key is already being processed"},
+                status=409
+            )
+            response['Retry-After'] = '1'
+            return response
+        if entry['fingerprint'] != fingerprint:
+            return JsonResponse(
+                {"status": "error", "message": f"{HEADER} was already used with a different request body"},
+                status=422
+            )
+
+        response = HttpResponse(entry['content'], status=entry['status'])
+        for name, value in entry['headers'].items():
+            response[name] = value
+        response['Idempotent-Replayed'] = 'true'
+        return response
+
+    @staticmethod
+    def store(cache_key, fingerprint, response):
+        if response.streaming or response.status_code >= 500 or response.status_code == 429:
+            cache.delete(cache_key)
+            return
+        entry = {
+            'state': DONE,
+            'fingerprint': fingerprint,
+            'status': response.status_code,
+            'content': response.content,
+            'headers': {name: response[name] for name in REPLAYED_HEADERS if response.has_header(name)},
+        }
+        try:
+            cache.set(cache_key, entry, timeout=get_config()['TTL_SECONDS'])
+        except Exception as e:
+            logger.warning("Failed to store idempotent response: %s", e)
+            cache.delete(cache_key)
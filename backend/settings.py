@@ -44,6 +44,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'rest_framework',
     'corsheaders',         # Enable CORS
     'rest_framework.authtoken',
@@ -57,7 +58,8 @@ INSTALLED_APPS = [
     'studyplan',
     'attendance',
     'mcp_integration',
-    'job_matching'
+    'job_matching',
+    'perfdata',  # seed_perf_data: synthetic dataset for benchmarks and load tests
 ]
 MCP_SERVER_URL = 'http://localhost:3333'
 
@@ -70,6 +72,7 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'backend.idempotency.IdempotencyMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 
@@ -98,6 +101,8 @@ else:
     ]
 
 CORS_ALLOW_CREDENTIALS = True
+from corsheaders.defaults import default_headers
+CORS_ALLOW_HEADERS = (*default_headers, 'idempotency-key')
 CSRF_TRUSTED_ORIGINS = [
     'http://localhost:3000',
     'http://127.0.0.1:3000',
@@ -200,6 +205,23 @@ SIMPLE_JWT = {
 QR_CODE_EXPIRY_MINUTES = 5  # 5 minutes expiry for QR codes
 JWT_SECRET_KEY = SECRET_KEY  # Reuse Django's SECRET_KEY for JWT signing
 JWT_ALGORITHM = 'HS256'
+QR_TOKEN_CACHE_MAXSIZE = 1024  # Verified QR tokens kept per process (see attendance.jwt_utils)
+
+# Live per-session attendance counters (see attendance.counters)
+ATTENDANCE_COUNTER_TTL_SECONDS = int(os.getenv('ATTENDANCE_COUNTER_TTL_SECONDS', '300'))
+ATTENDANCE_LIVE_STREAM_INTERVAL_SECONDS = 1.0  # How often the SSE feed re-reads the counters
+ATTENDANCE_LIVE_STREAM_MAX_SECONDS = 30  # Each feed holds a sync worker; it closes after this and EventSource reconnects
+
+# Attendance reporting rollups (see attendance.rollups)
+ATTENDANCE_ROLLUP_BATCH_SIZE = int(os.getenv('ATTENDANCE_ROLLUP_BATCH_SIZE', '50000'))
+ATTENDANCE_ROLLUP_LAG_SECONDS = int(os.getenv('ATTENDANCE_ROLLUP_LAG_SECONDS', '60'))
+ATTENDANCE_REPORT_MAX_DAYS = 366  # Widest date range a report endpoint accepts
+ATTENDANCE_EXPORT_CHUNK_SIZE = 2000  # Rows per server-side cursor fetch (see attendance.exporting)
+
+# Hot/archive storage of attendance records (see attendance.partitions)
+ATTENDANCE_HOT_MONTHS = int(os.getenv('ATTENDANCE_HOT_MONTHS', '6'))
+ATTENDANCE_ARCHIVE_BATCH_SIZE = int(os.getenv('ATTENDANCE_ARCHIVE_BATCH_SIZE', '5000'))
+ATTENDANCE_ARCHIVE_AFTER_MONTHS = int(os.getenv('ATTENDANCE_ARCHIVE_AFTER_MONTHS', '24'))
 
 # SPOC Dashboard Settings
 EDUCATE_PORTAL_URL = 'https://educate-portal.example.com'  
@@ -228,6 +250,55 @@ REST_FRAMEWORK = {
     'DEFAULT_METADATA_CLASS': 'rest_framework.metadata.SimpleMetadata',
     'DEFAULT_VERSIONING_CLASS': 'rest_framework.versioning.NamespaceVersioning',
 }
+# Cache shared by all workers when REDIS_URL is set (throttling, outbox scheduling,
+# runtime switches); falls back to a per-process cache for local development.
+if os.getenv('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.getenv('REDIS_URL'),
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+# Rendered course trees served with ETags (see courses.snapshots)
+COURSE_SNAPSHOT_TTL_SECONDS = int(os.getenv('COURSE_SNAPSHOT_TTL_SECONDS', str(24 * 60 * 60)))
+COURSE_SNAPSHOT_BUILD_WAIT_SECONDS = 5  # How long concurrent readers wait for one request's build
+
+# Compiled quiz answer keys kept per process (see courses.grading)
+QUIZ_ANSWER_KEY_CACHE_MAXSIZE = 1024
+
+# Course full-text search (see courses.search)
+COURSE_SEARCH_CONFIG = 'english'  # PostgreSQL text search configuration
+COURSE_SEARCH_MAX_RESULTS = 50
+
+# Idempotency-Key replay for retried writes (see backend.idempotency)
+IDEMPOTENCY = {
+    'URL_NAMES': [
+        'attendance:mark-attendance',
+        'attendance:mark-attendance-bulk',
+        'attendance:scan-and-mark',
+        'progress:quiz-attempts',
+        'chatbot',
+    ],
+    'TTL_SECONDS': int(os.getenv('IDEMPOTENCY_TTL_SECONDS', str(24 * 60 * 60))),
+    'LOCK_SECONDS': 30,  # How long a request holds its key before a duplicate may run it again
+}
+
+# Sampled auth diagnostics for the attendance endpoints (see attendance.diagnostics).
+# Switch on at runtime with: python manage.py auth_diagnostics enable --rate attendance:mark-attendance=0.05
+AUTH_DIAGNOSTICS = {
+    'ENABLED': os.getenv('AUTH_DIAGNOSTICS_ENABLED', 'false').lower() == 'true',
+    'DEFAULT_SAMPLE_RATE': float(os.getenv('AUTH_DIAGNOSTICS_SAMPLE_RATE', '0.01')),
+    'SAMPLE_RATES': {},
+    'REFRESH_SECONDS': 10,
+}
+
 # Celery configuration
 CELERY_BROKER_URL = os.getenv('CELERY_BROKER_URL', '')
 CELERY_RESULT_BACKEND = os.getenv('CELERY_RESULT_BACKEND', '')
@@ -238,6 +309,61 @@ CELERY_TIMEZONE = 'UTC'
 
 # SPOC service base URL (used by attendance.tasks)
 SPOC_BASE_URL = os.getenv('SPOC_BASE_URL', 'https://spoc-backend.onrender.com')
+
+# SPOC forwarding outbox (see attendance.outbox)
+SPOC_OUTBOX_FLUSH_INTERVAL_MS = int(os.getenv('SPOC_OUTBOX_FLUSH_INTERVAL_MS', '500'))
+SPOC_OUTBOX_BATCH_SIZE = int(os.getenv('SPOC_OUTBOX_BATCH_SIZE', '100'))
+SPOC_DISPATCH_CONCURRENCY = int(os.getenv('SPOC_DISPATCH_CONCURRENCY', '8'))
+# Claimed marks not written back within this long (e.g. the worker died) are retried
+SPOC_OUTBOX_CLAIM_LEASE_SECONDS = int(os.getenv('SPOC_OUTBOX_CLAIM_LEASE_SECONDS', '300'))
+
+# Retries of failed SPOC forwards (see attendance.outbox.requeue_due_syncs).
+# Retries authenticate with SPOC_API_KEY since the original QR token has expired by then.
+SPOC_API_KEY = os.getenv('SPOC_API_KEY', '')
+SPOC_SYNC_MAX_RETRIES = int(os.getenv('SPOC_SYNC_MAX_RETRIES', '8'))
+SPOC_SYNC_RETRY_BASE_SECONDS = int(os.getenv('SPOC_SYNC_RETRY_BASE_SECONDS', '60'))
+SPOC_SYNC_RETRY_MAX_SECONDS = int(os.getenv('SPOC_SYNC_RETRY_MAX_SECONDS', '3600'))
+SPOC_RETRY_SWEEP_CHUNK_SIZE = int(os.getenv('SPOC_RETRY_SWEEP_CHUNK_SIZE', '500'))
+
+# Backpressure on SPOC forwarding (see attendance.backpressure)
+SPOC_BREAKER_FAILURE_THRESHOLD = int(os.getenv('SPOC_BREAKER_FAILURE_THRESHOLD', '20'))
+SPOC_BREAKER_WINDOW_SECONDS = int(os.getenv('SPOC_BREAKER_WINDOW_SECONDS', '30'))
+SPOC_BREAKER_OPEN_SECONDS = int(os.getenv('SPOC_BREAKER_OPEN_SECONDS', '60'))
+SPOC_DISPATCH_RATE_PER_SECOND = int(os.getenv('SPOC_DISPATCH_RATE_PER_SECOND', '50'))  # 0 = unlimited
+SPOC_RECOVERY_RATE_PER_SECOND = int(os.getenv('SPOC_RECOVERY_RATE_PER_SECOND', '5'))
+SPOC_RECOVERY_RAMP_SECONDS = int(os.getenv('SPOC_RECOVERY_RAMP_SECONDS', '120'))
+
+# Shared SPOC HTTP client (see attendance.spoc_client.get_spoc_client)
+# One pool per process, sized so every dispatch thread can hold a connection.
+SPOC_POOL_MAXSIZE = int(os.getenv('SPOC_POOL_MAXSIZE', str(SPOC_DISPATCH_CONCURRENCY)))
+SPOC_CONNECT_TIMEOUT_SECONDS = float(os.getenv('SPOC_CONNECT_TIMEOUT_SECONDS', '3'))
+SPOC_FORWARD_TIMEOUT_SECONDS = float(os.getenv('SPOC_FORWARD_TIMEOUT_SECONDS', '10'))
+SPOC_VERIFY_TIMEOUT_SECONDS = float(os.getenv('SPOC_VERIFY_TIMEOUT_SECONDS', '5'))
+SPOC_MARK_TIMEOUT_SECONDS = float(os.getenv('SPOC_MARK_TIMEOUT_SECONDS', '3'))
+# Connection errors and these statuses are retried, POSTs included (see create_session)
+SPOC_RETRY_TOTAL = int(os.getenv('SPOC_RETRY_TOTAL', '3'))
+SPOC_RETRY_BACKOFF_FACTOR = float(os.getenv('SPOC_RETRY_BACKOFF_FACTOR', '0.5'))
+SPOC_RETRY_STATUS_FORCELIST = [500, 502, 503, 504]
+
+CELERY_BEAT_SCHEDULE = {
+    # Safety net for marks whose drain could not be scheduled when they were queued
+    'drain-spoc-outbox': {
+        'task': 'attendance.tasks.drain_spoc_outbox',
+        'schedule': 30.0,
+    },
+    'retry-failed-syncs': {
+        'task': 'attendance.tasks.retry_failed_syncs',
+        'schedule': 60.0,
+    },
+    'rollup-attendance': {
+        'task': 'attendance.tasks.rollup_attendance',
+        'schedule': 300.0,
+    },
+    'move-cold-attendance': {
+        'task': 'attendance.tasks.move_cold_attendance',
+        'schedule': 24 * 60 * 60.0,
+    },
+}
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
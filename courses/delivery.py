@@ -0,0 +1,97 @@
+"""
+Answer-free quiz delivery.
+
+GET /api/courses/quizzes/<id>/delivery/ returns a quiz the way learners
+take it (see QuizDeliverySerializer). The payload is a course snapshot (see
+courses.snapshots): rendered once per course version, single-flight, so a
+class opening the same quiz at exam start costs one build and every other
+request is a few cache reads.
+
+    ?shuffle=true[&attempt=<id>]
+        Questions, and the options of each question, are shuffled in memory
+        from the cached rendering. The order is seeded by the quiz, the user
+        and the attempt id, so reloading during an attempt keeps the order
+        while another attempt or another learner gets a different one.
+"""
+import hashlib
+import json
+import random
+from django.db.models import Prefetch
+from django.core.cache import cache
+from django.db import transaction
+from django.http import Http404
+from .models import Question, QuestionOption, Quiz
+from .prefetch import get_ordering
+from .serializers import QuizDeliverySerializer
+from .snapshots import get_snapshot_ttl
+
+SHUFFLE_PARAM = 'shuffle'
+ATTEMPT_PARAM = 'attempt'
+
+
+def get_quiz_course_key(quiz_id):
+    return f'courses:quiz_course:{quiz_id}'
+
+
+def get_quiz_course_id(quiz_id):
+    """
+    Return the id of the course a quiz belongs to, cached.
+
+    The mapping is dropped by forget_quiz_courses_on_commit() when a quiz, or
+    the module it is in, moves or is deleted (see courses.signals).
+
+    Raises:
+        Http404: If there is no such quiz
+    """
+    key = get_quiz_course_key(quiz_id)
+    course_id = cache.get(key)
+    if course_id is None:
+        course_id = Quiz.objects.filter(pk=quiz_id).values_list('module__course_id', flat=True).first()
+        if course_id is None:
+            raise Http404
+        cache.set(key, course_id, timeout=get_snapshot_ttl())
+    return course_id
+
+
+def forget_quiz_courses_on_commit(quiz_ids):
+    """Drop the cached course ids of quizzes once the current transaction commits."""
+    keys = [get_quiz_course_key(quiz_id) for quiz_id in quiz_ids]
+    if keys:
+        transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def build_delivery(quiz_id):
+    """Serialize a quiz for delivery, in three queries."""
+    quiz = Quiz.objects.prefetch_related(Prefetch(
+        'questions',
+        queryset=Question.objects.filter(is_active=True).order_by(*get_ordering(Question)).prefetch_related(
+            Prefetch('options', queryset=QuestionOption.objects.order_by(*get_ordering(QuestionOption)))
+        )
+    )).filter(pk=quiz_id).first()
+    if quiz is None:
+        raise Http404
+    return QuizDeliverySerializer(quiz).data
+
+
+def get_shuffle_seed(quiz_id, user_id, attempt=''):
+    """Seed of the question and option order of one attempt, stable across processes."""
+    return int.from_bytes(hashlib.sha256(f'{quiz_id}:{user_id}:{attempt}'.encode()).digest()[:8], 'big')
+
+
+def shuffle_delivery(content, seed):
+    """
+    Shuffle the questions and options of a rendered delivery payload.
+
+    Args:
+        content (bytes): Rendering of QuizDeliverySerializer
+        seed (int): From get_shuffle_seed()
+
+    Returns:
+        bytes: The shuffled rendering
+    """
+    data = json.loads(content)
+    rng = random.Random(seed)
+    rng.shuffle(data['questions'])
+    for question in data['questions']:
+        rng.shuffle(question['options'])
+    return json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode()
@@ -0,0 +1,149 @@
+"""
+Sparse fieldsets and depth control for the course API.
+
+    ?fields=id,title,modules.title,modules.sections.id
+        Only the listed fields are rendered. A dotted name selects fields of a
+        nested object; naming a nested object without any of its fields keeps
+        all of them.
+    ?depth=<n>
+        Nested objects more than n levels down are left out. depth=0 renders
+        no nested objects at all.
+
+The pruned serializer also decides what is loaded (see
+courses.prefetch.plan_queryset): only the columns behind the remaining
+fields are selected, and nested levels that are not rendered are not
+prefetched. Unknown field names are rejected with 400.
+"""
+from rest_framework.exceptions import ValidationError
+from .prefetch import nested_serializer, plan_queryset
+
+FIELDS_PARAM = 'fields'
+DEPTH_PARAM = 'depth'
+
+
+def parse_fields(value):
+    """
+    Parse a ?fields= value into a tree of selected names.
+
+    Args:
+        value (str): Comma separated, possibly dotted, field names
+
+    Returns:
+        dict: {name: {nested name: {...}}}; an empty dict keeps every nested field.
+        None when nothing was selected.
+    """
+    selection = {}
+    for path in value.split(','):
+        names = [name.strip() for name in path.split('.')]
+        if not all(names):
+            continue
+        level = selection
+        for name in names:
+            level = level.setdefault(name, {})
+    return selection or None
+
+
+def parse_depth(value):
+    """Parse a ?depth= value; None means unlimited."""
+    if value in (None, ''):
+        return None
+    try:
+        depth = int(value)
+    except ValueError:
+        depth = -1
+    if depth < 0:
+        raise ValidationError({DEPTH_PARAM: 'Must be a non-negative integer.'})
+    return depth
+
+
+def prune_serializer(serializer, selection=None, depth=None, path=''):
+    """
+    Remove the fields of serializer that are not selected or too deep.
+
+    Args:
+        serializer (Serializer): Serializer for a single row; modified in place
+        selection (dict): Tree from parse_fields(), None for every field
+        depth (int): Nested levels to keep, None for all
+
+    Returns:
+        list: Selected names that do not exist, as dotted paths
+    """
+    fields = serializer.fields
+    unknown = [f'{path}{name}' for name in (selection or {}) if name not in fields]
+
+    for name in list(fields):
+        nested = nested_serializer(fields[name])
+        if selection and name not in selection:
+            fields.pop(name)
+        elif nested is not None:
+            if depth == 0:
+                fields.pop(name)
+                continue
+            unknown += prune_serializer(
+                nested, (selection or {}).get(name) or None,
+                None if depth is None else depth - 1, f'{path}{name}.'
+            )
+        elif selection and selection[name]:
+            unknown.append(f'{path}{name}.{next(iter(selection[name]))}')
+    return unknown
+
+
+class SparseFieldsetMixin:
+    """
+    ViewSet mixin applying ?fields= and ?depth= to the actions in
+    sparse_actions.
+
+    The serializer returned by get_serializer() is pruned, and get_queryset()
+    loads only what that serializer renders. Other actions, writes included,
+    always use the full serializer.
+    """
+    sparse_actions = ('list', 'retrieve')
+
+    def get_field_selection(self):
+        """
+        Returns:
+            tuple: (selection tree or None, depth or None) for this request
+        """
+        if not hasattr(self, '_field_selection'):
+            if self.request is None or self.action not in self.sparse_actions:
+                self._field_selection = (None, None)
+            else:
+                params = self.request.query_params
+                self._field_selection = (
+                    parse_fields(params.get(FIELDS_PARAM, '')),
+                    parse_depth(params.get(DEPTH_PARAM))
+                )
+        return self._field_selection
+
+    def get_fieldset_key(self):
+        """Canonical form of the selection, for cache keys."""
+        selection, depth = self.get_field_selection()
+        if selection is None and depth is None:
+            return ''
+
+        def flatten(tree, prefix=''):
+            for name in sorted(tree):
+                yield f'{prefix}{name}'
+                yield from flatten(tree[name], f'{prefix}{name}.')
+
+        return f"{','.join(flatten(selection or {}))};{'' if depth is None else depth}"
+
+    def sparse(self, serializer):
+        """Prune serializer (or the child of a many=True serializer) for this request."""
+        selection, depth = self.get_field_selection()
+        if selection is None and depth is None:
+            return serializer
+        unknown = prune_serializer(nested_serializer(serializer), selection, depth)
+        if unknown:
+            raise ValidationError({FIELDS_PARAM: f"Unknown field(s): {', '.join(unknown)}"})
+        return serializer
+
+    def get_serializer(self, *args, **kwargs):
+        return self.sparse(super().get_serializer(*args, **kwargs))
+
+    def get_planning_serializer(self):
+        """Serializer for a single row of get_queryset(), pruned for this request."""
+        return self.sparse(self.get_serializer_class()(context=self.get_serializer_context()))
+
+    def get_queryset(self):
+        return plan_queryset(super().get_queryset(), self.get_planning_serializer())
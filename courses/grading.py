@@ -0,0 +1,313 @@
+"""
+Server-side quiz grading.
+
+A quiz's answer key is compiled once from the database into an immutable
+AnswerKey: the valid and correct option ids of every active question, its
+points, and the accepted answers of short-answer questions. Keys are kept in
+a bounded in-process LRU. A key is built under the course snapshot version
+(see courses.snapshots), which every save or delete of a quiz, question or
+option bumps, so a cached key is used only while that version is current.
+A warm lookup is one shared cache read and no ORM work.
+
+grade() checks a submission against a key in one pass without touching the
+database, and save_graded_attempt() stores the attempt with its responses
+and selected options in three INSERTs.
+"""
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import NamedTuple
+from django.conf import settings
+from django.db import transaction
+from rest_framework.exceptions import ValidationError
+from .models import Question, QuestionOption, Quiz, UserQuizAttempt, UserQuizResponse
+from .snapshots import get_version
+
+# Questions whose options are chosen; the rest are answered with text
+CHOICE_TYPES = ('single_choice', 'multiple_choice', 'true_false')
+SINGLE_ANSWER_TYPES = ('single_choice', 'true_false')
+
+
+def normalize_answer(text):
+    """Case- and whitespace-insensitive form of a short answer."""
+    return ' '.join(text.split()).casefold()
+
+
+@dataclass(frozen=True)
+class QuestionKey:
+    id: int
+    question_type: str
+    points: int
+    options: frozenset       # Option ids that belong to the question
+    correct: frozenset       # Option ids that must be selected, exactly
+    accepted: frozenset      # Normalized accepted answers of a short-answer question
+    feedback: MappingProxyType  # Option id -> feedback, for options that have any
+
+    def __post_init__(self):
+        # Looked up for every answer, so computed once here
+        object.__setattr__(self, 'is_choice', self.question_type in CHOICE_TYPES)
+        # Essays, and short answers without accepted answers, cannot be graded automatically
+        object.__setattr__(self, 'needs_review', not self.is_choice and not self.accepted)
+
+
+@dataclass(frozen=True)
+class AnswerKey:
+    quiz_id: int
+    course_id: int
+    version: int
+    passing_score: int
+    show_correct_answers: bool
+    questions: tuple         # QuestionKey in question order
+    total_points: int
+
+    def __post_init__(self):
+        object.__setattr__(self, 'by_id', MappingProxyType({question.id: question for question in self.questions}))
+
+
+class GradedResponse(NamedTuple):
+    question_id: int
+    selected_options: tuple
+    text_response: str
+    is_correct: bool
+    points_earned: float
+    feedback: str
+    needs_review: bool
+
+
+@dataclass(frozen=True)
+class GradedAttempt:
+    key: AnswerKey
+    responses: tuple         # GradedResponse for every active question, in question order
+    points: float
+
+    @property
+    def score(self):
+        """Score in percent."""
+        return round(self.points / self.key.total_points * 100, 2) if self.key.total_points else 0.0
+
+    @property
+    def passed(self):
+        return self.score >= self.key.passing_score
+
+    def results(self):
+        """Per-question results for the client; correct options only if the quiz shows them."""
+        results = []
+        for response in self.responses:
+            result = {
+                'question': response.question_id,
+                'is_correct': response.is_correct,
+                'points_earned': response.points_earned,
+                'feedback': response.feedback,
+                'needs_review': response.needs_review,
+            }
+            if self.key.show_correct_answers:
+                result['correct_options'] = sorted(self.key.by_id[response.question_id].correct)
+            results.append(result)
+        return results
+
+
+def compile_answer_key(quiz_id):
+    """
+    Build the answer key of a quiz from the database, in three queries.
+
+    Args:
+        quiz_id (int): Quiz to compile
+
+    Returns:
+        AnswerKey: Key stamped with the course snapshot version it was built under
+
+    Raises:
+        Quiz.DoesNotExist: If there is no such quiz
+    """
+    quiz = Quiz.objects.values('passing_score', 'show_correct_answers', 'module__course_id').get(pk=quiz_id)
+    course_id = quiz['module__course_id']
+    # Read the version before the rows: an edit committed in between bumps it,
+    # so the key is at worst stale under an already outdated version.
+    version = get_version(course_id)
+
+    options = {}
+    for question_id, option_id, is_correct, option_text, feedback in QuestionOption.objects.filter(
+        question__quiz_id=quiz_id, question__is_active=True
+    ).values_list('question_id', 'pk', 'is_correct', 'option_text', 'feedback'):
+        options.setdefault(question_id, []).append((option_id, is_correct, option_text, feedback))
+
+    questions = []
+    for question_id, question_type, points in Question.objects.filter(
+        quiz_id=quiz_id, is_active=True
+    ).order_by('order_number', 'pk').values_list('pk', 'question_type', 'points'):
+        rows = options.get(question_id, ())
+        correct = [option_id for option_id, is_correct, _, _ in rows if is_correct]
+        choice = question_type in CHOICE_TYPES
+        questions.append(QuestionKey(
+            id=question_id,
+            question_type=question_type,
+            points=points,
+            options=frozenset(option_id for option_id, _, _, _ in rows) if choice else frozenset(),
+            correct=frozenset(correct) if choice else frozenset(),
+            # A short-answer question lists its accepted answers as correct options
+            accepted=frozenset(
+                normalize_answer(text) for _, is_correct, text, _ in rows if is_correct
+            ) if question_type == 'short_answer' else frozenset(),
+            feedback=MappingProxyType({option_id: text for option_id, _, _, text in rows if text}),
+        ))
+
+    return AnswerKey(
+        quiz_id=quiz_id,
+        course_id=course_id,
+        version=version,
+        passing_score=quiz['passing_score'],
+        show_correct_answers=quiz['show_correct_answers'],
+        questions=tuple(questions),
+        total_points=sum(question.points for question in questions),
+    )
+
+
+class AnswerKeyCache:
+    """Bounded in-process LRU of compiled answer keys, by quiz id."""
+
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, quiz_id):
+        """Return the cached key of a quiz, or None; not checked against the current version."""
+        with self._lock:
+            key = self._entries.get(quiz_id)
+            if key is not None:
+                self._entries.move_to_end(quiz_id)
+            return key
+
+    def set(self, key):
+        with self._lock:
+            self._entries[key.quiz_id] = key
+            self._entries.move_to_end(key.quiz_id)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+answer_keys = AnswerKeyCache(
+    maxsize=getattr(settings, 'QUIZ_ANSWER_KEY_CACHE_MAXSIZE', 1024)
+)
+
+
+def get_answer_key(quiz_id):
+    """
+    Return the current answer key of a quiz, compiling it on a miss or after an edit.
+
+    Raises:
+        Quiz.DoesNotExist: If there is no such quiz
+    """
+    key = answer_keys.get(quiz_id)
+    if key is not None and key.version == get_version(key.course_id):
+        return key
+    key = compile_answer_key(quiz_id)
+    answer_keys.set(key)
+    return key
+
+
+def grade(key, submitted):
+    """
+    Grade a submission against an answer key.
+
+    Choice questions score their points only if exactly the correct options
+    are selected; short answers if the text matches an accepted answer.
+    Questions that need review, and unanswered questions, score nothing.
+
+    Args:
+        key (AnswerKey): Key of the quiz
+        submitted (list): [{'question': id, 'selected_options': [ids], 'text_response': str}],
+            at most one per question; either answer part may be left out
+
+    Returns:
+        GradedAttempt: With a response for every question of the key
+
+    Raises:
+        ValidationError: If a question or option does not belong to the quiz, or a
+            single-answer question has several options selected
+    """
+    answers = {}
+    errors = []
+    for answer in submitted:
+        question = key.by_id.get(answer['question'])
+        if question is None:
+            errors.append(f"Question {answer['question']} is not part of this quiz.")
+            continue
+        if question.id in answers:
+            errors.append(f'Question {question.id} is answered more than once.')
+            continue
+        selected = frozenset(answer.get('selected_options') or ())
+        if not selected <= question.options:
+            errors.append(f'Question {question.id} has no option(s) {sorted(selected - question.options)}.')
+        elif len(selected) > 1 and question.question_type in SINGLE_ANSWER_TYPES:
+            errors.append(f'Question {question.id} takes a single option.')
+        answers[question.id] = (selected, answer.get('text_response') or '')
+    if errors:
+        raise ValidationError({'responses': errors})
+
+    responses = []
+    points = 0
+    unanswered = (frozenset(), '')
+    for question in key.questions:
+        selected, text = answers.get(question.id, unanswered)
+        if question.is_choice:
+            is_correct = selected == question.correct and bool(selected)
+        else:
+            is_correct = normalize_answer(text) in question.accepted
+        earned = question.points if is_correct else 0
+        points += earned
+        selected = tuple(sorted(selected))
+        feedback = question.feedback
+        responses.append(GradedResponse(
+            question.id,
+            selected,
+            text,
+            is_correct,
+            earned,
+            '\n'.join(feedback[option_id] for option_id in selected if option_id in feedback) if feedback else '',
+            question.needs_review,
+        ))
+    return GradedAttempt(key=key, responses=tuple(responses), points=points)
+
+
+def save_graded_attempt(user, graded, started_at, time_spent, ip_address=None, user_agent=''):
+    """
+    Store a graded attempt with its responses and selected options.
+
+    Returns:
+        UserQuizAttempt: The stored attempt
+    """
+    Selection = UserQuizResponse.selected_options.through
+    with transaction.atomic():
+        attempt = UserQuizAttempt.objects.create(
+            user=user,
+            quiz_id=graded.key.quiz_id,
+            score=graded.score,
+            passed=graded.passed,
+            started_at=started_at,
+            time_spent=time_spent,
+            ip_address=ip_address,
+            user_agent=user_agent,
+        )
+        responses = UserQuizResponse.objects.bulk_create([
+            UserQuizResponse(
+                attempt=attempt,
+                question_id=response.question_id,
+                text_response=response.text_response,
+                is_correct=response.is_correct,
+                points_earned=response.points_earned,
+                feedback=response.feedback,
+            )
+            for response in graded.responses
+        ])
+        Selection.objects.bulk_create([
+            Selection(userquizresponse_id=row.pk, questionoption_id=option_id)
+            for row, response in zip(responses, graded.responses)
+            for option_id in response.selected_options
+        ])
+    return attempt
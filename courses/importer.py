@@ -0,0 +1,370 @@
+"""
+Bulk import of course bundles.
+
+A bundle is a stream of course objects in JSON (a top-level array, read
+element by element), JSON Lines (one course per line) or YAML (one course or
+a list of courses per document). A top-level {"courses": [...]} object is
+also accepted, but is read whole. Each course nests its tree:
+
+    {"external_id": "py101", "title": "...", "level": "beginner", "estimated_duration": 60,
+     "modules": [{"title": "...", "sections": [{...}],
+                  "quiz": {"title": "...", "questions": [{"question_text": "...", "options": [{...}]}]}}]}
+
+Keys are model field names. Files, timestamps and the instructor are not
+imported. order_number defaults to the position in the list and must be
+unique among siblings.
+
+The whole bundle is validated before anything is written. Then each level is
+written with bulk_create in one transaction, so six levels cost a handful
+of INSERTs per batch rather than one per row.
+
+Rows are identified by external_id. Children without one get an id derived
+from their parent's ("py101.m1", "py101.m1.s2", "py101.m1.quiz",
+"py101.m1.quiz.q1", "py101.m1.quiz.q1.o1"). With upsert, courses must carry
+an external_id. Existing rows are then updated in place, and rows under an
+imported course that are missing from the bundle are deleted, so a bundle
+always replaces the course tree it describes. Fields left out of the bundle
+are reset to their defaults.
+
+bulk_create bypasses model signals, so the imported courses' snapshots are
+invalidated and their search vectors rebuilt here.
+"""
+import json
+import time
+from collections import Counter
+import yaml
+from django.core.exceptions import ValidationError
+from django.db import models, transaction
+from django.db.models import F, Max
+from .models import Course, Module, Question, QuestionOption, Quiz, Section
+from .search import update_search_vectors
+from .snapshots import bump_version_on_commit
+
+# The C loader is much faster when libyaml is available
+YamlLoader = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+
+FORMATS = ('json', 'jsonl', 'yaml')
+
+# Write order, parent first
+LEVELS = (Course, Module, Section, Quiz, Question, QuestionOption)
+
+# parent FK, {bundle key: child model}, external id suffix, order_number unique among siblings
+TREE = {
+    Course: (None, {'modules': Module}, None, False),
+    Module: ('course', {'sections': Section, 'quiz': Quiz}, 'm', True),
+    Section: ('module', {}, 's', True),
+    Quiz: ('module', {'questions': Question}, 'quiz', False),
+    Question: ('quiz', {'options': QuestionOption}, 'q', False),
+    QuestionOption: ('question', {}, 'o', False),
+}
+
+# Single objects rather than lists in the bundle
+SINGLE = {Quiz}
+
+MAX_REPORTED_ERRORS = 50
+
+
+class BundleError(Exception):
+    """The bundle is malformed or invalid. errors is a list of (path, message)."""
+
+    def __init__(self, errors):
+        self.errors = errors
+        super().__init__(f'{len(errors)} error(s) in the course bundle')
+
+
+def importable_fields(model):
+    """Names of the fields a bundle may set on model."""
+    return [
+        field.name for field in model._meta.concrete_fields
+        if field.editable and not field.primary_key and not field.is_relation
+        and not isinstance(field, models.FileField)
+        and field.name not in ('external_id', 'created_at', 'updated_at')
+    ]
+
+
+def detect_format(path):
+    if path.endswith(('.jsonl', '.ndjson')):
+        return 'jsonl'
+    if path.endswith(('.yaml', '.yml')):
+        return 'yaml'
+    return 'json'
+
+
+def _courses_in(document):
+    if document is None:
+        return []
+    if isinstance(document, dict) and 'courses' in document:
+        document = document['courses']
+    return document if isinstance(document, list) else [document]
+
+
+def _iter_json_array(stream, chunk_size=1 << 16):
+    """Yield the elements of the JSON array stream is positioned at, one at a time."""
+    decoder = json.JSONDecoder()
+    buffer = stream.read(chunk_size).lstrip()[1:]
+    eof = False
+    while True:
+        buffer = buffer.lstrip()
+        if buffer.startswith(','):
+            buffer = buffer[1:]
+            continue
+        if buffer.startswith(']'):
+            return
+        try:
+            if not buffer:
+                raise json.JSONDecodeError('Unterminated array', buffer, 0)
+            item, end = decoder.raw_decode(buffer)
+        except json.JSONDecodeError:
+            if eof:
+                raise
+            # Read at least as much again, so a large element is not re-parsed once per chunk
+            more = stream.read(max(chunk_size, len(buffer)))
+            eof = not more
+            buffer += more
+            continue
+        yield item
+        buffer = buffer[end:]
+
+
+def iter_courses(path, fmt=None):
+    """
+    Yield the course objects of a bundle file without loading it whole.
+
+    Args:
+        path (str): Bundle file
+        fmt (str): One of FORMATS; detected from the file name if None
+    """
+    fmt = fmt or detect_format(path)
+    with open(path, encoding='utf-8') as stream:
+        if fmt == 'jsonl':
+            for line in stream:
+                if line.strip():
+                    yield json.loads(line)
+        elif fmt == 'yaml':
+            for document in yaml.load_all(stream, Loader=YamlLoader):
+                yield from _courses_in(document)
+        else:
+            first = stream.read(1)
+            while first.isspace():
+                first = stream.read(1)
+            if first == '[':
+                yield from _iter_json_array(_Prepend(first, stream))
+            else:
+                yield from _courses_in(json.loads(first + stream.read()))
+
+
+class _Prepend:
+    """File-like object that returns text before reading on from stream."""
+
+    def __init__(self, text, stream):
+        self.text = text
+        self.stream = stream
+
+    def read(self, size):
+        text, self.text = self.text, ''
+        return text + self.stream.read(size - len(text))
+
+
+class CourseBundle:
+    """
+    Validated, unsaved rows of a course bundle, by model.
+
+    Args:
+        upsert (bool): Whether rows will be matched on external_id
+    """
+
+    def __init__(self, upsert=False):
+        self.upsert = upsert
+        self.rows = {model: [] for model in LEVELS}
+        self.errors = []
+        self._external_ids = {model: set() for model in LEVELS}
+        self._fields = {model: importable_fields(model) for model in LEVELS}
+        self._not_validated = {
+            model: [
+                field.name for field in model._meta.fields
+                if field.name not in self._fields[model] and field.name != 'external_id'
+            ]
+            for model in LEVELS
+        }
+
+    def add(self, data, path):
+        """Validate one course object and queue its rows."""
+        if self.upsert and isinstance(data, dict) and not data.get('external_id'):
+            self.error(path, 'external_id is required with upsert')
+            return
+        self._add(Course, data, path, None, None, None)
+
+    def error(self, path, message):
+        self.errors.append((path, message))
+
+    def _add(self, model, data, path, parent, parent_external_id, position):
+        if not isinstance(data, dict):
+            self.error(path, 'Expected an object')
+            return None
+        parent_field, children, suffix, _ = TREE[model]
+        fields = self._fields[model]
+        unknown = set(data) - set(fields) - set(children) - {'external_id'}
+        if unknown:
+            self.error(path, f"Unknown field(s): {', '.join(sorted(unknown))}")
+
+        values = {name: data[name] for name in fields if name in data}
+        if 'order_number' in fields and 'order_number' not in values and position is not None:
+            values['order_number'] = position
+        external_id = data.get('external_id')
+        if not external_id and parent_external_id:
+            number = '' if model in SINGLE else values.get('order_number', position)
+            external_id = f'{parent_external_id}.{suffix}{number}'
+        obj = model(external_id=external_id or None, **values)
+        if parent_field:
+            setattr(obj, parent_field, parent)
+
+        try:
+            obj.clean_fields(exclude=self._not_validated[model])
+        except ValidationError as e:
+            for name, messages in e.message_dict.items():
+                self.error(f'{path}.{name}', ' '.join(messages))
+        if obj.external_id:
+            if obj.external_id in self._external_ids[model]:
+                self.error(f'{path}.external_id', f'Duplicate external_id {obj.external_id!r}')
+            self._external_ids[model].add(obj.external_id)
+        self.rows[model].append(obj)
+
+        for key, child_model in children.items():
+            value = data.get(key)
+            if value is None:
+                continue
+            if child_model in SINGLE:
+                self._add(child_model, value, f'{path}.{key}', obj, obj.external_id, None)
+                continue
+            if not isinstance(value, list):
+                self.error(f'{path}.{key}', 'Expected a list')
+                continue
+            orders = Counter()
+            for index, item in enumerate(value):
+                child = self._add(child_model, item, f'{path}.{key}[{index}]', obj, obj.external_id, index + 1)
+                if child is not None and TREE[child_model][3] and isinstance(child.order_number, int):
+                    orders[child.order_number] += 1
+            for order_number, count in orders.items():
+                if count > 1:
+                    self.error(f'{path}.{key}', f'order_number {order_number} is used {count} times')
+        return obj
+
+    def check_existing(self):
+        """Without upsert, report external ids that are already in the database."""
+        if self.upsert:
+            return
+        for model in LEVELS:
+            for chunk in _chunks(sorted(self._external_ids[model]), 10000):
+                for external_id in model.objects.filter(external_id__in=chunk).values_list('external_id', flat=True):
+                    self.error(
+                        f'{model._meta.model_name} {external_id}',
+                        'external_id already exists; import with upsert to update it'
+                    )
+
+    def save(self, batch_size=1000):
+        """
+        Write every row in one transaction.
+
+        Returns:
+            dict: {model: rows written}
+        """
+        if self.errors:
+            raise BundleError(self.errors)
+        written = {}
+        with transaction.atomic():
+            for model in LEVELS:
+                rows = self.rows[model]
+                if self.upsert:
+                    self._prepare_upsert(model, rows)
+                if not rows:
+                    continue
+                if self.upsert:
+                    parent_field = TREE[model][0]
+                    model.objects.bulk_create(
+                        rows, batch_size=batch_size, update_conflicts=True, unique_fields=['external_id'],
+                        update_fields=[*self._fields[model], *([parent_field] if parent_field else []), 'updated_at']
+                    )
+                else:
+                    model.objects.bulk_create(rows, batch_size=batch_size)
+                written[model] = len(rows)
+
+            course_ids = [course.pk for course in self.rows[Course]]
+            for chunk in _chunks(course_ids, 10000):
+                update_search_vectors(chunk)
+            for course_id in course_ids:
+                bump_version_on_commit(course_id)
+        return written
+
+    def _prepare_upsert(self, model, rows):
+        """
+        Delete the rows under the imported parents that the bundle no longer
+        has, and move the order_number of rows being updated out of the way
+        so the new numbering cannot collide with the old one.
+        """
+        parent_field, _, _, unique_order = TREE[model]
+        if parent_field is None:
+            return
+        external_ids = self._external_ids[model]
+        parent_model = model._meta.get_field(parent_field).related_model
+        # Every row's parent is in the bundle, including parents left with no rows at all
+        parent_ids = sorted(parent.pk for parent in self.rows[parent_model])
+        stale = []
+        for chunk in _chunks(parent_ids, 10000):
+            existing = model.objects.filter(**{f'{parent_field}__in': chunk}).values_list('pk', 'external_id')
+            stale += [pk for pk, external_id in existing if external_id not in external_ids]
+        for chunk in _chunks(stale, 10000):
+            model.objects.filter(pk__in=chunk).delete()
+
+        if unique_order:
+            offset = (model.objects.aggregate(top=Max('order_number'))['top'] or 0) + 1
+            for chunk in _chunks(sorted(external_ids), 10000):
+                model.objects.filter(external_id__in=chunk).update(order_number=F('order_number') + offset)
+
+
+def _chunks(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def import_courses(paths, fmt=None, upsert=False, batch_size=1000, dry_run=False):
+    """
+    Validate and import course bundle files.
+
+    Args:
+        paths (list): Bundle files
+        fmt (str): One of FORMATS; detected per file if None
+        upsert (bool): Update and prune existing courses matched on external_id
+        batch_size (int): Rows per INSERT
+        dry_run (bool): Validate only
+
+    Returns:
+        dict: {'rows': {model class name: count}, 'courses': int, 'read_seconds', 'write_seconds'}
+
+    Raises:
+        BundleError: If any course fails to parse or validate; nothing is written
+    """
+    start = time.perf_counter()
+    bundle = CourseBundle(upsert=upsert)
+    for path in paths:
+        index = 0
+        try:
+            for index, data in enumerate(iter_courses(path, fmt)):
+                bundle.add(data, f'{path}[{index}]')
+        except (ValueError, yaml.YAMLError) as e:
+            # json.JSONDecodeError and UnicodeDecodeError are ValueErrors
+            bundle.error(f'{path}[{index}]', f'Could not parse: {e}')
+    bundle.check_existing()
+    if bundle.errors:
+        raise BundleError(bundle.errors)
+    read_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    written = {model: len(rows) for model, rows in bundle.rows.items() if rows}
+    if not dry_run:
+        written = bundle.save(batch_size=batch_size)
+    return {
+        'rows': {model.__name__: count for model, count in written.items()},
+        'courses': len(bundle.rows[Course]),
+        'read_seconds': read_seconds,
+        'write_seconds': time.perf_counter() - start,
+    }
@@ -0,0 +1,125 @@
+import random
+import statistics
+import time
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from rest_framework.test import APIRequestFactory, force_authenticate
+from courses.models import Course
+from courses.snapshots import bump_version
+from courses.views import CourseViewSet
+from perfdata import seeding
+
+User = get_user_model()
+
+EXTERNAL_ID_PREFIX = 'benchmark-'
+
+
+class BaselineCourseViewSet(CourseViewSet):
+    """CourseViewSet as it was before the tree was prefetched."""
+
+    def get_queryset(self):
+        return Course.objects.all()
+
+
+class Command(BaseCommand):
+    help = (
+        'Time GET /api/courses/courses/ on a generated course tree with and without '
+        'the prefetch plan and with ?fields=/?depth=, and a course detail from a cold and a warm snapshot. '
+        'The courses are generated with a fixed shape and rolled back afterwards unless --keep is given, '
+        'or taken from the seed_perf_data dataset with --dataset.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--courses', type=int, default=50, help='Courses (default: 50)')
+        parser.add_argument('--modules', type=int, default=10, help='Modules per course (default: 10)')
+        parser.add_argument('--sections', type=int, default=20, help='Sections per module (default: 20)')
+        parser.add_argument('--questions', type=int, default=5, help='Quiz questions per module (default: 5)')
+        parser.add_argument('--options', type=int, default=4, help='Options per question (default: 4)')
+        parser.add_argument('--repeat', type=int, default=5, help='Timed requests per variant (default: 5)')
+        parser.add_argument('--keep', action='store_true', help='Keep the generated courses')
+        parser.add_argument(
+            '--dataset', action='store_true',
+            help='Benchmark the courses of the seed_perf_data dataset instead of generating them'
+        )
+
+    def handle(self, *args, **options):
+        if options['dataset'] and not seeding.exists():
+            raise CommandError('No seeded dataset found; run seed_perf_data first')
+        with transaction.atomic():
+            if options['dataset']:
+                course_id = Course.objects.filter(
+                    external_id__startswith=seeding.EXTERNAL_ID_PREFIX
+                ).order_by('pk').values_list('pk', flat=True).first()
+            else:
+                course_id = self.seed(options)
+            user = User.objects.filter(is_active=True).first() or User.objects.create(
+                email='benchmark@example.invalid', username='benchmark-user', name='Benchmark'
+            )
+            self.stdout.write('List:')
+            for label, view_class in (('baseline', BaselineCourseViewSet), ('prefetched', CourseViewSet)):
+                self.report(label, self.measure(view_class, user, options['repeat']))
+            for label, params in (('id,title', {'fields': 'id,title'}), ('depth=1', {'depth': 1})):
+                self.report(label, self.measure(CourseViewSet, user, options['repeat'], params=params))
+
+            self.stdout.write('Detail of one course:')
+            bump_version(course_id)
+            self.report('cold', self.measure(CourseViewSet, user, 1, action='retrieve', pk=course_id))
+            self.report('warm', self.measure(CourseViewSet, user, options['repeat'], action='retrieve', pk=course_id))
+            etag = self.last_etag
+            self.report(
+                '304', self.measure(CourseViewSet, user, options['repeat'], action='retrieve', pk=course_id, etag=etag)
+            )
+            if not options['keep']:
+                transaction.set_rollback(True)
+
+    def seed(self, options):
+        """Generate the benchmark courses; returns the id of the first."""
+        start = time.perf_counter()
+        courses = seeding.seed_courses(
+            options['courses'], random.Random(0),
+            modules=options['modules'], sections=options['sections'],
+            questions=options['questions'], options=options['options'],
+            fixed=True, prefix=EXTERNAL_ID_PREFIX
+        )
+        self.stdout.write(
+            f"Seeded {len(courses)} courses x {options['modules']} modules x {options['sections']} sections, "
+            f"{options['questions']} questions per module in {time.perf_counter() - start:.1f}s"
+        )
+        return courses[0]['id']
+
+    def measure(self, view_class, user, repeat, action='list', pk=None, etag=None, params=None):
+        view = view_class.as_view({'get': action})
+        path = '/api/courses/courses/' if pk is None else f'/api/courses/courses/{pk}/'
+        headers = {'HTTP_IF_NONE_MATCH': etag} if etag else {}
+        factory = APIRequestFactory()
+        timings = []
+        queries = []
+        size = 0
+
+        # Counts without keeping the SQL, unlike CaptureQueriesContext which stops at 9000
+        def count_query(execute, sql, params, many, context):
+            queries.append(None)
+            return execute(sql, params, many, context)
+
+        for _ in range(repeat):
+            request = factory.get(path, params, SERVER_NAME='localhost', **headers)
+            force_authenticate(request, user=user)
+            queries.clear()
+            with connection.execute_wrapper(count_query):
+                start = time.perf_counter()
+                response = view(request, **({} if pk is None else {'pk': pk}))
+                if hasattr(response, 'render'):
+                    response.render()
+                timings.append((time.perf_counter() - start) * 1000)
+            size = len(response.content)
+            self.last_etag = response.get('ETag')
+        return {'timings': timings, 'queries': len(queries), 'bytes': size}
+
+    def report(self, label, result):
+        timings = result['timings']
+        self.stdout.write(
+            f"  {label:<10} queries={result['queries']:<6} "
+            f"median={statistics.median(timings):8.1f}ms min={min(timings):8.1f}ms "
+            f"response={result['bytes'] / 1024:.0f}KB"
+        )
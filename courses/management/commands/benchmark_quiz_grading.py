@@ -0,0 +1,237 @@
+import random
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Count
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+from attendance.management.commands.loadtest_qr_burst import percentile
+from perfdata import seeding
+from progress.models import UserQuizAttempt as ProgressAttempt
+from ...grading import answer_keys, compile_answer_key, get_answer_key, grade, save_graded_attempt
+from ...models import Course, Question, Quiz, UserQuizAttempt, UserQuizResponse
+
+User = get_user_model()
+
+EXTERNAL_ID_PREFIX = 'benchmark-grading-'
+
+
+def naive_grade_and_save(user, quiz_id, submitted, started_at, time_spent):
+    """Grading as done without a compiled key: load the quiz per submission and save row by row."""
+    answers = {answer['question']: answer for answer in submitted}
+    quiz = Quiz.objects.get(pk=quiz_id)
+    points = total = 0
+    rows = []
+    for question in Question.objects.filter(quiz=quiz, is_active=True).prefetch_related('options'):
+        correct = {option.pk for option in question.options.all() if option.is_correct}
+        selected = set(answers.get(question.pk, {}).get('selected_options', ()))
+        is_correct = bool(selected) and selected == correct
+        total += question.points
+        points += question.points if is_correct else 0
+        rows.append((question, selected, is_correct))
+    score = points / total * 100 if total else 0
+    attempt = UserQuizAttempt.objects.create(
+        user=user, quiz=quiz, score=score, passed=score >= quiz.passing_score,
+        started_at=started_at, time_spent=time_spent
+    )
+    for question, selected, is_correct in rows:
+        response = UserQuizResponse.objects.create(
+            attempt=attempt, question=question, is_correct=is_correct,
+            points_earned=question.points if is_correct else 0
+        )
+        response.selected_options.set(selected)
+    return attempt
+
+
+class Command(BaseCommand):
+    help = (
+        'Grade a burst of quiz submissions: the grading engine against per-submission loading in process, '
+        'then every submission POSTed concurrently to the quiz attempt endpoint. '
+        'The quiz and users are generated and removed afterwards unless --keep is given, '
+        'or taken from the seed_perf_data dataset with --dataset.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--submissions', type=int, default=10000, help='Submissions (default: 10000)')
+        parser.add_argument('--concurrency', type=int, default=32, help='Client threads (default: 32)')
+        parser.add_argument('--users', type=int, default=1000, help='Submitting users (default: 1000)')
+        parser.add_argument('--questions', type=int, default=20, help='Questions in the quiz (default: 20)')
+        parser.add_argument('--options', type=int, default=4, help='Options per question (default: 4)')
+        parser.add_argument(
+            '--baseline-sample', type=int, default=500,
+            help='Submissions graded the per-submission way for comparison (default: 500)'
+        )
+        parser.add_argument('--keep', action='store_true', help='Keep the generated quiz, users and attempts')
+        parser.add_argument(
+            '--dataset', action='store_true',
+            help='Use the largest quiz and the users of the seed_perf_data dataset'
+        )
+
+    def handle(self, *args, **options):
+        for name in ('submissions', 'concurrency', 'users', 'questions', 'options'):
+            if options[name] < 1:
+                raise CommandError(f'--{name} must be at least 1')
+        if options['dataset'] and not seeding.exists():
+            raise CommandError('No seeded dataset found; run seed_perf_data first')
+
+        rng = random.Random(0)
+        quiz_id, course_ids, user_ids = None, [], []
+        first_attempts = (
+            UserQuizAttempt.objects.order_by('-pk').values_list('pk', flat=True).first() or 0,
+            ProgressAttempt.objects.order_by('-pk').values_list('pk', flat=True).first() or 0,
+        )
+        try:
+            if options['dataset']:
+                quiz_id = self.largest_dataset_quiz()
+                users = list(User.objects.filter(
+                    email__endswith=f'@{seeding.EMAIL_DOMAIN}'
+                ).order_by('pk')[:options['users']])
+            else:
+                courses = seeding.seed_courses(
+                    1, rng, modules=1, sections=1, questions=options['questions'], options=options['options'],
+                    fixed=True, prefix=EXTERNAL_ID_PREFIX
+                )
+                course_ids = [course['id'] for course in courses]
+                quiz_id = courses[0]['modules'][0]['quiz']
+                user_ids = seeding.seed_users(options['users'], rng, prefix='benchmark-grading')
+                users = list(User.objects.filter(pk__in=user_ids).order_by('pk'))
+
+            answer_keys.clear()
+            key = get_answer_key(quiz_id)
+            submissions = [
+                (users[n % len(users)], self.make_submission(rng, key))
+                for n in range(options['submissions'])
+            ]
+            self.stdout.write(
+                f'Quiz {quiz_id}: {len(key.questions)} questions; '
+                f'{len(submissions)} submissions from {len(users)} users'
+            )
+            self.benchmark_engine(key, submissions, options['baseline_sample'])
+            self.benchmark_endpoint(quiz_id, submissions, options['concurrency'])
+        finally:
+            if not options['keep']:
+                self.cleanup(quiz_id, first_attempts, course_ids, user_ids)
+
+    @staticmethod
+    def largest_dataset_quiz():
+        return Quiz.objects.filter(
+            module__course__external_id__startswith=seeding.EXTERNAL_ID_PREFIX
+        ).annotate(question_count=Count('questions')).order_by('-question_count', 'pk').values_list(
+            'pk', flat=True
+        ).first()
+
+    @staticmethod
+    def make_submission(rng, key):
+        """Mostly correct answers, with some wrong and some skipped."""
+        submitted = []
+        for question in key.questions:
+            roll = rng.random()
+            if roll < 0.05 or not question.options:
+                continue
+            selected = question.correct if roll < 0.75 else {rng.choice(sorted(question.options))}
+            submitted.append({'question': question.id, 'selected_options': sorted(selected)})
+        return submitted
+
+    def benchmark_engine(self, key, submissions, sample):
+        self.stdout.write('In process:')
+        answer_keys.clear()
+        with CaptureQueriesContext(connection) as queries:
+            start = time.perf_counter()
+            compile_answer_key(key.quiz_id)
+            compile_ms = (time.perf_counter() - start) * 1000
+        self.stdout.write(f'  compile key  {compile_ms:8.2f}ms queries={len(queries)}')
+
+        start = time.perf_counter()
+        for _, submitted in submissions:
+            grade(get_answer_key(key.quiz_id), submitted)
+        elapsed = time.perf_counter() - start
+        self.stdout.write(
+            f'  grade        {elapsed / len(submissions) * 1e6:8.1f}us per submission, '
+            f'{len(submissions) / elapsed:,.0f}/s (cached key, no queries)'
+        )
+
+        sample = submissions[:sample]
+        if not sample:
+            return
+        started_at = timezone.now()
+        for label, run in (
+            ('per-row', lambda user, submitted: naive_grade_and_save(
+                user, key.quiz_id, submitted, started_at, 60
+            )),
+            ('engine', lambda user, submitted: save_graded_attempt(
+                user, grade(get_answer_key(key.quiz_id), submitted), started_at, 60
+            )),
+        ):
+            queries = []
+
+            # Counts without keeping the SQL, unlike CaptureQueriesContext which stops at 9000
+            def count_query(execute, sql, params, many, context):
+                queries.append(None)
+                return execute(sql, params, many, context)
+
+            with transaction.atomic():
+                with connection.execute_wrapper(count_query):
+                    start = time.perf_counter()
+                    for user, submitted in sample:
+                        run(user, submitted)
+                    elapsed = time.perf_counter() - start
+                transaction.set_rollback(True)
+            self.stdout.write(
+                f'  {label:<12} {elapsed / len(sample) * 1000:8.2f}ms per graded and saved submission, '
+                f'queries={len(queries) / len(sample):.1f} ({len(sample)} submissions, rolled back)'
+            )
+
+    def benchmark_endpoint(self, quiz_id, submissions, concurrency):
+        url = f'/api/progress/quizzes/{quiz_id}/attempts/'
+        samples = []
+        lock = threading.Lock()
+        local = threading.local()
+
+        def submit(item):
+            user, submitted = item
+            if not hasattr(local, 'client'):
+                local.client = APIClient(SERVER_NAME='localhost')
+            local.client.force_authenticate(user)
+            with CaptureQueriesContext(connection) as queries:
+                start = time.perf_counter()
+                response = local.client.post(url, {
+                    'quiz': quiz_id, 'time_taken': 60, 'responses': submitted
+                }, format='json')
+                elapsed = (time.perf_counter() - start) * 1000
+            with lock:
+                samples.append((elapsed, len(queries), response.status_code))
+
+        def worker(chunk):
+            try:
+                for item in chunk:
+                    submit(item)
+            finally:
+                connection.close()
+
+        chunks = [submissions[n::concurrency] for n in range(concurrency)]
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            list(executor.map(worker, chunks))
+        elapsed = time.perf_counter() - start
+
+        latencies = [row[0] for row in samples]
+        statuses = {}
+        for row in samples:
+            statuses[str(row[2])] = statuses.get(str(row[2]), 0) + 1
+        self.stdout.write(
+            f'Endpoint, {concurrency} threads: {len(samples)} submissions in {elapsed:.1f}s, '
+            f'{len(samples) / elapsed:,.0f}/s; p50={percentile(latencies, 50):.1f}ms '
+            f'p99={percentile(latencies, 99):.1f}ms max={max(latencies):.1f}ms '
+            f'queries mean={statistics.mean(row[1] for row in samples):.1f} status={statuses}'
+        )
+
+    def cleanup(self, quiz_id, first_attempts, course_ids, user_ids):
+        UserQuizAttempt.objects.filter(quiz_id=quiz_id, pk__gt=first_attempts[0]).delete()
+        ProgressAttempt.objects.filter(quiz_id=quiz_id, pk__gt=first_attempts[1]).delete()
+        Course.objects.filter(pk__in=course_ids).delete()
+        User.objects.filter(pk__in=user_ids).delete()
@@ -0,0 +1,59 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import IntegrityError
+from ...importer import FORMATS, MAX_REPORTED_ERRORS, BundleError, import_courses
+
+
+class Command(BaseCommand):
+    help = (
+        'Import course bundles (JSON array, JSON Lines or YAML) with bulk inserts in one transaction. '
+        'The whole bundle is validated first; nothing is written if any course is invalid.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('paths', nargs='+', help='Bundle files')
+        parser.add_argument(
+            '--format',
+            choices=FORMATS,
+            default=None,
+            help='Bundle format (default: from the file extension; .jsonl/.ndjson, .yaml/.yml, else JSON)'
+        )
+        parser.add_argument(
+            '--upsert',
+            action='store_true',
+            help='Update courses matched on external_id and replace their trees, instead of failing on them'
+        )
+        parser.add_argument('--batch-size', type=int, default=1000, help='Rows per INSERT (default: 1000)')
+        parser.add_argument('--dry-run', action='store_true', help='Validate the bundle without writing')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be at least 1')
+        try:
+            result = import_courses(
+                options['paths'],
+                fmt=options['format'],
+                upsert=options['upsert'],
+                batch_size=options['batch_size'],
+                dry_run=options['dry_run'],
+            )
+        except FileNotFoundError as e:
+            raise CommandError(str(e))
+        except BundleError as e:
+            for path, message in e.errors[:MAX_REPORTED_ERRORS]:
+                self.stderr.write(f'{path}: {message}')
+            if len(e.errors) > MAX_REPORTED_ERRORS:
+                self.stderr.write(f'... and {len(e.errors) - MAX_REPORTED_ERRORS} more')
+            raise CommandError(f'{e}; nothing was imported')
+        except IntegrityError as e:
+            raise CommandError(f'Import rolled back: {e}')
+
+        rows = sum(result['rows'].values())
+        elapsed = result['read_seconds'] + result['write_seconds']
+        for name, count in result['rows'].items():
+            self.stdout.write(f'  {name:<18} {count}')
+        verb = 'Validated' if options['dry_run'] else 'Imported'
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} {result['courses']} courses, {rows} rows in {elapsed:.2f}s "
+            f"(read and validate {result['read_seconds']:.2f}s, write {result['write_seconds']:.2f}s; "
+            f"{rows / elapsed if elapsed else 0:,.0f} rows/s)"
+        ))
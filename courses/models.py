@@ -1,3 +1,5 @@
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
 from django.utils import timezone
 from django.contrib.auth import get_user_model
@@ -42,6 +44,18 @@ class Course(models.Model):
     created_at = models.DateTimeField(default=timezone.now)
     updated_at = models.DateTimeField(auto_now=True)
     published_at = models.DateTimeField(null=True, blank=True)
+    # Kept up to date from the course, module and section text by courses.search.
+    # The trigram index on title used for fuzzy matches is created by migration
+    # 0004 when the pg_trgm extension is available.
+    search_vector = SearchVectorField(null=True, editable=False)
+    # Stable id in the source a course bundle was imported from; rows of the
+    # whole tree are matched on it by import_courses --upsert (see courses.importer)
+    external_id = models.CharField(max_length=100, unique=True, null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            GinIndex(fields=['search_vector'], name='course_search_vector_idx'),
+        ]
 
     def __str__(self):
         return self.title
@@ -61,6 +75,7 @@ class Module(models.Model):
     estimated_duration = models.PositiveIntegerField(help_text="Duration in minutes", default=0)
     created_at = models.DateTimeField(default=timezone.now)
     updated_at = models.DateTimeField(auto_now=True)
+    external_id = models.CharField(max_length=100, unique=True, null=True, blank=True)
 
     class Meta:
         ordering = ['order_number']
@@ -98,6 +113,7 @@ class Section(models.Model):
     created_at = models.DateTimeField(default=timezone.now)
     updated_at = models.DateTimeField(auto_now=True)
     published_at = models.DateTimeField(null=True, blank=True)
+    external_id = models.CharField(max_length=100, unique=True, null=True, blank=True)
 
     class Meta:
         ordering = ['order_number']
@@ -134,6 +150,7 @@ class Quiz(models.Model):
     )
     created_at = models.DateTimeField(default=timezone.now)
     updated_at = models.DateTimeField(auto_now=True)
+    external_id = models.CharField(max_length=100, unique=True, null=True, blank=True)
 
     def __str__(self):
         return f"Quiz for {self.module.title}"
@@ -156,6 +173,7 @@ class Question(models.Model):
     is_active = models.BooleanField(default=True)
     created_at = models.DateTimeField(default=timezone.now)
     updated_at = models.DateTimeField(auto_now=True)
+    external_id = models.CharField(max_length=100, unique=True, null=True, blank=True)
 
     class Meta:
         ordering = ['order_number']
@@ -171,6 +189,7 @@ class QuestionOption(models.Model):
     order_number = models.PositiveIntegerField()
     created_at = models.DateTimeField(default=timezone.now)
     updated_at = models.DateTimeField(auto_now=True)
+    external_id = models.CharField(max_length=100, unique=True, null=True, blank=True)
 
 class UserQuizAttempt(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='course_quiz_attempts')
@@ -0,0 +1,126 @@
+"""
+Prefetch plans for the nested course tree.
+
+CourseSerializer nests modules -> sections and quiz -> questions -> options.
+Serialized without a plan, that is one query per module, per section list,
+per quiz, per question list and per option list. plan_queryset() walks a
+serializer instead and loads each nested level with one ordered query, so a
+listing runs a fixed number of queries however many courses it returns:
+
+    courses, modules (+ quiz joined), sections, questions, options
+
+Only the columns behind the serializer's fields are selected, and nested
+levels the serializer does not output are not loaded at all, so a
+serializer pruned by ?fields=/?depth= (see courses.fieldsets) also reads
+less.
+"""
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Prefetch
+from rest_framework.serializers import BaseSerializer, ListSerializer
+from .models import QuestionOption
+
+
+def get_ordering(model):
+    """Order of the rows of a nested level."""
+    if model is QuestionOption or 'order_number' in model._meta.ordering:
+        return ('order_number', 'id')
+    return (*model._meta.ordering, 'pk')
+
+
+def nested_serializer(field):
+    """Return the serializer a nested field renders with, or None for plain fields."""
+    if isinstance(field, ListSerializer):
+        return field.child
+    if isinstance(field, BaseSerializer):
+        return field
+    return None
+
+
+def plan_queryset(queryset, serializer):
+    """
+    Restrict queryset to what serializer outputs and prefetch its nested levels.
+
+    Args:
+        queryset (QuerySet): Rows the serializer will render
+        serializer (ModelSerializer): Serializer for a single row
+
+    Returns:
+        QuerySet
+    """
+    only, related, prefetches = _plan(queryset.model, serializer, '')
+    if only is not None:
+        queryset = queryset.only(*only)
+    if related:
+        queryset = queryset.select_related(*related)
+    return queryset.prefetch_related(*prefetches)
+
+
+def _plan(model, serializer, prefix, required=()):
+    """
+    Work out how to load the rows a serializer renders.
+
+    Args:
+        model: Model the serializer renders
+        serializer (ModelSerializer): Serializer for a single row
+        prefix (str): Lookup path from the queryset's model, for joined relations
+        required (tuple): Fields to load even if not rendered, e.g. the key a prefetch matches on
+
+    Returns:
+        tuple: (only() names, or None to load every column; select_related paths; Prefetch list)
+    """
+    only = {f'{prefix}{model._meta.pk.name}', *(f'{prefix}{name}' for name in required)}
+    load_all = False
+    related = []
+    prefetches = []
+    method_sources = getattr(serializer.Meta, 'method_field_sources', {})
+
+    for name, field in serializer.fields.items():
+        nested = nested_serializer(field)
+        if nested is None:
+            for source in method_sources.get(name, (field.source,)):
+                try:
+                    only.add(prefix + model._meta.get_field(source).name)
+                except FieldDoesNotExist:
+                    # A property or method we cannot see into; keep every column
+                    load_all = True
+            continue
+
+        relation = model._meta.get_field(field.source)
+        child_model = relation.related_model
+        if relation.one_to_many:
+            child_only, child_related, child_prefetches = _plan(
+                child_model, nested, '', required=(relation.field.name,)
+            )
+            child_queryset = child_model.objects.order_by(*get_ordering(child_model))
+            if child_only is not None:
+                child_queryset = child_queryset.only(*child_only)
+            if child_related:
+                child_queryset = child_queryset.select_related(*child_related)
+            prefetches.append(Prefetch(
+                prefix + field.source,
+                queryset=child_queryset.prefetch_related(*child_prefetches)
+            ))
+        else:
+            # Single-valued relations are joined into this level's query
+            child_only, child_related, child_prefetches = _plan(child_model, nested, f'{prefix}{field.source}__')
+            related.extend([prefix + field.source, *child_related])
+            prefetches.extend(child_prefetches)
+            if child_only is None:
+                load_all = True
+            else:
+                only.update(child_only)
+
+    return (None if load_all else only), related, prefetches
+
+
+def with_question_tree(queryset):
+    """Load Question rows with their options."""
+    from .serializers import QuestionSerializer
+    return plan_queryset(queryset, QuestionSerializer())
+
+
+def with_quiz_tree(queryset):
+    """Load Quiz rows with their questions and options."""
+    from .serializers import QuizSerializer
+    return plan_queryset(queryset, QuizSerializer())
+
@@ -0,0 +1,155 @@
+"""
+PostgreSQL full-text search over courses.
+
+Course.search_vector holds a weighted tsvector of the course and its
+content:
+    A  title
+    B  subtitle, learning outcomes, description, module titles and text
+    C  section titles
+    D  section summaries and content
+It is searched through a GIN index. The vector is recomputed with a single
+UPDATE for each changed course, on commit of any save or delete of the
+course, its modules or its sections (see courses.signals).
+
+Queries use websearch syntax ("quoted phrases", -exclusions, or). When
+nothing matches and the pg_trgm extension is installed, titles are matched
+by trigram word similarity instead, so misspelt queries still find something.
+"""
+from django.conf import settings
+from django.contrib.postgres.aggregates import StringAgg
+from django.contrib.postgres.search import SearchHeadline, SearchQuery, SearchRank, SearchVector, TrigramWordSimilarity
+from django.db import connection, transaction
+from django.db.models import F, OuterRef, Subquery, TextField, Value
+from django.db.models.functions import Concat, Left
+from rest_framework.filters import BaseFilterBackend
+
+FULLTEXT = 'fulltext'
+FUZZY = 'fuzzy'
+
+# Upper bound on the section text folded into one course's vector; a tsvector
+# cannot exceed 1MB.
+MAX_SECTION_TEXT = 500000
+
+_trigram_available = None
+
+
+def get_search_config():
+    """Text search configuration used for stemming and stop words."""
+    return getattr(settings, 'COURSE_SEARCH_CONFIG', 'english')
+
+
+def _aggregate_text(model, course_lookup, *fields):
+    """Subquery that concatenates fields of every model row belonging to the outer course."""
+    text = F(fields[0])
+    for field in fields[1:]:
+        text = Concat(text, Value(' '), F(field), output_field=TextField())
+    return Subquery(
+        model.objects.filter(**{course_lookup: OuterRef('pk')}).order_by()
+        .values(course_lookup)
+        .annotate(text=StringAgg(text, ' '))
+        .values('text')
+    )
+
+
+def build_search_vector(module_model, section_model):
+    """
+    Expression computing Course.search_vector.
+
+    Takes the Module and Section models so migrations can pass their
+    historical versions.
+    """
+    config = get_search_config()
+    return (
+        SearchVector('title', weight='A', config=config)
+        + SearchVector(
+            'subtitle', 'learning_outcomes', 'description',
+            _aggregate_text(module_model, 'course', 'title', 'description', 'objectives'),
+            weight='B', config=config
+        )
+        + SearchVector(_aggregate_text(section_model, 'module__course', 'title'), weight='C', config=config)
+        + SearchVector(
+            Left(_aggregate_text(section_model, 'module__course', 'summary', 'content'), MAX_SECTION_TEXT),
+            weight='D', config=config
+        )
+    )
+
+
+def update_search_vectors(course_ids=None):
+    """
+    Recompute the search vector of the given courses (all courses if None).
+
+    Returns:
+        int: Number of courses updated
+    """
+    from .models import Course, Module, Section
+
+    courses = Course.objects.all()
+    if course_ids is not None:
+        courses = courses.filter(pk__in=course_ids)
+    return courses.update(search_vector=build_search_vector(Module, Section))
+
+
+def update_search_vector_on_commit(course_id):
+    """Recompute one course's vector once the current transaction commits."""
+    transaction.on_commit(lambda: update_search_vectors([course_id]))
+
+
+def trigram_available():
+    """Whether the pg_trgm extension is installed (checked once per process)."""
+    global _trigram_available
+    if _trigram_available is None:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm')")
+            _trigram_available = cursor.fetchone()[0]
+    return _trigram_available
+
+
+def search_courses(queryset, text):
+    """
+    Rank the courses of queryset matching text.
+
+    Args:
+        queryset (QuerySet): Courses to search
+        text (str): Search terms in websearch syntax
+
+    Returns:
+        tuple: (QuerySet annotated with rank and headline, FULLTEXT or FUZZY)
+    """
+    config = get_search_config()
+    query = SearchQuery(text, search_type='websearch', config=config)
+    headline = SearchHeadline(
+        'description', query, config=config,
+        start_sel='<mark>', stop_sel='</mark>', max_words=35, min_words=15
+    )
+
+    matches = (
+        queryset.filter(search_vector=query)
+        .annotate(rank=SearchRank(F('search_vector'), query), headline=headline)
+        .order_by('-rank', 'pk')
+    )
+    if not trigram_available() or matches.exists():
+        return matches, FULLTEXT
+
+    fuzzy = (
+        queryset.filter(title__trigram_word_similar=text)
+        .annotate(rank=TrigramWordSimilarity(text, 'title'), headline=headline)
+        .order_by('-rank', 'pk')
+    )
+    return fuzzy, FUZZY
+
+
+class FullTextSearchFilter(BaseFilterBackend):
+    """
+    Filter backend for ?search= that uses the course search vector instead
+    of ILIKE. Results are ordered by rank unless ?ordering= is given.
+    """
+    search_param = 'search'
+
+    def filter_queryset(self, request, queryset, view):
+        text = request.query_params.get(self.search_param, '').strip()
+        if not text:
+            return queryset
+        results, _ = search_courses(queryset, text)
+        if request.query_params.get('ordering'):
+            return results.order_by(*queryset.query.order_by)
+        return results
@@ -1,4 +1,5 @@
 from rest_framework import serializers
+from .grading import CHOICE_TYPES
 from .models import Course, Module, Section, Quiz, Question, QuestionOption
 
 class QuestionOptionSerializer(serializers.ModelSerializer):
@@ -20,6 +21,33 @@ class QuizSerializer(serializers.ModelSerializer):
         model = Quiz
         fields = ['id', 'module', 'title', 'passing_score', 'created_at', 'updated_at', 'questions']
 
+class DeliveredOptionSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = QuestionOption
+        fields = ['id', 'option_text', 'order_number']
+
+class DeliveredQuestionSerializer(serializers.ModelSerializer):
+    options = DeliveredOptionSerializer(many=True, read_only=True)
+
+    class Meta:
+        model = Question
+        fields = ['id', 'question_text', 'question_type', 'points', 'order_number', 'options']
+
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        # The options of a text question are its accepted answers
+        if instance.question_type not in CHOICE_TYPES:
+            data['options'] = []
+        return data
+
+class QuizDeliverySerializer(serializers.ModelSerializer):
+    """A quiz as learners take it: active questions only, and nothing that gives the answers away."""
+    questions = DeliveredQuestionSerializer(many=True, read_only=True)
+
+    class Meta:
+        model = Quiz
+        fields = ['id', 'module', 'title', 'description', 'passing_score', 'time_limit', 'max_attempts', 'questions']
+
 class SectionSerializer(serializers.ModelSerializer):
     class Meta:
         model = Section
@@ -41,6 +69,7 @@ class ModuleSerializer(serializers.ModelSerializer):
 
 class CourseSerializer(serializers.ModelSerializer):
     modules = ModuleSerializer(many=True, read_only=True)
+    thumbnail_url = serializers.SerializerMethodField()
     
     class Meta:
         model = Course
@@ -49,3 +78,21 @@ class CourseSerializer(serializers.ModelSerializer):
             'estimated_duration', 'created_at', 'updated_at', 'modules'
         ]
         read_only_fields = ['created_at', 'updated_at']
+        # Model fields behind SerializerMethodFields, for courses.prefetch.plan_queryset
+        method_field_sources = {'thumbnail_url': ('thumbnail',)}
+
+    def get_thumbnail_url(self, obj):
+        if not obj.thumbnail:
+            return None
+        request = self.context.get('request')
+        return request.build_absolute_uri(obj.thumbnail.url) if request else obj.thumbnail.url
+
+
+class CourseSearchResultSerializer(serializers.ModelSerializer):
+    """A ranked course search hit. headline is description text with matches wrapped in <mark>."""
+    rank = serializers.FloatField(read_only=True)
+    headline = serializers.CharField(read_only=True)
+
+    class Meta:
+        model = Course
+        fields = ['id', 'title', 'subtitle', 'level', 'estimated_duration', 'rank', 'headline']
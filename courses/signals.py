@@ -0,0 +1,118 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from .delivery import forget_quiz_courses_on_commit
+from .models import Course, Module, Question, QuestionOption, Quiz, Section
+from .search import update_search_vector_on_commit
+from .snapshots import bump_version_on_commit
+
+# How to get from each model in the course tree to its course id
+COURSE_LOOKUPS = {
+    Module: ('course_id', None),
+    Section: ('module_id', (Module, 'course_id')),
+    Quiz: ('module_id', (Module, 'course_id')),
+    Question: ('quiz_id', (Quiz, 'module__course_id')),
+    QuestionOption: ('question_id', (Question, 'quiz__module__course_id')),
+}
+
+
+def get_course_id(instance):
+    """Return the id of the course an object of the course tree belongs to, or None."""
+    if isinstance(instance, Course):
+        return instance.pk
+    return get_parent_course_id(type(instance), getattr(instance, COURSE_LOOKUPS[type(instance)][0]))
+
+
+def get_parent_course_id(model, value):
+    """Return the course id behind the parent reference value of a model in COURSE_LOOKUPS."""
+    parent = COURSE_LOOKUPS[model][1]
+    if parent is None or value is None:
+        return value
+    parent_model, lookup = parent
+    # The parent can already be gone when this runs for a cascaded delete;
+    # the delete of the course or module above it bumps the version then.
+    return parent_model.objects.filter(pk=value).values_list(lookup, flat=True).first()
+
+
+def get_affected_course_ids(instance):
+    """Courses whose snapshots a save or delete changes: the current one and, after a move, the previous one."""
+    course_ids = {get_course_id(instance), getattr(instance, '_previous_course_id', None)}
+    course_ids.discard(None)
+    return course_ids
+
+
+def is_cascaded_delete(instance, origin):
+    """True if instance was deleted along with a course tree object that invalidates the snapshot itself."""
+    if origin is None or origin is instance:
+        return False
+    origin_model = getattr(origin, 'model', type(origin))
+    return origin_model is not type(instance) and (origin_model is Course or origin_model in COURSE_LOOKUPS)
+
+
+@receiver(pre_save, sender=Module)
+@receiver(pre_save, sender=Section)
+@receiver(pre_save, sender=Quiz)
+@receiver(pre_save, sender=Question)
+@receiver(pre_save, sender=QuestionOption)
+def remember_previous_course(sender, instance, raw=False, **kwargs):
+    """
+    Record the course an existing object is being moved out of.
+
+    The post_save handlers only see the new parent, so without this the
+    course the object left would keep serving it from its snapshot and
+    search index.
+    """
+    instance._previous_course_id = None
+    if raw or instance.pk is None:
+        return
+    attname = COURSE_LOOKUPS[sender][0]
+    previous = sender.objects.filter(pk=instance.pk).values_list(attname, flat=True).first()
+    if previous is not None and previous != getattr(instance, attname):
+        instance._previous_course_id = get_parent_course_id(sender, previous)
+
+
+@receiver(post_save, sender=Course)
+@receiver(post_save, sender=Module)
+@receiver(post_save, sender=Section)
+@receiver(post_save, sender=Quiz)
+@receiver(post_save, sender=Question)
+@receiver(post_save, sender=QuestionOption)
+@receiver(post_delete, sender=Course)
+@receiver(post_delete, sender=Module)
+@receiver(post_delete, sender=Section)
+@receiver(post_delete, sender=Quiz)
+@receiver(post_delete, sender=Question)
+@receiver(post_delete, sender=QuestionOption)
+def invalidate_course_snapshot(sender, instance, origin=None, **kwargs):
+    if is_cascaded_delete(instance, origin):
+        return
+    for course_id in get_affected_course_ids(instance):
+        bump_version_on_commit(course_id)
+
+
+@receiver(post_save, sender=Course)
+@receiver(post_save, sender=Module)
+@receiver(post_save, sender=Section)
+@receiver(post_delete, sender=Module)
+@receiver(post_delete, sender=Section)
+def reindex_course_search(sender, instance, origin=None, **kwargs):
+    if is_cascaded_delete(instance, origin):
+        return
+    for course_id in get_affected_course_ids(instance):
+        update_search_vector_on_commit(course_id)
+
+
+@receiver(post_save, sender=Module)
+@receiver(post_save, sender=Quiz)
+def forget_moved_quiz_courses(sender, instance, **kwargs):
+    """Drop the cached quiz -> course mapping of a quiz, or of a module's quizzes, that moved."""
+    if getattr(instance, '_previous_course_id', None) is None:
+        return
+    if sender is Quiz:
+        forget_quiz_courses_on_commit([instance.pk])
+    else:
+        forget_quiz_courses_on_commit(list(Quiz.objects.filter(module_id=instance.pk).values_list('pk', flat=True)))
+
+
+@receiver(post_delete, sender=Quiz)
+def forget_deleted_quiz_course(sender, instance, **kwargs):
+    forget_quiz_courses_on_commit([instance.pk])
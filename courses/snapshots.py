@@ -0,0 +1,158 @@
+"""
+Versioned snapshots of serialized course trees.
+
+Each course has a version number in the shared cache. Any save or delete of
+the course or of anything in its tree bumps it (see courses.signals). The
+rendered JSON of a course endpoint is cached under the version it was built
+from and served as-is with ETag "<course id>.<version>.<kind tag>", where the
+kind tag tells apart the endpoints and fieldsets of one course. A matching
+If-None-Match gets 304 Not Modified. A warm read is therefore one or two
+cache lookups and no ORM work.
+
+Versions start from the current time in nanoseconds rather than 1. If a
+version key is evicted, the new one can therefore never match a snapshot
+or an ETag built from an older version.
+
+A snapshot is built single-flight: on a miss, one request renders it while
+concurrent requests for the same snapshot wait for the result, so a burst
+of readers after an edit costs one build.
+
+Changes that bypass model signals (QuerySet.update(), bulk_create()) must
+call bump_version() themselves.
+"""
+import hashlib
+import time
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.cache import parse_etags
+from rest_framework.renderers import JSONRenderer
+
+
+# How often a request waiting for another one's build checks for the result
+BUILD_POLL_SECONDS = 0.02
+
+
+def get_snapshot_ttl():
+    """Seconds a rendered snapshot is kept."""
+    return getattr(settings, 'COURSE_SNAPSHOT_TTL_SECONDS', 24 * 60 * 60)
+
+
+def get_build_wait():
+    """Seconds to wait for a concurrent build before building a snapshot anyway."""
+    return getattr(settings, 'COURSE_SNAPSHOT_BUILD_WAIT_SECONDS', 5)
+
+
+def _version_key(course_id):
+    return f'courses:snapshot_version:{course_id}'
+
+
+def get_version(course_id):
+    """Return the current snapshot version of a course, starting one if there is none."""
+    key = _version_key(course_id)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, time.time_ns(), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def bump_version(course_id):
+    """Invalidate every snapshot of a course."""
+    key = _version_key(course_id)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, time.time_ns(), timeout=None)
+
+
+def bump_version_on_commit(course_id):
+    """
+    Bump the version once the current transaction commits.
+
+    Bumping before the commit would let a concurrent reader build a snapshot
+    from the old rows and store it under the new version.
+    """
+    transaction.on_commit(lambda: bump_version(course_id))
+
+
+def get_kind_tag(kind):
+    """Short, ETag-safe tag of a representation name."""
+    return hashlib.sha256(kind.encode()).hexdigest()[:12]
+
+
+def get_or_build(key, build):
+    """
+    Return the rendered snapshot cached under key, building it once on a miss.
+
+    The request that wins a lock in the shared cache renders build() and
+    stores it. The others poll for the result, and build it themselves only
+    if the lock is released without a result (the build failed) or the wait
+    runs out.
+
+    Args:
+        key (str): Cache key of the snapshot
+        build (callable): Returns the data to render
+
+    Returns:
+        bytes: The rendered JSON
+    """
+    content = cache.get(key)
+    if content is not None:
+        return content
+
+    lock_key = f'{key}:building'
+    deadline = time.monotonic() + get_build_wait()
+    while True:
+        owner = cache.add(lock_key, True, timeout=get_build_wait())
+        if owner or time.monotonic() >= deadline:
+            try:
+                content = JSONRenderer().render(build())
+                cache.set(key, content, timeout=get_snapshot_ttl())
+            finally:
+                if owner:
+                    cache.delete(lock_key)
+            return content
+        while time.monotonic() < deadline:
+            time.sleep(BUILD_POLL_SECONDS)
+            content = cache.get(key)
+            if content is not None:
+                return content
+            if cache.get(lock_key) is None:
+                break
+
+
+def serve_snapshot(request, course_id, kind, build, variant=None):
+    """
+    Serve a cached rendering of a course endpoint with ETag validation.
+
+    Args:
+        request: The incoming request
+        course_id (int): Course the representation belongs to
+        kind (str): Name of the representation, e.g. 'detail' or 'modules', including
+            anything else the rendering depends on, such as the fieldset; must
+            already be validated, since a matching ETag skips the build
+        build (callable): Returns the data to render on a cache miss; may raise Http404
+        variant (tuple): Optional (tag, transform) to serve transform(rendering) instead
+            of the cached rendering; tag identifies the variant in the ETag
+
+    Returns:
+        HttpResponse: 200 with the JSON bytes, or 304
+    """
+    version = get_version(course_id)
+    etag = f'{course_id}.{version}.{get_kind_tag(kind)}'
+    etag = f'"{etag}"' if variant is None else f'"{etag}.{variant[0]}"'
+    headers = {'ETag': etag, 'Cache-Control': 'private, no-cache'}
+
+    if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+    if if_none_match:
+        etags = parse_etags(if_none_match)
+        if '*' in etags or etag in etags:
+            return HttpResponseNotModified(headers=headers)
+
+    # thumbnail_url is absolute, so the rendering depends on the host
+    content = get_or_build(f'courses:snapshot:{course_id}:{version}:{kind}:{request.get_host()}', build)
+    if variant is not None:
+        content = variant[1](content)
+    return HttpResponse(content, content_type='application/json', headers=headers)
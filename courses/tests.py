@@ -1,3 +1,627 @@
+import json
+import os
+import tempfile
+import threading
+import time
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+from .grading import answer_keys, get_answer_key
+from .models import Course, Module, Question, QuestionOption, Quiz, Section, UserQuizResponse
+from .search import trigram_available
+from .snapshots import get_or_build, get_version
 
-# Create your tests here.
+User = get_user_model()
+
+
+def create_course_tree(title, modules=3, sections=4, questions=3, options=4):
+    course = Course.objects.create(title=title, level='beginner', estimated_duration=60)
+    for module_number in range(modules, 0, -1):
+        module = Module.objects.create(course=course, title=f'{title} M{module_number}', order_number=module_number)
+        for section_number in range(sections, 0, -1):
+            Section.objects.create(
+                module=module,
+                title=f'S{section_number}',
+                content_type='text',
+                order_number=section_number
+            )
+        quiz = Quiz.objects.create(module=module, title=f'{title} Q{module_number}')
+        for question_number in range(1, questions + 1):
+            question = Question.objects.create(
+                quiz=quiz,
+                question_text=f'Question {question_number}',
+                order_number=question_number
+            )
+            QuestionOption.objects.bulk_create([
+                QuestionOption(
+                    question=question,
+                    option_text=f'Option {option_number}',
+                    is_correct=option_number == 1,
+                    order_number=option_number
+                )
+                for option_number in range(options, 0, -1)
+            ])
+    return course
+
+
+class CourseTreeQueryCountTests(TestCase):
+    # courses, modules with their quiz, sections, questions, options
+    TREE_QUERIES = 5
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(
+            User.objects.create_user(email='learner@example.com', username='learner', name='Learner', password='password')
+        )
+        create_course_tree('Alpha')
+        # A module without a quiz must not cost a query of its own
+        Module.objects.create(course=create_course_tree('Beta'), title='Beta extra', order_number=10)
+
+    def test_course_list_query_count_does_not_grow_with_the_tree(self):
+        with self.assertNumQueries(self.TREE_QUERIES):
+            response = self.client.get('/api/courses/courses/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data), 2)
+
+        create_course_tree('Gamma', modules=5, sections=6)
+        with self.assertNumQueries(self.TREE_QUERIES):
+            response = self.client.get('/api/courses/courses/')
+        self.assertEqual(len(response.data), 3)
+
+    def test_course_tree_is_ordered(self):
+        response = self.client.get('/api/courses/courses/')
+        alpha = response.data[0]
+        self.assertIsNone(alpha['thumbnail_url'])
+        self.assertEqual([module['order_number'] for module in alpha['modules']], [1, 2, 3])
+        module = alpha['modules'][0]
+        self.assertEqual([section['order_number'] for section in module['sections']], [1, 2, 3, 4])
+        question = module['quiz']['questions'][0]
+        self.assertEqual([option['order_number'] for option in question['options']], [1, 2, 3, 4])
+        self.assertIsNone(response.data[1]['modules'][-1]['quiz'])
+
+    def test_course_detail_and_modules_action_query_count(self):
+        course = Course.objects.get(title='Alpha')
+        with self.assertNumQueries(self.TREE_QUERIES):
+            self.client.get(f'/api/courses/courses/{course.pk}/')
+        with self.assertNumQueries(self.TREE_QUERIES):
+            response = self.client.get(f'/api/courses/courses/{course.pk}/modules/')
+        self.assertEqual(len(json.loads(response.content)), 3)
+
+    def test_module_list_query_count(self):
+        # modules with their quiz, sections, questions, options
+        with self.assertNumQueries(self.TREE_QUERIES - 1):
+            response = self.client.get('/api/courses/modules/')
+        self.assertEqual(len(response.data), 7)
+
+
+
+class SparseFieldsetTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(
+            User.objects.create_user(email='learner@example.com', username='learner', name='Learner', password='password')
+        )
+        self.course = create_course_tree('Alpha', modules=2, sections=2, questions=1, options=2)
+        create_course_tree('Beta', modules=1, sections=1, questions=1, options=1)
+
+    def test_fields_prune_output_and_columns(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/courses/courses/', {'fields': 'id,title'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data[0], {'id': self.course.pk, 'title': 'Alpha'})
+        self.assertEqual(len(queries), 1)
+        self.assertNotIn('"description"', queries[0]['sql'])
+
+    def test_depth_zero_skips_nested_levels(self):
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/courses/courses/', {'depth': 0})
+        self.assertNotIn('modules', response.data[0])
+        self.assertIn('thumbnail_url', response.data[0])
+
+    def test_dotted_fields_select_nested_fields(self):
+        # courses, modules, sections; no quiz join or question/option queries
+        with self.assertNumQueries(3):
+            response = self.client.get('/api/courses/courses/', {'fields': 'title,modules.title,modules.sections.id'})
+        module = response.data[0]['modules'][0]
+        self.assertEqual(set(module), {'title', 'sections'})
+        self.assertEqual(set(module['sections'][0]), {'id'})
+
+    def test_depth_limits_selected_nesting(self):
+        response = self.client.get('/api/courses/modules/', {'fields': 'id,sections,quiz', 'depth': 1})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(set(response.data[0]), {'id', 'sections', 'quiz'})
+        self.assertNotIn('questions', response.data[0]['quiz'])
+
+    def test_unknown_fields_and_bad_depth_are_rejected(self):
+        for params in ({'fields': 'id,nope'}, {'fields': 'title.id'}, {'fields': 'modules.nope'}, {'depth': 'x'}):
+            response = self.client.get('/api/courses/courses/', params)
+            self.assertEqual(response.status_code, 400, params)
+        self.assertEqual(self.client.get('/api/courses/sections/', {'fields': 'id,content'}).status_code, 200)
+
+    def test_snapshots_are_kept_per_fieldset(self):
+        url = f'/api/courses/courses/{self.course.pk}/'
+        full = json.loads(self.client.get(url).content)
+        sparse = json.loads(self.client.get(url, {'fields': 'id,modules.title'}).content)
+        self.assertIn('description', full)
+        self.assertEqual(sparse, {'id': self.course.pk, 'modules': [{'title': 'Alpha M1'}, {'title': 'Alpha M2'}]})
+
+        modules = json.loads(self.client.get(f'{url}modules/', {'fields': 'id', 'depth': 0}).content)
+        self.assertEqual([set(module) for module in modules], [{'id'}, {'id'}])
+
+    def test_etags_differ_per_kind_and_fieldset(self):
+        url = f'/api/courses/courses/{self.course.pk}/'
+        etags = {
+            self.client.get(url)['ETag'],
+            self.client.get(url, {'fields': 'id'})['ETag'],
+            self.client.get(f'{url}modules/')['ETag'],
+            self.client.get(f'{url}modules/', {'fields': 'id'})['ETag'],
+        }
+        self.assertEqual(len(etags), 4)
+        full = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, {'fields': 'id'}, HTTP_IF_NONE_MATCH=full).status_code, 200)
+
+    def test_unknown_fields_are_rejected_before_etag_match(self):
+        url = f'/api/courses/courses/{self.course.pk}/'
+        etag = self.client.get(url, {'fields': 'id'})['ETag']
+        response = self.client.get(url, {'fields': 'id,nope'}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 400)
+
+class CourseSnapshotTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(
+            User.objects.create_user(email='learner@example.com', username='learner', name='Learner', password='password')
+        )
+        self.course = create_course_tree('Alpha', modules=2, sections=2, questions=1, options=2)
+        self.url = f'/api/courses/courses/{self.course.pk}/'
+
+    def test_warm_read_needs_no_queries(self):
+        first = self.client.get(self.url)
+        self.assertEqual(first.status_code, 200)
+        with self.assertNumQueries(0):
+            second = self.client.get(self.url)
+        self.assertEqual(second.content, first.content)
+        self.assertEqual(second['ETag'], first['ETag'])
+        self.assertEqual(json.loads(second.content)['title'], 'Alpha')
+
+    def test_matching_etag_returns_304(self):
+        etag = self.client.get(self.url)['ETag']
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH='"stale"').status_code, 200)
+
+    def test_change_anywhere_in_the_tree_invalidates_the_snapshot(self):
+        modules_url = f'{self.url}modules/'
+        etag = self.client.get(self.url)['ETag']
+        modules_etag = self.client.get(modules_url)['ETag']
+
+        option = QuestionOption.objects.filter(question__quiz__module__course=self.course).first()
+        option.option_text = 'Changed'
+        with self.captureOnCommitCallbacks(execute=True):
+            option.save()
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'Changed', response.content)
+        self.assertNotEqual(self.client.get(modules_url)['ETag'], modules_etag)
+
+        etag = response['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            Section.objects.filter(module__course=self.course).first().delete()
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_moving_a_module_invalidates_both_courses(self):
+        other = create_course_tree('Beta', modules=1, sections=1, questions=1, options=1)
+        other_url = f'/api/courses/courses/{other.pk}/'
+        etag = self.client.get(self.url)['ETag']
+        other_etag = self.client.get(other_url)['ETag']
+
+        module = Module.objects.filter(course=self.course).first()
+        module.course = other
+        module.order_number = 2
+        with self.captureOnCommitCallbacks(execute=True):
+            module.save()
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(json.loads(response.content)['modules']), 1)
+        response = self.client.get(other_url, HTTP_IF_NONE_MATCH=other_etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(json.loads(response.content)['modules']), 2)
+
+    def test_moving_a_section_invalidates_the_old_course(self):
+        other = create_course_tree('Beta', modules=1, sections=1, questions=1, options=1)
+        etag = self.client.get(self.url)['ETag']
+        section = Section.objects.filter(module__course=self.course).first()
+        section.module = Module.objects.get(course=other)
+        section.order_number = 2
+        with self.captureOnCommitCallbacks(execute=True):
+            section.save()
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_other_courses_are_not_invalidated(self):
+        other = create_course_tree('Beta', modules=1, sections=1, questions=1, options=1)
+        etag = self.client.get(self.url)['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            Module.objects.filter(course=other).first().delete()
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+    def test_unknown_course_is_404(self):
+        self.assertEqual(self.client.get('/api/courses/courses/999999/').status_code, 404)
+        self.assertEqual(self.client.get('/api/courses/courses/abc/').status_code, 404)
+
+
+class CourseSearchTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(
+            User.objects.create_user(email='learner@example.com', username='learner', name='Learner', password='password')
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            self.python = Course.objects.create(
+                title='Python Programming', level='beginner', estimated_duration=60,
+                description='Learn to write programs in Python from scratch.'
+            )
+            self.data = Course.objects.create(
+                title='Data Analysis', level='intermediate', estimated_duration=60,
+                description='Clean and explore datasets.'
+            )
+            module = Module.objects.create(course=self.data, title='Tooling', order_number=1)
+            self.section = Section.objects.create(
+                module=module, title='Notebooks', content_type='text', order_number=1,
+                content='We use pandas, a Python library, throughout.'
+            )
+
+    def search(self, text, **params):
+        response = self.client.get('/api/courses/courses/search/', {'q': text, **params})
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_title_matches_rank_above_section_content(self):
+        data = self.search('python')
+        self.assertEqual(data['match'], 'fulltext')
+        self.assertEqual([hit['id'] for hit in data['results']], [self.python.pk, self.data.pk])
+        self.assertIn('<mark>Python</mark>', data['results'][0]['headline'])
+
+    def test_terms_are_stemmed(self):
+        self.assertEqual([hit['id'] for hit in self.search('program')['results']], [self.python.pk])
+
+    def test_vector_follows_content_changes(self):
+        self.assertEqual(self.search('matplotlib')['results'], [])
+        self.section.content = 'Plotting with matplotlib.'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.section.save()
+        self.assertEqual([hit['id'] for hit in self.search('matplotlib')['results']], [self.data.pk])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.section.module.delete()
+        self.assertEqual(self.search('matplotlib')['results'], [])
+
+    def test_moved_section_is_reindexed_under_both_courses(self):
+        module = Module.objects.create(course=self.python, title='Basics', order_number=1)
+        self.section.module = module
+        with self.captureOnCommitCallbacks(execute=True):
+            self.section.save()
+        self.assertEqual([hit['id'] for hit in self.search('pandas')['results']], [self.python.pk])
+
+    def test_list_search_param_uses_full_text(self):
+        response = self.client.get('/api/courses/courses/', {'search': 'datasets'})
+        self.assertEqual([course['id'] for course in response.data], [self.data.pk])
+
+    def test_query_is_required(self):
+        self.assertEqual(self.client.get('/api/courses/courses/search/').status_code, 400)
+
+    def test_misspelt_title_falls_back_to_trigram_match(self):
+        if not trigram_available():
+            self.skipTest('pg_trgm is not installed')
+        data = self.search('pythn')
+        self.assertEqual(data['match'], 'fuzzy')
+        self.assertEqual(data['results'][0]['id'], self.python.pk)
+
+
+class ImportCoursesTests(TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def write(self, name, text):
+        path = os.path.join(self.directory.name, name)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(text)
+        return path
+
+    def bundle(self, sections=('Intro', 'Loops'), title='Python 101'):
+        return {
+            'external_id': 'py101', 'title': title, 'level': 'beginner', 'estimated_duration': 90,
+            'modules': [
+                {
+                    'title': 'Basics',
+                    'sections': [{'title': name, 'content_type': 'text', 'content': f'{name} text'} for name in sections],
+                    'quiz': {'title': 'Check', 'questions': [
+                        {'question_text': '2 + 2?', 'options': [{'option_text': '4', 'is_correct': True}, {'option_text': '5'}]}
+                    ]},
+                },
+                {'title': 'Functions'},
+            ],
+        }
+
+    def run_import(self, path, *args):
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('import_courses', path, *args, stdout=open(os.devnull, 'w'), stderr=open(os.devnull, 'w'))
+
+    def test_jsonl_and_json_array_import_whole_tree(self):
+        other = {'external_id': 'js101', 'title': 'JavaScript', 'level': 'advanced', 'estimated_duration': 30}
+        self.run_import(self.write('a.jsonl', f'{json.dumps(self.bundle())}\n\n{json.dumps(other)}\n'))
+        course = Course.objects.get(external_id='py101')
+        self.assertEqual(Course.objects.count(), 2)
+        self.assertEqual(
+            list(Section.objects.filter(module__course=course).values_list('external_id', 'order_number')),
+            [('py101.m1.s1', 1), ('py101.m1.s2', 2)]
+        )
+        self.assertEqual(QuestionOption.objects.filter(question__quiz__module__course=course, is_correct=True).count(), 1)
+        self.assertTrue(Course.objects.filter(search_vector='loops').exists())
+
+        bundle = self.bundle()
+        bundle['external_id'] = 'py102'
+        self.run_import(self.write('b.json', json.dumps([bundle] * 1)))
+        self.assertEqual(Module.objects.filter(course__external_id='py102').count(), 2)
+
+    def test_yaml_documents(self):
+        path = self.write('a.yaml', (
+            '---\n'
+            'external_id: c1\ntitle: One\nlevel: beginner\nestimated_duration: 10\n'
+            '---\n'
+            '- {external_id: c2, title: Two, level: beginner, estimated_duration: 10, modules: [{title: M}]}\n'
+        ))
+        self.run_import(path)
+        self.assertEqual(Module.objects.get().external_id, 'c2.m1')
+
+    def test_invalid_bundle_writes_nothing(self):
+        bundle = self.bundle()
+        bundle['modules'][0]['sections'][1]['order_number'] = 1
+        bundle['modules'][1]['colour'] = 'red'
+        broken = {'title': 'No level', 'estimated_duration': 10}
+        path = self.write('a.jsonl', f'{json.dumps(bundle)}\n{json.dumps(broken)}\n')
+        # duplicate order_number (and so derived external_id), unknown field, missing level
+        with self.assertRaisesMessage(CommandError, '4 error(s)'):
+            self.run_import(path)
+        self.assertFalse(Course.objects.exists())
+
+        self.run_import(self.write('b.json', json.dumps(self.bundle())))
+        with self.assertRaisesMessage(CommandError, 'nothing was imported'):
+            self.run_import(self.write('c.json', json.dumps(self.bundle())))
+
+    def test_upsert_updates_and_prunes_the_tree(self):
+        self.run_import(self.write('a.json', json.dumps(self.bundle())))
+        course = Course.objects.get()
+        section = Section.objects.get(external_id='py101.m1.s2')
+        version = get_version(course.pk)
+
+        bundle = self.bundle(sections=('Loops',), title='Python 101, revised')
+        bundle['modules'].reverse()
+        del bundle['modules'][1]['quiz']
+        self.run_import(self.write('b.json', json.dumps(bundle)), '--upsert')
+
+        course.refresh_from_db()
+        self.assertEqual(course.title, 'Python 101, revised')
+        self.assertNotEqual(get_version(course.pk), version)
+        self.assertEqual(
+            list(course.modules.values_list('title', 'external_id')),
+            [('Functions', 'py101.m1'), ('Basics', 'py101.m2')]
+        )
+        # Rows are matched on their derived id, so "Loops" now updates s1 and s2 is gone
+        self.assertEqual(list(Section.objects.values_list('external_id', 'title')), [('py101.m2.s1', 'Loops')])
+        self.assertFalse(Section.objects.filter(pk=section.pk).exists())
+        self.assertFalse(Quiz.objects.exists())
+
+        with self.assertRaisesMessage(CommandError, '1 error(s)'):
+            self.run_import(self.write('c.json', json.dumps({'title': 'No id', 'level': 'beginner'})), '--upsert')
+
+
+class QuizGradingTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        answer_keys.clear()
+        self.user = User.objects.create_user(
+            email='learner@example.com', username='learner', name='Learner', password='password'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        course = create_course_tree('Alpha', modules=1, sections=1, questions=2, options=3)
+        self.quiz = Quiz.objects.get(module__course=course)
+        self.single, self.multiple = self.quiz.questions.order_by('order_number')
+        self.multiple.question_type = 'multiple_choice'
+        self.multiple.points = 3
+        self.multiple.save()
+        self.multiple.options.filter(order_number=2).update(is_correct=True)
+        self.multiple.options.filter(order_number=1).update(feedback='Right')
+        self.short = Question.objects.create(
+            quiz=self.quiz, question_text='Capital of France?', question_type='short_answer', order_number=3
+        )
+        QuestionOption.objects.create(question=self.short, option_text='Paris', is_correct=True, order_number=1)
+        self.url = f'/api/progress/quizzes/{self.quiz.pk}/attempts/'
+
+    def option(self, question, order_number):
+        return question.options.get(order_number=order_number).pk
+
+    def submit(self, responses, **extra):
+        return self.client.post(self.url, {
+            'quiz': self.quiz.pk, 'time_taken': 30, 'responses': responses, **extra
+        }, format='json')
+
+    def test_attempt_is_graded_server_side(self):
+        response = self.submit([
+            {'question': self.single.pk, 'selected_options': [self.option(self.single, 1)]},
+            {'question': self.multiple.pk, 'selected_options': [self.option(self.multiple, 1), self.option(self.multiple, 2)]},
+            {'question': self.short.pk, 'text_response': '  paris '},
+        ], score=0)
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertEqual(response.data['score'], 100.0)
+        self.assertTrue(response.data['passed'])
+        self.assertEqual((response.data['points'], response.data['total_points']), (5, 5))
+        self.assertEqual(response.data['results'][1]['feedback'], 'Right')
+
+        # A partially wrong multiple choice and an unanswered question score nothing
+        response = self.submit([
+            {'question': self.single.pk, 'selected_options': [self.option(self.single, 1)]},
+            {'question': self.multiple.pk, 'selected_options': [self.option(self.multiple, 1)]},
+        ], score=100)
+        self.assertEqual(response.data['score'], 20.0)
+        self.assertFalse(response.data['passed'])
+        self.assertEqual(
+            [result['is_correct'] for result in response.data['results']], [True, False, False]
+        )
+
+        attempt = self.user.course_quiz_attempts.order_by('pk').last()
+        self.assertEqual(attempt.score, 20.0)
+        responses = UserQuizResponse.objects.filter(attempt=attempt).order_by('question__order_number')
+        self.assertEqual([row.points_earned for row in responses], [1, 0, 0])
+        self.assertEqual(list(responses[1].selected_options.values_list('pk', flat=True)), [self.option(self.multiple, 1)])
+
+    def test_invalid_responses_are_rejected(self):
+        create_course_tree('Beta', modules=1, sections=1, questions=1, options=2)
+        other = Question.objects.exclude(quiz=self.quiz).get()
+        for responses in (
+            [{'question': other.pk, 'selected_options': [self.option(other, 1)]}],
+            [{'question': self.single.pk, 'selected_options': [self.option(self.multiple, 1)]}],
+            [{'question': self.single.pk, 'selected_options': [self.option(self.single, 1), self.option(self.single, 2)]}],
+            [{'question': self.single.pk}, {'question': self.single.pk}],
+        ):
+            response = self.submit(responses)
+            self.assertEqual(response.status_code, 400, responses)
+            self.assertIn('responses', response.data)
+        self.assertFalse(UserQuizResponse.objects.exists())
+
+    def test_answer_key_is_cached_until_the_quiz_changes(self):
+        key = get_answer_key(self.quiz.pk)
+        self.assertEqual([question.id for question in key.questions], [self.single.pk, self.multiple.pk, self.short.pk])
+        with self.assertNumQueries(0):
+            self.assertIs(get_answer_key(self.quiz.pk), key)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.short.is_active = False
+            self.short.save()
+        key = get_answer_key(self.quiz.pk)
+        self.assertEqual(key.total_points, 4)
+        self.assertNotIn(self.short.pk, key.by_id)
+
+        # Submitting costs no answer-key queries once the key is compiled
+        payload = [{'question': self.single.pk, 'selected_options': [self.option(self.single, 1)]}]
+        self.submit(payload)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.submit(payload).status_code, 201)
+        self.assertFalse([query for query in queries if 'FROM "courses_questionoption"' in query['sql']])
+
+
+class QuizDeliveryTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            email='learner@example.com', username='learner', name='Learner', password='password'
+        )
+        self.client.force_authenticate(self.user)
+        course = create_course_tree('Alpha', modules=1, sections=1, questions=8, options=4)
+        self.quiz = Quiz.objects.get(module__course=course)
+        QuestionOption.objects.filter(question__quiz=self.quiz).update(feedback='Because')
+        short = Question.objects.create(
+            quiz=self.quiz, question_text='Capital of France?', question_type='short_answer', order_number=9
+        )
+        QuestionOption.objects.create(question=short, option_text='Paris', is_correct=True, order_number=1)
+        Question.objects.create(quiz=self.quiz, question_text='Retired', order_number=10, is_active=False)
+        self.url = f'/api/courses/quizzes/{self.quiz.pk}/delivery/'
+
+    def test_payload_has_no_answers(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        data = json.loads(response.content)
+        self.assertEqual([question['order_number'] for question in data['questions']], list(range(1, 10)))
+        self.assertEqual(data['questions'][-1]['options'], [])
+        self.assertEqual(set(data['questions'][0]['options'][0]), {'id', 'option_text', 'order_number'})
+        for text in (b'is_correct', b'Because', b'Paris', b'explanation', b'Retired'):
+            self.assertNotIn(text, response.content)
+
+    def test_warm_read_needs_no_queries_and_edits_invalidate(self):
+        etag = self.client.get(self.url)['ETag']
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url)
+        self.assertEqual(response['ETag'], etag)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Question.objects.filter(quiz=self.quiz, order_number=1).get().delete()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(json.loads(response.content)['questions']), 8)
+
+    def test_moving_the_module_follows_the_new_course(self):
+        etag = self.client.get(self.url)['ETag']
+        other = Course.objects.create(title='Beta', level='beginner', estimated_duration=60)
+        module = self.quiz.module
+        module.course = other
+        with self.captureOnCommitCallbacks(execute=True):
+            module.save()
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['ETag'].startswith(f'"{other.pk}.'))
+
+        # Edits to the new course now invalidate the delivery
+        etag = response['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            Question.objects.filter(quiz=self.quiz, order_number=1).get().delete()
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_shuffle_is_stable_per_attempt(self):
+        plain = json.loads(self.client.get(self.url).content)
+        first = self.client.get(self.url, {'shuffle': 'true', 'attempt': '1'})
+        again = self.client.get(self.url, {'shuffle': 'true', 'attempt': '1'})
+        other = self.client.get(self.url, {'shuffle': 'true', 'attempt': '2'})
+        self.assertEqual(first.content, again.content)
+        self.assertEqual(first['ETag'], again['ETag'])
+        self.assertNotEqual(first['ETag'], other['ETag'])
+        self.assertNotEqual(first.content, other.content)
+
+        def order(data):
+            return [(question['id'], [option['id'] for option in question['options']]) for question in data['questions']]
+
+        shuffled = json.loads(first.content)
+        self.assertNotEqual(order(shuffled), order(plain))
+        self.assertEqual(
+            {(question_id, tuple(sorted(option_ids))) for question_id, option_ids in order(shuffled)},
+            {(question_id, tuple(sorted(option_ids))) for question_id, option_ids in order(plain)}
+        )
+
+    def test_unknown_quiz_is_404(self):
+        self.assertEqual(self.client.get('/api/courses/quizzes/999999/delivery/').status_code, 404)
+        self.assertEqual(self.client.get('/api/courses/quizzes/abc/delivery/').status_code, 404)
+
+    def test_concurrent_misses_build_once(self):
+        builds = []
+
+        def build():
+            builds.append(None)
+            time.sleep(0.2)
+            return {'built': True}
+
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(get_or_build('courses:test:herd', build)))
+            for _ in range(8)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(builds), 1)
+        self.assertEqual(results, [b'{"built":true}'] * 8)
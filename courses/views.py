@@ -1,41 +1,103 @@
 # Create your views here.
 
+from django.conf import settings
+from django.http import Http404
 from rest_framework import viewsets, status, permissions, filters
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from django_filters.rest_framework import DjangoFilterBackend
 from .models import Course, Module, Section, Quiz, Question, QuestionOption
+from .delivery import (
+    ATTEMPT_PARAM, SHUFFLE_PARAM, build_delivery, get_quiz_course_id, get_shuffle_seed, shuffle_delivery
+)
+from .fieldsets import SparseFieldsetMixin
+from .prefetch import get_ordering, plan_queryset, with_question_tree, with_quiz_tree
+from .search import FullTextSearchFilter, search_courses
+from .snapshots import serve_snapshot
 from .serializers import (
-    CourseSerializer, ModuleSerializer, SectionSerializer,
+    CourseSerializer, CourseSearchResultSerializer, ModuleSerializer, SectionSerializer,
     QuizSerializer, QuestionSerializer, QuestionOptionSerializer
 )
 
-class CourseViewSet(viewsets.ModelViewSet):
+class CourseViewSet(SparseFieldsetMixin, viewsets.ModelViewSet):
     """
     API endpoint that allows courses to be viewed or edited.
+    Reads take ?fields= and ?depth= (see courses.fieldsets).
     """
     queryset = Course.objects.all()
     serializer_class = CourseSerializer
     permission_classes = [permissions.IsAuthenticated]
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    # FullTextSearchFilter comes last so ranking wins over the default ordering
+    filter_backends = [DjangoFilterBackend, filters.OrderingFilter, FullTextSearchFilter]
     filterset_fields = ['level']
-    search_fields = ['title', 'description']
     ordering_fields = ['title', 'created_at', 'updated_at']
     ordering = ['title']
+    sparse_actions = ('list', 'retrieve', 'modules')
+
+    def get_queryset(self):
+        if self.action == 'modules':
+            # ?fields= applies to the modules, which are loaded by the action
+            return Course.objects.only('pk')
+        return super().get_queryset()
+
+    def retrieve(self, request, *args, **kwargs):
+        """
+        Get a course with its whole tree, served from the course snapshot
+        """
+        return self.serve_snapshot(request, 'detail', CourseSerializer, lambda course: self.get_serializer(course).data)
 
     @action(detail=True, methods=['get'])
     def modules(self, request, pk=None):
         """
-        Get all modules for a specific course
+        Get all modules for a specific course, served from the course snapshot
         """
-        course = self.get_object()
-        modules = course.modules.all().order_by('order_number')
-        serializer = ModuleSerializer(modules, many=True, context={'request': request})
-        return Response(serializer.data)
+        def serialize(course):
+            serializer = self.sparse(ModuleSerializer(many=True, context=self.get_serializer_context()))
+            serializer.instance = plan_queryset(course.modules.order_by(*get_ordering(Module)), serializer.child)
+            return serializer.data
+
+        return self.serve_snapshot(request, 'modules', ModuleSerializer, serialize)
+
+    @action(detail=False, methods=['get'])
+    def search(self, request):
+        """
+        Ranked full-text search over course, module and section text: ?q=<terms>&limit=<n>
+        """
+        text = request.query_params.get('q', '').strip()
+        if not text:
+            return Response(
+                {"status": "error", "message": "The q parameter is required"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        max_results = getattr(settings, 'COURSE_SEARCH_MAX_RESULTS', 50)
+        try:
+            limit = min(max(int(request.query_params.get('limit', 20)), 1), max_results)
+        except ValueError:
+            limit = 20
+
+        queryset = DjangoFilterBackend().filter_queryset(request, Course.objects.all(), self)
+        results, match = search_courses(queryset, text)
+        return Response({
+            "query": text,
+            "match": match,
+            "results": CourseSearchResultSerializer(results[:limit], many=True).data
+        })
+
+    def serve_snapshot(self, request, kind, serializer_class, serialize):
+        pk = self.kwargs[self.lookup_url_kwarg or self.lookup_field]
+        if not str(pk).isdigit():
+            raise Http404
+        fieldset = self.get_fieldset_key()
+        if fieldset:
+            # Unknown fields get their 400 before a matching ETag can answer 304
+            self.sparse(serializer_class(context=self.get_serializer_context()))
+            kind = f'{kind}:{fieldset}'
+        return serve_snapshot(request, int(pk), kind, lambda: serialize(self.get_object()))
 
-class ModuleViewSet(viewsets.ModelViewSet):
+class ModuleViewSet(SparseFieldsetMixin, viewsets.ModelViewSet):
     """
     API endpoint that allows modules to be viewed or edited.
+    Reads take ?fields= and ?depth= (see courses.fieldsets).
     """
     queryset = Module.objects.all()
     serializer_class = ModuleSerializer
@@ -51,13 +113,14 @@ class ModuleViewSet(viewsets.ModelViewSet):
         Get all sections for a specific module
         """
         module = self.get_object()
-        sections = module.sections.all().order_by('order_number')
+        sections = module.sections.all()
         serializer = SectionSerializer(sections, many=True, context={'request': request})
         return Response(serializer.data)
 
-class SectionViewSet(viewsets.ModelViewSet):
+class SectionViewSet(SparseFieldsetMixin, viewsets.ModelViewSet):
     """
     API endpoint that allows sections to be viewed or edited.
+    Reads take ?fields= (see courses.fieldsets).
     """
     queryset = Section.objects.all()
     serializer_class = SectionSerializer
@@ -71,7 +134,7 @@ class QuizViewSet(viewsets.ModelViewSet):
     """
     API endpoint that allows quizzes to be viewed or edited.
     """
-    queryset = Quiz.objects.all()
+    queryset = with_quiz_tree(Quiz.objects.all())
     serializer_class = QuizSerializer
     permission_classes = [permissions.IsAuthenticated]
     filter_backends = [DjangoFilterBackend]
@@ -83,15 +146,32 @@ class QuizViewSet(viewsets.ModelViewSet):
         Get all questions for a specific quiz
         """
         quiz = self.get_object()
-        questions = quiz.questions.all().order_by('order_number')
+        questions = quiz.questions.all()
         serializer = QuestionSerializer(questions, many=True, context={'request': request})
         return Response(serializer.data)
 
+    @action(detail=True, methods=['get'])
+    def delivery(self, request, pk=None):
+        """
+        Get the quiz as learners take it, without answers, served from the course snapshot.
+        ?shuffle=true&attempt=<id> shuffles questions and options per attempt (see courses.delivery)
+        """
+        if not str(pk).isdigit():
+            raise Http404
+        quiz_id = int(pk)
+        variant = None
+        if request.query_params.get(SHUFFLE_PARAM, '').lower() in ('1', 'true', 'yes'):
+            seed = get_shuffle_seed(quiz_id, request.user.pk, request.query_params.get(ATTEMPT_PARAM, ''))
+            variant = (f'{seed:016x}', lambda content: shuffle_delivery(content, seed))
+        return serve_snapshot(
+            request, get_quiz_course_id(quiz_id), f'delivery:{quiz_id}', lambda: build_delivery(quiz_id), variant
+        )
+
 class QuestionViewSet(viewsets.ModelViewSet):
     """
     API endpoint that allows questions to be viewed or edited.
     """
-    queryset = Question.objects.all()
+    queryset = with_question_tree(Question.objects.all())
     serializer_class = QuestionSerializer
     permission_classes = [permissions.IsAuthenticated]
     filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
@@ -105,7 +185,7 @@ class QuestionViewSet(viewsets.ModelViewSet):
         Get all options for a specific question
         """
         question = self.get_object()
-        options = question.options.all().order_by('order_number')
+        options = question.options.all()
         serializer = QuestionOptionSerializer(options, many=True, context={'request': request})
         return Response(serializer.data)
 
@@ -0,0 +1,7 @@
+from django.apps import AppConfig
+
+
+class PerfdataConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'perfdata'
+    verbose_name = 'Performance test data'
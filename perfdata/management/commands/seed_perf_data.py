@@ -0,0 +1,58 @@
+import time
+from django.core.management.base import BaseCommand, CommandError
+from ...seeding import EMAIL_DOMAIN, PASSWORD, clear, exists, seed
+
+
+class Command(BaseCommand):
+    help = (
+        'Generate a production-shaped dataset for benchmarks and load tests: users with profiles, '
+        'course trees, progress, quiz attempts, attendance, job listings, matches and chat messages. '
+        f'Users are <name>@{EMAIL_DOMAIN} with password "{PASSWORD}".'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=20000, help='Users (default: 20000)')
+        parser.add_argument('--courses', type=int, default=60, help='Courses (default: 60)')
+        parser.add_argument('--jobs', type=int, default=2000, help='Job listings (default: 2000)')
+        parser.add_argument(
+            '--months', type=int, default=6,
+            help='Months of activity and weekly attendance sessions (default: 6)'
+        )
+        parser.add_argument('--modules', type=int, default=8, help='Mean modules per course (default: 8)')
+        parser.add_argument('--sections', type=int, default=10, help='Mean sections per module (default: 10)')
+        parser.add_argument('--questions', type=int, default=5, help='Mean questions per quiz (default: 5)')
+        parser.add_argument('--seed', type=int, default=42, help='Random seed (default: 42)')
+        parser.add_argument('--reset', action='store_true', help='Remove a previously seeded dataset first')
+        parser.add_argument('--clear', action='store_true', help='Only remove the seeded dataset')
+
+    def handle(self, *args, **options):
+        for name in ('users', 'courses', 'months', 'modules', 'sections', 'questions'):
+            if options[name] < 1:
+                raise CommandError(f'--{name} must be at least 1')
+
+        if options['clear'] or options['reset']:
+            start = time.perf_counter()
+            deleted = clear()
+            self.stdout.write(f'Removed {deleted} seeded rows in {time.perf_counter() - start:.1f}s')
+            if options['clear']:
+                return
+        elif exists():
+            raise CommandError('A seeded dataset already exists; use --reset to replace it')
+
+        start = time.perf_counter()
+        counts = seed(
+            users=options['users'],
+            courses=options['courses'],
+            jobs=options['jobs'],
+            months=options['months'],
+            modules=options['modules'],
+            sections=options['sections'],
+            questions=options['questions'],
+            seed_value=options['seed'],
+            log=self.stdout.write,
+        )
+        elapsed = time.perf_counter() - start
+        rows = sum(counts.values())
+        self.stdout.write(self.style.SUCCESS(
+            f'Seeded {rows:,} rows in {elapsed:.1f}s ({rows / elapsed:,.0f} rows/s)'
+        ))
@@ -0,0 +1,680 @@
+"""
+Synthetic, production-shaped dataset for benchmarks and load tests.
+
+seed() fills the database with users and everything they produce:
+profiles, course trees, enrollments, section and module progress, quiz
+attempts, attendance records, job listings, match results and chat
+messages. The shapes follow what the real data looks like rather than
+uniform noise:
+* course popularity follows a Zipf law, so a few courses hold most students;
+* progress through a course follows Beta(0.8, 1.6), so most learners stop early
+  and few finish;
+* quiz scores are normal around 72 and learners retry until they pass;
+* attendance is one weekly session per course over the last `months` months,
+  mostly present, with a tail of late, absent and excused marks;
+* chat activity per user is log-normal.
+
+Everything is derived from one random seed, so a run is reproducible.
+
+The large tables are written with COPY, and the rest with bulk_create where
+the primary keys are needed for the next level. Seeded rows are marked so
+clear() can remove them: users have @perfdata.invalid emails, and courses
+and job listings have external ids starting with "perf-". Every user can log
+in with PASSWORD.
+
+Like any bulk load, this bypasses model signals. seed() rebuilds the search
+vectors of the new courses and folds the new attendance into the rollups
+itself.
+"""
+import io
+import json
+import logging
+import math
+import random
+import time
+import uuid
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.contrib.postgres.fields import ArrayField
+from django.core.exceptions import EmptyResultSet
+from django.db import connection, models, transaction
+from django.db.models import Q
+from django.db.models.fields import AutoFieldMixin
+from django.utils import timezone
+from attendance.models import (
+    ArchivedAttendanceRecord,
+    AttendanceRecord,
+    SessionAttendanceSummary,
+    SpocDeadLetter,
+    SpocSyncOutbox,
+    StudentDailyAttendance,
+)
+from attendance.rollups import run_rollup
+from chatbot.models import ChatContext, ChatMessage
+from courses.models import Course, Module, Question, QuestionOption, Quiz, Section
+from courses.search import update_search_vectors
+from job_matching.models import JobListing, JobMatchResult, StudentProfile
+from profiledetails.models import ProfileDetails
+from progress.models import UserModuleProgress, UserQuizAttempt, UserSectionProgress
+
+logger = logging.getLogger(__name__)
+
+User = get_user_model()
+
+EMAIL_DOMAIN = 'perfdata.invalid'
+USER_PREFIX = 'perf-user'
+EXTERNAL_ID_PREFIX = 'perf-'
+PASSWORD = 'perfdata'
+
+# Rows buffered per COPY statement
+COPY_CHUNK_ROWS = 50000
+
+WORDS = (
+    'data python model learning system design network function value design cloud query index '
+    'cache service test deploy security vector graph stream event pattern practice project team '
+    'analysis report method result theory module lesson example exercise review basic advanced '
+    'applied modern practical complete guide introduction foundation principle structure process '
+    'interface client server storage memory thread signal layer schema record session metric'
+).split()
+FIRST_NAMES = (
+    'Aarav Aisha Ana Arjun Ben Chen Chloe Daniel Diya Elena Fatima Hana Ibrahim Isha Jack Jia '
+    'Kai Karan Lena Liam Maya Mei Noah Omar Priya Rahul Sara Sofia Tariq Uma Vikram Wei Yara Zoe'
+).split()
+LAST_NAMES = (
+    'Ahmed Brown Chen Das Evans Fernandez Garcia Gupta Haddad Ito Jensen Khan Kim Lopez Mehta '
+    'Nguyen Okafor Patel Quinn Rossi Singh Smith Tanaka Usman Varga Wang Xu Yilmaz Zhang'
+).split()
+SKILLS = (
+    'Python SQL JavaScript React Django Docker Kubernetes AWS Git Linux Statistics Pandas NumPy '
+    'MachineLearning DeepLearning NLP DataVisualization Excel Communication Teamwork Java Go Rust '
+    'TypeScript REST GraphQL Testing CI/CD Security Networking'
+).split()
+ROLES = (
+    'Backend Developer', 'Data Analyst', 'Data Scientist', 'Frontend Developer', 'ML Engineer',
+    'DevOps Engineer', 'QA Engineer', 'Full Stack Developer', 'Cloud Engineer', 'Security Analyst',
+)
+COMPANIES = tuple(f'{name} {kind}' for name in ('Acme', 'Globex', 'Initech', 'Umbrella', 'Stark', 'Wayne', 'Hooli',
+                                                 'Vandelay', 'Soylent', 'Cyberdyne') for kind in ('Labs', 'Systems'))
+LOCATIONS = ('Bengaluru', 'Hyderabad', 'Pune', 'Chennai', 'Mumbai', 'Delhi', 'Remote', 'Berlin', 'London', 'Singapore')
+USER_AGENTS = (
+    'Mozilla/5.0 (Linux; Android 14; Pixel 8) AppleWebKit/537.36 Chrome/126.0 Mobile Safari/537.36',
+    'Mozilla/5.0 (iPhone; CPU iPhone OS 17_5 like Mac OS X) AppleWebKit/605.1.15 Version/17.5 Mobile Safari/604.1',
+    'Mozilla/5.0 (Linux; Android 13; SM-A546E) AppleWebKit/537.36 Chrome/125.0 Mobile Safari/537.36',
+)
+
+# Relative weights
+ATTENDANCE_STATUSES = (('present', 78), ('late', 12), ('absent', 7), ('excused', 3))
+CONTENT_TYPES = (('text', 50), ('video', 30), ('file', 10), ('link', 10))
+LEVELS = (('beginner', 50), ('intermediate', 35), ('advanced', 15))
+JOB_TYPES = (('full_time', 50), ('internship', 30), ('part_time', 10), ('contract', 10))
+APPLICATION_STATUSES = (('not_applied', 70), ('applied', 18), ('interviewing', 7), ('rejected', 4), ('accepted', 1))
+
+
+def _pick(rng, weighted):
+    values, weights = zip(*weighted)
+    return rng.choices(values, weights)[0]
+
+
+def _text(rng, words):
+    return ' '.join(rng.choices(WORDS, k=words))
+
+
+def _title(rng, words=3):
+    return ' '.join(rng.choices(WORDS, k=words)).title()
+
+
+def _uuid(rng):
+    return uuid.UUID(int=rng.getrandbits(128), version=4)
+
+
+def _around(rng, mean, low=1):
+    """A count around mean, skewed like real content sizes."""
+    return max(low, int(rng.triangular(low, mean * 2, mean)))
+
+
+def _copy_converter(field):
+    """Return a function rendering one value of field in COPY text format."""
+    def escape(text):
+        return text.replace('\\', '\\\\').replace('\t', '\\t').replace('\n', '\\n').replace('\r', '\\r')
+
+    if isinstance(field, ArrayField):
+        def convert(value):
+            items = ','.join('"' + str(item).replace('\\', '\\\\').replace('"', '\\"') + '"' for item in value)
+            return escape('{' + items + '}')
+    elif isinstance(field, models.JSONField):
+        def convert(value):
+            return escape(json.dumps(value))
+    elif isinstance(field, models.BooleanField):
+        def convert(value):
+            return 't' if value else 'f'
+    else:
+        def convert(value):
+            if isinstance(value, (datetime, date)):
+                return value.isoformat()
+            return escape(str(value))
+
+    return lambda value: '\\N' if value is None else convert(value)
+
+
+def copy_rows(model, fields, rows, now=None):
+    """
+    Load rows into model's table with COPY.
+
+    Columns not in fields get their default, computed once; auto_now and
+    auto_now_add fields get now.
+
+    Args:
+        model: Model to load
+        fields (list): Names of the fields each row gives values for, in order
+        rows (iterable): Tuples of values
+        now (datetime): Value for auto_now/auto_now_add fields
+
+    Returns:
+        int: Rows loaded
+    """
+    now = now or timezone.now()
+    given = [model._meta.get_field(name) for name in fields]
+    constant = []
+    for field in model._meta.concrete_fields:
+        if field in given or isinstance(field, AutoFieldMixin):
+            continue
+        if getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False):
+            value = now
+        else:
+            value = field.get_default()
+        if value is None and not field.null:
+            raise ValueError(f'{model.__name__}.{field.name} has no default and must be given')
+        constant.append((field, value))
+
+    columns = ', '.join(connection.ops.quote_name(field.column) for field in [*given, *(f for f, _ in constant)])
+    converters = [_copy_converter(field) for field in given]
+    suffix = ''.join('\t' + _copy_converter(field)(value) for field, value in constant)
+    sql = f'COPY {connection.ops.quote_name(model._meta.db_table)} ({columns}) FROM STDIN'
+
+    count = 0
+    buffer = io.StringIO()
+    with connection.cursor() as cursor:
+        for row in rows:
+            buffer.write('\t'.join([convert(value) for convert, value in zip(converters, row)]) + suffix + '\n')
+            count += 1
+            if count % COPY_CHUNK_ROWS == 0:
+                buffer.seek(0)
+                cursor.copy_expert(sql, buffer)
+                buffer = io.StringIO()
+        if buffer.tell():
+            buffer.seek(0)
+            cursor.copy_expert(sql, buffer)
+    return count
+
+
+def seed_users(count, rng=None, domain=EMAIL_DOMAIN, prefix=USER_PREFIX, months=6, now=None):
+    """
+    Create count users that can log in with PASSWORD.
+
+    Emails are <prefix>-<n>@<domain>, and SPOC external ids are <PREFIX>-<n>.
+
+    Returns:
+        list: ids of the new users, in order of n
+    """
+    rng = rng or random.Random()
+    now = now or timezone.now()
+    password = make_password(PASSWORD)
+    span = months * 30 * 86400
+
+    def rows():
+        for n in range(count):
+            yield (
+                password, f'{prefix}-{n}', f'{prefix}-{n}@{domain}',
+                f'{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}', f'{prefix.upper()}-{n}',
+                now - timedelta(seconds=rng.uniform(0, 2 * span)),
+            )
+
+    copy_rows(User, ['password', 'username', 'email', 'name', 'student_external_id', 'date_joined'], rows(), now)
+    ids = dict(
+        User.objects.filter(email__endswith=f'@{domain}', username__startswith=f'{prefix}-')
+        .values_list('username', 'id')
+    )
+    return [ids[f'{prefix}-{n}'] for n in range(count)]
+
+
+def seed_profiles(user_ids, rng, now):
+    """Learning profiles for most users, and the job profile every user gets on sign-up."""
+    student_types = [value for value, _ in ProfileDetails.STUDENT_TYPES]
+    styles = [value for value, _ in ProfileDetails.LEARNING_STYLES]
+    tracks = ('Data Science', 'Web Development', 'Cloud', 'AI/ML', None)
+
+    def learning_profiles():
+        for user_id in user_ids:
+            if rng.random() < 0.7:
+                strengths = rng.sample(SKILLS, rng.randint(1, 4))
+                yield (
+                    user_id, _text(rng, rng.randint(10, 60)), _text(rng, rng.randint(10, 40)),
+                    rng.choice(student_types), rng.choice(styles), strengths, rng.sample(SKILLS, rng.randint(0, 3)),
+                    {skill: rng.randint(1, 5) for skill in strengths},
+                    [{'goal': _title(rng, 4), 'target_date': (now + timedelta(days=rng.randint(30, 365))).date().isoformat()}],
+                )
+
+    def job_profiles():
+        for user_id in user_ids:
+            yield (
+                user_id, {skill: round(rng.random(), 2) for skill in rng.sample(SKILLS, rng.randint(0, 8))},
+                rng.choice(tracks), rng.sample(SKILLS, rng.randint(0, 3)),
+            )
+
+    return {
+        'profile details': copy_rows(
+            ProfileDetails,
+            ['user', 'about', 'background', 'student_type', 'preferred_learning_style', 'strengths', 'weaknesses',
+             'skill_levels', 'learning_goals'],
+            learning_profiles(), now
+        ),
+        'student profiles': copy_rows(
+            StudentProfile, ['user', 'skills', 'training_track', 'weak_points'], job_profiles(), now
+        ),
+    }
+
+
+def seed_courses(count, rng=None, modules=8, sections=10, questions=5, options=4, fixed=False,
+                 instructor_ids=(), prefix=EXTERNAL_ID_PREFIX, now=None):
+    """
+    Create count course trees.
+
+    Args:
+        count (int): Courses
+        modules, sections, questions, options (int): Mean count per parent; exact if fixed
+        fixed (bool): Give every course the same shape, e.g. for comparable benchmarks
+        instructor_ids (list): Users to pick instructors from
+        prefix (str): Prefix of the course external ids
+
+    Returns:
+        list: [{'id', 'modules': [{'id', 'sections': [ids], 'quiz': id or None, 'passing_score'}]}]
+    """
+    rng = rng or random.Random()
+    now = now or timezone.now()
+
+    def size(mean, low=1):
+        return mean if fixed else _around(rng, mean, low)
+
+    courses = Course.objects.bulk_create([
+        Course(
+            external_id=f'{prefix}course-{n}', title=_title(rng, 3), subtitle=_title(rng, 6),
+            description=_text(rng, rng.randint(40, 120)), learning_outcomes=_text(rng, 30),
+            level=_pick(rng, LEVELS), status='published' if rng.random() < 0.9 else 'draft',
+            price=Decimal(rng.choice((0, 19, 29, 49, 99))), estimated_duration=rng.randint(60, 2400),
+            instructor_id=rng.choice(instructor_ids) if instructor_ids else None,
+            average_rating=round(rng.uniform(3.0, 5.0), 1), total_reviews=rng.randint(0, 500),
+            is_featured=rng.random() < 0.05, published_at=now - timedelta(days=rng.randint(0, 720)),
+        )
+        for n in range(count)
+    ], batch_size=1000)
+
+    module_rows = Module.objects.bulk_create([
+        Module(course=course, title=_title(rng, 4), description=_text(rng, 30), order_number=number,
+               estimated_duration=rng.randint(20, 240))
+        for course in courses for number in range(1, size(modules) + 1)
+    ], batch_size=5000)
+
+    section_rows = Section.objects.bulk_create([
+        Section(
+            module=module, title=_title(rng, 3), content_type=_pick(rng, CONTENT_TYPES), order_number=number,
+            content=_text(rng, rng.randint(40, 400)), summary=_text(rng, 20),
+            estimated_duration=rng.randint(3, 30)
+        )
+        for module in module_rows for number in range(1, size(sections) + 1)
+    ], batch_size=5000)
+
+    quizzes = Quiz.objects.bulk_create([
+        Quiz(module=module, title=f'{module.title} quiz', passing_score=rng.choice((60, 70, 70, 80)))
+        for module in module_rows if fixed or rng.random() < 0.8
+    ], batch_size=5000)
+
+    question_rows = Question.objects.bulk_create([
+        Question(quiz=quiz, question_text=f'{_text(rng, rng.randint(6, 20))}?', order_number=number,
+                 explanation=_text(rng, 15))
+        for quiz in quizzes for number in range(1, size(questions) + 1)
+    ], batch_size=5000)
+
+    def option_rows():
+        for question in question_rows:
+            total = options if fixed else rng.choice((3, 4, 4, 4, 5))
+            correct = rng.randint(1, total)
+            for number in range(1, total + 1):
+                yield question.pk, _text(rng, rng.randint(1, 6)), number == correct, number
+
+    copy_rows(QuestionOption, ['question', 'option_text', 'is_correct', 'order_number'], option_rows(), now)
+
+    quiz_by_module = {quiz.module_id: quiz for quiz in quizzes}
+    sections_by_module = {}
+    for section in section_rows:
+        sections_by_module.setdefault(section.module_id, []).append(section.pk)
+    modules_by_course = {}
+    for module in module_rows:
+        quiz = quiz_by_module.get(module.pk)
+        modules_by_course.setdefault(module.course_id, []).append({
+            'id': module.pk,
+            'sections': sections_by_module.get(module.pk, []),
+            'quiz': quiz.pk if quiz else None,
+            'passing_score': quiz.passing_score if quiz else None,
+        })
+    return [{'id': course.pk, 'modules': modules_by_course.get(course.pk, [])} for course in courses]
+
+
+def seed_enrollments(user_ids, courses, rng):
+    """
+    Enroll every user in one or more courses, picked by Zipf popularity.
+
+    Returns:
+        dict: {course id: [user ids]}
+    """
+    weights = [1 / (rank + 1) ** 1.1 for rank in range(len(courses))]
+    course_ids = [course['id'] for course in courses]
+    enrolled = {course_id: [] for course_id in course_ids}
+    rows = []
+    for user_id in user_ids:
+        wanted = min(len(course_ids), 1 + int(rng.expovariate(1.2)))
+        chosen = set()
+        while len(chosen) < wanted:
+            chosen.add(rng.choices(course_ids, weights)[0])
+        for course_id in chosen:
+            enrolled[course_id].append(user_id)
+            rows.append((course_id, user_id))
+    copy_rows(Course.students.through, ['course', 'user'], rows)
+    return enrolled
+
+
+def seed_progress(courses, enrolled, rng, now, months):
+    """Section and module progress and quiz attempts for every enrollment."""
+    span = months * 30 * 86400
+    section_rows = []
+    module_rows = []
+    attempt_rows = []
+    for course in courses:
+        sections = [(module, section_id) for module in course['modules'] for section_id in module['sections']]
+        if not sections:
+            continue
+        for user_id in enrolled[course['id']]:
+            done = int(rng.betavariate(0.8, 1.6) * (len(sections) + 1))
+            at = now - timedelta(seconds=rng.uniform(0.2, 1) * span)
+            step = (now - at) / (len(sections) + 1)
+            completed = {}
+            last_seen = {}
+            for index, (module, section_id) in enumerate(sections[:done + 1]):
+                if index:
+                    at = min(now, at + step * rng.uniform(0.2, 1.8))
+                finished = index < done
+                section_rows.append((
+                    user_id, section_id, finished, at, at if finished else None,
+                    0.0 if finished else round(rng.uniform(0, 600), 1),
+                ))
+                if finished:
+                    completed[module['id']] = completed.get(module['id'], 0) + 1
+                    last_seen[module['id']] = at
+            for module in course['modules']:
+                count = completed.get(module['id'], 0)
+                if not count:
+                    continue
+                percentage = count / len(module['sections']) * 100
+                finished_at = last_seen[module['id']]
+                module_rows.append((
+                    user_id, module['id'], percentage >= 100, round(percentage, 1), finished_at,
+                    finished_at if percentage >= 100 else None,
+                ))
+                if percentage >= 100 and module['quiz']:
+                    for attempt in range(3):
+                        score = round(min(100.0, max(0.0, rng.gauss(72, 15))), 1)
+                        started = min(now, finished_at + timedelta(minutes=rng.randint(1, 60 * 24) * (attempt + 1)))
+                        time_taken = rng.randint(120, 1800)
+                        passed = score >= module['passing_score']
+                        attempt_rows.append((
+                            user_id, module['quiz'], score, passed, started,
+                            started + timedelta(seconds=time_taken), time_taken,
+                        ))
+                        if passed:
+                            break
+
+    return {
+        'section progress': copy_rows(
+            UserSectionProgress,
+            ['user', 'section', 'is_completed', 'last_accessed', 'completed_at', 'last_position'],
+            section_rows, now
+        ),
+        'module progress': copy_rows(
+            UserModuleProgress,
+            ['user', 'module', 'is_completed', 'progress_percentage', 'last_accessed', 'completed_at'],
+            module_rows, now
+        ),
+        'quiz attempts': copy_rows(
+            UserQuizAttempt,
+            ['user', 'quiz', 'score', 'passed', 'started_at', 'completed_at', 'time_taken'],
+            attempt_rows, now
+        ),
+    }
+
+
+def seed_attendance(courses, enrolled, external_ids, rng, now, months):
+    """
+    One session a week per course over the last months months, each marked by
+    most of the course's students.
+    """
+    def rows():
+        for course in courses:
+            students = enrolled[course['id']]
+            if not students:
+                continue
+            # A fixed weekly slot per course
+            start = (now - timedelta(days=months * 30)).replace(hour=rng.randint(8, 17), minute=0, second=0, microsecond=0)
+            session_start = start + timedelta(days=rng.randint(0, 6))
+            while session_start < now:
+                session_id = _uuid(rng)
+                for user_id in students:
+                    if rng.random() < 0.1:
+                        continue
+                    status = _pick(rng, ATTENDANCE_STATUSES)
+                    delay = rng.uniform(10, 40) if status == 'late' else rng.uniform(-5, 10)
+                    marked_at = min(now, session_start + timedelta(minutes=delay))
+                    failed = rng.random() < 0.02
+                    yield (
+                        session_id, user_id, str(course['id']), external_ids[user_id], marked_at, status,
+                        'QR' if rng.random() < 0.92 else 'MANUAL', rng.choice(USER_AGENTS),
+                        f'10.{rng.randint(0, 255)}.{rng.randint(0, 255)}.{rng.randint(1, 254)}',
+                        not failed, 'SPOC server returned 503' if failed else None,
+                        marked_at + timedelta(seconds=rng.uniform(0.1, 5)), 3 if failed else 0,
+                    )
+                session_start += timedelta(days=7)
+
+    return copy_rows(
+        AttendanceRecord,
+        ['external_session_id', 'student', 'course_id', 'student_external_id', 'marked_at', 'status', 'method',
+         'user_agent', 'ip_address', 'synced_with_spoc', 'sync_error', 'last_sync_attempt', 'retry_count'],
+        rows(), now
+    )
+
+
+def seed_jobs(count, user_ids, rng, now, prefix=EXTERNAL_ID_PREFIX):
+    """Job listings, and match results for the users looking for a job."""
+    jobs = []
+    listing_rows = []
+    for n in range(count):
+        job_id = _uuid(rng)
+        requirements = rng.sample(SKILLS, rng.randint(3, 8))
+        jobs.append((job_id, requirements))
+        listing_rows.append((
+            job_id, f'{prefix}job-{n}', rng.choice(ROLES), rng.choice(COMPANIES), _text(rng, rng.randint(60, 200)),
+            requirements, rng.choice(LOCATIONS), _pick(rng, JOB_TYPES), f'https://jobs.example.com/{prefix}job-{n}',
+            (now - timedelta(days=rng.randint(0, 90))).date(), rng.random() < 0.85, 'perfdata',
+        ))
+    listings = copy_rows(
+        JobListing,
+        ['id', 'external_id', 'title', 'company', 'description', 'requirements', 'location', 'job_type',
+         'apply_link', 'posted_date', 'is_active', 'source'],
+        listing_rows, now
+    )
+
+    def match_rows():
+        for user_id in user_ids:
+            if not jobs or rng.random() >= 0.3:
+                continue
+            for job_id, requirements in rng.sample(jobs, min(len(jobs), rng.randint(5, 30))):
+                missing = rng.sample(requirements, rng.randint(0, len(requirements) // 2))
+                yield (
+                    user_id, job_id, round(rng.betavariate(2, 3) * 100, 1), missing, len(missing) * rng.randint(7, 30),
+                    {'weeks': [{'focus': skill} for skill in missing]}, rng.random() < 0.2,
+                    _pick(rng, APPLICATION_STATUSES),
+                )
+
+    matches = copy_rows(
+        JobMatchResult,
+        ['student', 'job', 'match_score', 'missing_skills', 'readiness_days', 'prep_plan', 'is_interested',
+         'application_status'],
+        match_rows(), now
+    )
+    return {'job listings': listings, 'job matches': matches}
+
+
+def seed_chat(courses, enrolled, rng, now, months):
+    """Log-normal chat activity about the modules of the courses each user takes."""
+    span = months * 30 * 86400
+    modules_of = {course['id']: [module['id'] for module in course['modules']] for course in courses}
+    courses_of = {}
+    for course_id, students in enrolled.items():
+        if modules_of[course_id]:
+            for user_id in students:
+                courses_of.setdefault(user_id, []).append(course_id)
+
+    def rows():
+        for user_id, course_ids in courses_of.items():
+            if rng.random() >= 0.6:
+                continue
+            for _ in range(min(200, int(rng.lognormvariate(1.0, 1.0)))):
+                yield (
+                    user_id, rng.choice(modules_of[rng.choice(course_ids)]), f'{_text(rng, rng.randint(5, 25))}?',
+                    _text(rng, rng.randint(30, 150)), now - timedelta(seconds=rng.uniform(0, span)),
+                )
+
+    return copy_rows(ChatMessage, ['user', 'module_id', 'message', 'response', 'timestamp'], rows(), now)
+
+
+def seed(users=20000, courses=60, jobs=2000, months=6, modules=8, sections=10, questions=5, seed_value=42, log=None):
+    """
+    Generate the whole dataset in one transaction.
+
+    Args:
+        users (int): Users, each with profiles, enrollments and the activity that follows
+        courses (int): Course trees
+        jobs (int): Job listings
+        months (int): How far back activity and weekly attendance sessions go
+        modules, sections, questions (int): Mean course tree shape
+        seed_value (int): Random seed; the same value gives the same data
+        log (callable): Called with a line of progress after each step
+
+    Returns:
+        dict: {table label: rows}
+    """
+    rng = random.Random(seed_value)
+    now = timezone.now()
+    log = log or logger.info
+    counts = {}
+    start = time.perf_counter()
+
+    def record(added, message=None):
+        nonlocal start
+        counts.update(added)
+        message = message or ', '.join(f'{label} {rows}' for label, rows in added.items())
+        log(f'  {message} ({time.perf_counter() - start:.1f}s)')
+        start = time.perf_counter()
+
+    with transaction.atomic():
+        user_ids = seed_users(users, rng, prefix=USER_PREFIX, months=months, now=now)
+        record({'users': len(user_ids)})
+        record(seed_profiles(user_ids, rng, now))
+
+        course_tree = seed_courses(
+            courses, rng, modules=modules, sections=sections, questions=questions,
+            instructor_ids=user_ids[:max(1, math.ceil(users / 500))], now=now
+        )
+        modules_seeded = [module for course in course_tree for module in course['modules']]
+        record({
+            'courses': len(course_tree),
+            'modules': len(modules_seeded),
+            'sections': sum(len(module['sections']) for module in modules_seeded),
+            'quizzes': sum(1 for module in modules_seeded if module['quiz']),
+            'questions': Question.objects.filter(quiz__module__in=[module['id'] for module in modules_seeded]).count(),
+            'options': QuestionOption.objects.filter(
+                question__quiz__module__in=[module['id'] for module in modules_seeded]
+            ).count(),
+        })
+        enrolled = seed_enrollments(user_ids, course_tree, rng)
+        record({'enrollments': sum(len(students) for students in enrolled.values())})
+        record(seed_progress(course_tree, enrolled, rng, now, months))
+
+        external_ids = {user_id: f'{USER_PREFIX.upper()}-{n}' for n, user_id in enumerate(user_ids)}
+        record({'attendance records': seed_attendance(course_tree, enrolled, external_ids, rng, now, months)})
+        record(seed_jobs(jobs, user_ids, rng, now))
+        record({'chat messages': seed_chat(course_tree, enrolled, rng, now, months)})
+        update_search_vectors([course['id'] for course in course_tree])
+        record({}, 'course search vectors')
+
+    run_rollup()
+    record({}, 'attendance rollups')
+    return counts
+
+
+def exists():
+    """Whether seeded users are in the database."""
+    return User.objects.filter(email__endswith=f'@{EMAIL_DOMAIN}').exists()
+
+
+def _raw_delete(queryset):
+    """Delete the rows of queryset with one DELETE, without loading them or sending signals."""
+    model = queryset.model
+    try:
+        sql, params = queryset.values('pk').query.sql_with_params()
+    except EmptyResultSet:
+        return 0
+    quote = connection.ops.quote_name
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {quote(model._meta.db_table)} WHERE {quote(model._meta.pk.column)} IN ({sql})', params
+        )
+        return cursor.rowcount
+
+
+def clear():
+    """
+    Remove the seeded dataset.
+
+    The large tables are emptied with plain DELETEs first, so the ORM only
+    has to cascade over what is left.
+
+    Returns:
+        int: Rows deleted
+    """
+    users = User.objects.filter(email__endswith=f'@{EMAIL_DOMAIN}')
+    courses = Course.objects.filter(external_id__startswith=f'{EXTERNAL_ID_PREFIX}course-')
+    jobs = JobListing.objects.filter(external_id__startswith=f'{EXTERNAL_ID_PREFIX}job-')
+    course_ids = [str(pk) for pk in courses.values_list('pk', flat=True)]
+    deleted = 0
+    with transaction.atomic():
+        for queryset in (
+            SpocSyncOutbox.objects.filter(record__student__in=users),
+            SpocDeadLetter.objects.filter(record__student__in=users),
+            AttendanceRecord.objects.filter(student__in=users),
+            ArchivedAttendanceRecord.objects.filter(student__in=users),
+            StudentDailyAttendance.objects.filter(student__in=users),
+            SessionAttendanceSummary.objects.filter(course_id__in=course_ids),
+            ChatMessage.objects.filter(user__in=users),
+            ChatContext.objects.filter(user__in=users),
+            JobMatchResult.objects.filter(Q(student__in=users) | Q(job__in=jobs)),
+            jobs,
+            UserSectionProgress.objects.filter(Q(user__in=users) | Q(section__module__course__in=courses)),
+            UserModuleProgress.objects.filter(Q(user__in=users) | Q(module__course__in=courses)),
+            UserQuizAttempt.objects.filter(Q(user__in=users) | Q(quiz__module__course__in=courses)),
+            QuestionOption.objects.filter(question__quiz__module__course__in=courses),
+            Section.objects.filter(module__course__in=courses),
+        ):
+            deleted += _raw_delete(queryset)
+        deleted += courses.delete()[0]
+        deleted += users.delete()[0]
+    return deleted
@@ -0,0 +1,47 @@
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from attendance.models import AttendanceRecord, StudentDailyAttendance
+from courses.models import Course
+from job_matching.models import JobListing
+from profiledetails.models import ProfileDetails
+from progress.models import UserSectionProgress
+from . import seeding
+
+User = get_user_model()
+
+
+class SeedPerfDataTests(TestCase):
+    def test_seed_is_consistent_and_clear_removes_it(self):
+        counts = seeding.seed(users=40, courses=4, jobs=10, months=1, modules=2, sections=3, log=lambda line: None)
+        self.assertEqual(User.objects.filter(email__endswith=f'@{seeding.EMAIL_DOMAIN}').count(), 40)
+        self.assertEqual(Course.objects.count(), 4)
+        self.assertEqual(AttendanceRecord.objects.count(), counts['attendance records'])
+        self.assertGreater(counts['attendance records'], 0)
+
+        # Attendance and progress only come from enrolled students
+        for record in AttendanceRecord.objects.select_related('student')[:20]:
+            self.assertTrue(Course.objects.filter(pk=int(record.course_id), students=record.student).exists())
+            self.assertEqual(record.student_external_id, record.student.student_external_id)
+        for progress in UserSectionProgress.objects.select_related('section__module')[:20]:
+            self.assertTrue(progress.section.module.course.students.filter(pk=progress.user_id).exists())
+        self.assertTrue(StudentDailyAttendance.objects.exists())
+        self.assertTrue(User.objects.filter(email__endswith=f'@{seeding.EMAIL_DOMAIN}').first().check_password(seeding.PASSWORD))
+
+        seeding.clear()
+        self.assertFalse(seeding.exists())
+        self.assertFalse(Course.objects.exists())
+        self.assertFalse(JobListing.objects.exists())
+        self.assertFalse(AttendanceRecord.objects.exists())
+
+    def test_copy_rows_escapes_values(self):
+        user_id = seeding.seed_users(1)[0]
+        text = 'tab\there\nnew line \\ backslash'
+        seeding.copy_rows(
+            ProfileDetails, ['user', 'about', 'strengths', 'skill_levels'],
+            [(user_id, text, ['a "quoted", item', 'b\\c'], {'key': 'value\twith tab'})]
+        )
+        profile = ProfileDetails.objects.get(user_id=user_id)
+        self.assertEqual(profile.about, text)
+        self.assertEqual(profile.strengths, ['a "quoted", item', 'b\\c'])
+        self.assertEqual(profile.skill_levels, {'key': 'value\twith tab'})
+        self.assertIsNone(profile.background)
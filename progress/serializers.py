@@ -1,4 +1,8 @@
+from datetime import timedelta
+from django.db import transaction
+from django.utils import timezone
 from rest_framework import serializers
+from courses.grading import get_answer_key, grade, save_graded_attempt
 from .models import UserModuleProgress, UserSectionProgress, UserQuizAttempt
 
 class UserSectionProgressSerializer(serializers.ModelSerializer):
@@ -29,13 +33,38 @@ class SectionProgressUpdateSerializer(serializers.Serializer):
         instance.save()
         return instance
 
+class QuizResponseSerializer(serializers.Serializer):
+    question = serializers.IntegerField()
+    selected_options = serializers.ListField(child=serializers.IntegerField(), required=False, default=list)
+    text_response = serializers.CharField(required=False, allow_blank=True, default='')
+
 class QuizAttemptCreateSerializer(serializers.ModelSerializer):
+    responses = QuizResponseSerializer(many=True, write_only=True)
+
     class Meta:
         model = UserQuizAttempt
-        fields = ['quiz', 'score', 'time_taken']
-        read_only_fields = ['user', 'passed', 'started_at', 'completed_at']
+        fields = ['quiz', 'score', 'time_taken', 'responses']
+        read_only_fields = ['user', 'score', 'passed', 'started_at', 'completed_at']
 
     def create(self, validated_data):
-        user = self.context['request'].user
-        quiz_attempt = UserQuizAttempt.objects.create(user=user, **validated_data)
+        """Grade the responses server-side; a score sent by the client is ignored."""
+        request = self.context['request']
+        quiz = validated_data['quiz']
+        time_taken = validated_data.get('time_taken', 0)
+        self.graded = grade(get_answer_key(quiz.pk), validated_data['responses'])
+        with transaction.atomic():
+            save_graded_attempt(
+                request.user,
+                self.graded,
+                started_at=timezone.now() - timedelta(seconds=time_taken),
+                time_spent=time_taken,
+                ip_address=request.META.get('REMOTE_ADDR') or None,
+                user_agent=request.META.get('HTTP_USER_AGENT', ''),
+            )
+            quiz_attempt = UserQuizAttempt.objects.create(
+                user=request.user,
+                quiz=quiz,
+                score=self.graded.score,
+                time_taken=time_taken
+            )
         return quiz_attempt
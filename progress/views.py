@@ -61,6 +61,7 @@ class SectionProgressView(APIView):
 class QuizAttemptView(APIView):
     """
     API endpoint for creating and listing quiz attempts.
+    Attempts are graded server-side from the submitted responses (see courses.grading).
     """
     permission_classes = [permissions.IsAuthenticated]
 
@@ -88,10 +89,14 @@ class QuizAttemptView(APIView):
                 )
                 
             quiz_attempt = serializer.save()
-            return Response(
-                UserQuizAttemptSerializer(quiz_attempt).data,
-                status=status.HTTP_201_CREATED
+            graded = serializer.graded
+            data = UserQuizAttemptSerializer(quiz_attempt).data
+            data.update(
+                points=graded.points,
+                total_points=graded.key.total_points,
+                results=graded.results()
             )
+            return Response(data, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 class UserProgressOverview(APIView):